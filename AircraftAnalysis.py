@@ -12,6 +12,10 @@ Synthesis:
     Reads a CEDRIC file with the dual-Doppler 
     synthesis.
 
+SynthesisCollection:
+    Stacks several CEDRIC syntheses on the same 
+    grid along a leg (time) axis.
+
 Raul Valenzuela
 June, 2015
 
@@ -19,15 +23,27 @@ June, 2015
 
 from netCDF4 import Dataset
 from geographiclib.geodesic import Geodesic
-import pandas as pd    
 import datetime
 import numpy as np
+from collections import OrderedDict
+import Common as cm
+import Profiler
 #import subprocess
-import Thermodyn as thermo
+
+''' pandas and Thermodyn are imported where needed so
+    reading a synthesis only loads netCDF4 '''
+
+''' columns of Flight.df returned by get_meteo and get_aircraft '''
+meteo_columns=['apres','atemp','dewp','galt','jwlwc','lats','lons',
+               'palt','wdir','wspd','wvert']
+aircraft_columns=['grdspeed','heading','pitch','roll','track']
+derived_columns=['relh','theta','thetav','thetaeq']
 
 class Flight(object):
     def __init__(self, *args):
 
+        import pandas as pd
+
         self.file= args[0]
         self.LAT = self.read_stdtape('LAT')
         self.LON = self.read_stdtape('LON')
@@ -62,9 +78,16 @@ class Flight(object):
         dict_stdtape['pitch'] = self.read_stdtape('PITCH')
         dict_stdtape['roll'] = self.read_stdtape('ROLL')
 
+        ''' keep column arrays so windows can be views '''
+        self.columns=dict_stdtape
+
         ''' package standard tape into a pandas DataFrame instance'''
         self.df=pd.DataFrame(data=dict_stdtape,index=self.DATETIME)
 
+        ''' windows already computed (keyed by start and end time) '''
+        self.windows={}
+        self.track_index=None
+
     def read_stdtape(self,var):
 
         # open standard tape file for reading
@@ -73,6 +96,7 @@ class Flight(object):
         if var != 'DATETIME':        
             array = stdtape_file.variables[var][:]
         else:        
+            import pandas as pd
             base_time=stdtape_file.variables['base_time'][:]
             stdtape_secs=stdtape_file.variables['Time'][:]
             array=pd.to_datetime(stdtape_secs+base_time,unit='s')
@@ -82,60 +106,301 @@ class Flight(object):
 
         return array
 
+    def get_window(self,start_time, end_time):
+
+        ''' returns a FlightWindow; searchsorted is done
+            only once for each time window
+        '''
+        key=(start_time, end_time)
+        if key not in self.windows:
+            start = self.df.index.searchsorted(start_time)
+            end = self.df.index.searchsorted(end_time)
+            self.windows[key]=FlightWindow(self,start,end)
+
+        return self.windows[key]
+
+    def get_track_index(self):
+
+        if self.track_index is None:
+            self.track_index=TrackIndex(self)
+
+        return self.track_index
+
     def get_path(self,start_time, end_time):
 
-        start = self.df.index.searchsorted(start_time)
-        end = self.df.index.searchsorted(end_time)
-        lat = self.df.ix[start:end]['lats'].values
-        lon = self.df.ix[start:end]['lons'].values
+        window = self.get_window(start_time, end_time)
         
-        return zip(lat, lon)
+        return zip(window.lats, window.lons)
 
     def get_meteo(self,start_time, end_time):
 
-        start = self.df.index.searchsorted(start_time)
-        end = self.df.index.searchsorted(end_time)
-        # print meteo.columns.tolist()
-        cols=[0,1,2,3,6,7,8,9,13,14,15]
-        meteo=self.df.ix[start:end,cols].copy()
+        ''' meteo frame is memoized for each time window;
+            callers should not modify it
+        '''
+        import pandas as pd
+
+        window = self.get_window(start_time, end_time)
+        if window.meteo is None:
+            self.set_derived()
+            cols=meteo_columns+derived_columns
+            data=window.get(cols)
+            window.meteo=pd.DataFrame(data=data,index=window.time,
+                                      columns=cols)
+
+        return window.meteo
+
+    def set_derived(self):
+
+        ''' derived thermodynamic columns are computed
+            once for the entire standard tape
+        '''
+        if 'theta' in self.columns:
+            return
+
+        import Thermodyn as thermo
 
         ''' pressure '''
-        pres = meteo.apres.values
+        pres = np.asarray(self.columns['apres'])
         
-        ''' add relative humidity '''
-        temp = meteo.atemp.values
-        dewp = meteo.dewp.values
+        ''' relative humidity '''
+        temp = np.asarray(self.columns['atemp'])
+        dewp = np.asarray(self.columns['dewp'])
         relh = thermo.relative_humidity(C=temp,Dewp=dewp) # [%]
-        meteo.loc[:,'relh'] = pd.Series(relh,index=meteo.index)
 
         ''' mixing ratio '''
         satmixr=thermo.sat_mix_ratio(C=temp,hPa=pres)
         mixr=relh*satmixr/100
 
-        ''' add theta '''
+        ''' theta '''
         theta = thermo.theta2(C=temp,hPa=pres,mixing_ratio=mixr)
-        meteo.loc[:,'theta'] = pd.Series(theta,index=meteo.index)    
 
-        ''' add thetav '''
+        ''' thetav '''
         thetav = thermo.virtual_temperature(theta=theta,mixing_ratio=mixr)
-        meteo.loc[:,'thetav'] = pd.Series(thetav,index=meteo.index)    
 
-        ''' add thetae '''
+        ''' thetae '''
         thetaeq = thermo.theta_equiv2(C=temp,hPa=pres,
                                       mixing_ratio=mixr,relh=relh)
-        meteo.loc[:,'thetaeq'] = pd.Series(thetaeq,index=meteo.index)    
-        
-        return meteo
+
+        self.columns['relh']=np.asarray(relh)
+        self.columns['theta']=np.asarray(theta)
+        self.columns['thetav']=np.asarray(thetav)
+        self.columns['thetaeq']=np.asarray(thetaeq)
 
     def get_aircraft(self,start_time, end_time):
 
-        start = self.df.index.searchsorted(start_time)
-        end = self.df.index.searchsorted(end_time)
-        cols=[4,5,10,11,12]
-        aircraft=self.df.ix[start:end,cols].copy()
+        window = self.get_window(start_time, end_time)
+        aircraft=self.df.iloc[window.slice][aircraft_columns]
 
         return aircraft
 
+class FlightWindow(object):
+
+    ''' Struct-of-arrays view of a time window of a
+        standard tape. Columns are selected by name and 
+        returned as numpy views of the tape (no copies).
+
+        Use:
+            w = FLIGHT.get_window(SYNTH.start, SYNTH.end)
+            w.lats, w.lons, w['wvert']
+            met = w.get(['wspd','wdir'])
+    '''
+    def __init__(self,flight,start,end):
+
+        self.flight=flight
+        self.start=start
+        self.end=end
+        self.slice=slice(start,end)
+        self.meteo=None
+        self.turbulence={}
+        self.spectra={}
+
+    def __len__(self):
+        return self.end-self.start
+
+    def __getitem__(self,name):
+        return self.flight.columns[name][self.slice]
+
+    def get(self,names):
+        return dict((n,self[n]) for n in names)
+
+    @property
+    def lats(self):
+        return self['lats']
+
+    @property
+    def lons(self):
+        return self['lons']
+
+    @property
+    def time(self):
+        return self.flight.DATETIME[self.slice]
+
+    @property
+    def distance(self):
+        ''' distance along track from the start of the window [km] '''
+        dist=self.flight.get_track_index().distance[self.slice]
+        if dist.size == 0:
+            return dist
+        return dist-dist[0]
+
+    def get_distance_ticks(self,frequency):
+        ''' indices of samples every frequency [km] '''
+        return cm.get_ticks_every(self.distance,frequency)
+
+class TrackIndex(object):
+
+    ''' Along-track index of a standard tape. Maps each
+        sample to cumulative distance [km], leg segment and
+        nearest synthesis grid cell, and supports range
+        queries by distance and by time.
+
+        Segments are delimited by turns, i.e. where the 
+        aircraft track changes faster than turn_rate [deg/s]
+        averaged over turn_window [s].
+
+        Use:
+            ti = FLIGHT.get_track_index()
+            sl = ti.by_distance(20, 60)
+            ti.distance[sl], ti.segment[sl]
+            i, j, valid = ti.get_grid_cells(SYNTH)
+    '''
+    def __init__(self,flight,turn_rate=1.5,turn_window=10):
+
+        import pandas as pd
+
+        self.flight=flight
+        self.time=flight.DATETIME
+        self.distance=cm.get_cumulative_distance(lat=flight.columns['lats'],
+                                                 lon=flight.columns['lons'])
+
+        ''' turns from track rate of change '''
+        track=np.ma.filled(flight.columns['track'],np.nan).astype(float)
+        rate=np.abs((np.diff(track)+180.)%360.-180.)
+        rate=np.concatenate(([0.],rate))
+        rate=pd.Series(rate).rolling(turn_window,center=True,
+                                     min_periods=1).mean().values
+        self.turning=rate>turn_rate
+        starts=np.diff(self.turning.astype(int))==-1
+        self.segment=np.concatenate(([0],np.cumsum(starts)))
+
+        ''' grid cells keyed by synthesis file '''
+        self.cells={}
+
+    def by_distance(self,d0,d1):
+        ''' slice with samples between d0 and d1 [km] '''
+        start=np.searchsorted(self.distance,d0,side='left')
+        end=np.searchsorted(self.distance,d1,side='right')
+        return slice(start,end)
+
+    def by_time(self,t0,t1):
+        ''' slice with samples between t0 and t1 '''
+        start=self.time.searchsorted(t0)
+        end=self.time.searchsorted(t1)
+        return slice(start,end)
+
+    def by_segment(self,segment):
+        ''' slice with samples of a leg segment '''
+        idx=np.where(self.segment==segment)[0]
+        return slice(idx[0],idx[-1]+1)
+
+    @Profiler.timed('interpolation')
+    def get_grid_cells(self,synth):
+
+        ''' (i,j) indices of the nearest (LON,LAT) grid
+            cell of synth for every sample of the tape and
+            mask of valid samples; samples with missing
+            position or outside the grid (beyond half a
+            cell from the edges) are not valid
+        '''
+        if synth.file not in self.cells:
+            lats=np.ma.filled(self.flight.columns['lats'],np.nan)
+            lons=np.ma.filled(self.flight.columns['lons'],np.nan)
+            with np.errstate(invalid='ignore'):
+                i=cm.find_nearest2(np.asarray(synth.LON),lons)
+                j=cm.find_nearest2(np.asarray(synth.LAT),lats)
+            valid=np.ones(i.shape,dtype=bool)
+            for axis,pos in [(np.asarray(synth.LON),lons),
+                             (np.asarray(synth.LAT),lats)]:
+                half=np.abs(np.diff(axis)).mean()/2.
+                with np.errstate(invalid='ignore'):
+                    valid&=(pos>=axis.min()-half) & (pos<=axis.max()+half)
+            self.cells[synth.file]=(i,j,valid)
+
+        return self.cells[synth.file]
+
+
+def get_missing_as_nan(array):
+    ''' float32 C-contiguous read-only copy of a field
+        with NaN at missing values (masked or -32768);
+        the only representation of missing values in
+        Synthesis, so consumers neither remask nor fill '''
+    data=np.ma.filled(np.ma.asarray(array,dtype=np.float32),np.nan)
+    data=np.ascontiguousarray(data)
+    data[data == -32768.]=np.nan
+    data.flags.writeable=False
+    return data
+
+''' derived fields of a synthesis (Synthesis.get_field);
+    COMP<az> is the wind component toward azimuth az [deg],
+    e.g. COMP50 upslope (230 deg cross-barrier wind, as
+    positive) or COMP<az> along a section of azimuth az '''
+
+def get_speed(synth):
+    return np.sqrt(synth.U**2+synth.V**2)
+
+def get_direction(synth):
+    ''' direction wind blows from [deg], in (90,450] as
+        the profiles have always used (no jump at north) '''
+    return 270.-np.arctan2(synth.V,synth.U)*180./np.pi
+
+def get_total_speed(synth):
+    W=getattr(synth,synth.w_name)
+    return np.sqrt(synth.U**2+synth.V**2+W**2)
+
+def get_component(synth,azimuth):
+    az=np.radians(azimuth)
+    return synth.U*np.sin(az)+synth.V*np.cos(az)
+
+def get_gradient(array,axis,coord):
+    ''' centered differences along axis [1/m]; coord
+        in km; NaN next to missing values '''
+    return np.gradient(array,coord*1000.,axis=axis)
+
+def get_vorticity(synth):
+    ''' relative vorticity [10-3 s-1] '''
+    return 1e3*(get_gradient(synth.V,0,synth.X)-
+                get_gradient(synth.U,1,synth.Y))
+
+def get_divergence(synth):
+    ''' horizontal divergence [10-3 s-1] '''
+    return 1e3*(get_gradient(synth.U,0,synth.X)+
+                get_gradient(synth.V,1,synth.Y))
+
+derived_fields={'SPD':get_speed,
+                'DIR':get_direction,
+                'TSPD':get_total_speed,
+                'ZETA':get_vorticity,
+                'DIV':get_divergence}
+
+def component_name(azimuth):
+    ''' derived field name of the component toward azimuth '''
+    return 'COMP{:g}'.format(azimuth%360)
+
+def get_derived(name):
+
+    ''' function(synth) computing a derived field, or
+        None if name is not derived '''
+    if name in derived_fields:
+        return derived_fields[name]
+    if name.startswith('COMP'):
+        try:
+            azimuth=float(name[4:])
+        except ValueError:
+            return None
+        return lambda synth: get_component(synth,azimuth)
+    return None
+
+
 class Synthesis(object):
     def __init__(self,*args):
 
@@ -155,13 +420,147 @@ class Synthesis(object):
         self.start = None
         self.end = None
 
+        ''' levels and (i0,i1,j0,j1) box read so far;
+            None when fields are read entirely '''
+        self.loaded = None
+        self.field_names = None
+
+        ''' derived fields computed so far (least recently
+            used first) and their limit [MB] '''
+        self.derived = OrderedDict()
+        self.derived_max_mb = 500
+        self.w_name = 'WVA'
+
 
-    def set_fields(self,config):
+    def set_fields(self,config,lazy=False):
 
+        ''' lazy: fields are read by require() with the
+            levels and box needed (hyperslab reads); the
+            rest of the arrays stays NaN '''
         fields=config['synthesis_field_name']
+        self.field_names=fields
+        self.derived_max_mb=config.get('derived_max_mb',500)
+        self.w_name=config.get('wind_vector_vertical_component','WVA')
+
+        if lazy:
+            self.loaded={'levels':set(),'box':None}
+            return
 
         for field,value in fields.iteritems():
             setattr(self,field,self.read_synth(value))
+        self.loaded=None
+
+    def require(self,levels=None,bbox=None,margin=0):
+
+        ''' reads the part of the fields not loaded yet;
+            levels: z indices (None: all)
+            bbox: (lx,rx,by,ty) [deg] (None: whole domain)
+            margin: grid points added around bbox
+            Requires set_axes. Without arguments reads
+            the whole synthesis.
+        '''
+        if self.loaded is None:
+            return
+
+        nx,ny,nz=self.LON.size,self.LAT.size,self.Z.size
+        if levels is None:
+            levels=range(nz)
+        want=set(levels)
+        if bbox is None:
+            box=(0,nx,0,ny)
+        else:
+            box=self.get_box(bbox,margin)
+
+        old=self.loaded['box']
+        if old is not None:
+            box=(min(old[0],box[0]),max(old[1],box[1]),
+                 min(old[2],box[2]),max(old[3],box[3]))
+
+        if box != old:
+            ''' larger box: read it at every level needed '''
+            read=self.loaded['levels'] | want
+        else:
+            read=want - self.loaded['levels']
+
+        if read:
+            self.read_hyperslab(sorted(read),box)
+        self.loaded['levels'] |= want
+        self.loaded['box']=box
+
+        if len(self.loaded['levels']) == nz and box == (0,nx,0,ny):
+            self.loaded=None
+
+    def get_field(self,name):
+
+        ''' field read from the file or derived (see
+            derived_fields); derived fields are computed
+            once and dropped, least recently used first,
+            beyond derived_max_mb '''
+        function=get_derived(name)
+        if function is None:
+            return getattr(self,name)
+
+        if name in self.derived:
+            array=self.derived.pop(name)
+        else:
+            with Profiler.span('derived'):
+                array=function(self)
+            array.flags.writeable=False
+        self.derived[name]=array
+
+        total=sum(a.nbytes for a in self.derived.itervalues())/1024.**2
+        while len(self.derived) > 1 and total > self.derived_max_mb:
+            _,old=self.derived.popitem(last=False)
+            total-=old.nbytes/1024.**2
+        return array
+
+    def get_box(self,bbox,margin=0):
+
+        ''' index box (i0,i1,j0,j1) of LON and LAT
+            covering bbox (lx,rx,by,ty) plus margin '''
+        box=[]
+        for axis,lo,hi in [(self.LON,bbox[0],bbox[1]),
+                           (self.LAT,bbox[2],bbox[3])]:
+            idx=np.where((axis>=lo) & (axis<=hi))[0]
+            if idx.size == 0:
+                box.extend([0,0])
+                continue
+            box.append(max(idx.min()-margin,0))
+            box.append(min(idx.max()+margin+1,axis.size))
+        return tuple(box)
+
+    def read_hyperslab(self,levels,box):
+
+        ''' reads levels and box (i0,i1,j0,j1) of all
+            fields into the (x,y,z) arrays '''
+        nx,ny,nz=self.LON.size,self.LAT.size,self.Z.size
+        i0,i1,j0,j1=box
+        if i1 <= i0 or j1 <= j0:
+            return
+
+        ''' derived from the fields read so far '''
+        self.derived.clear()
+
+        with Profiler.span('ingest'):
+            synth = Dataset(self.file,'r')
+            for field,name in self.field_names.iteritems():
+                var=synth.variables[name]
+                scale = getattr(var,'scale_factor')
+
+                ''' (time,z,y,x) in file '''
+                if var.ndim == 4:
+                    data=var[0,levels,j0:j1,i0:i1]/scale
+                else:
+                    data=var[levels,j0:j1,i0:i1]/scale
+
+                array=getattr(self,field)
+                if array is None:
+                    array=np.full((nx,ny,nz),np.nan,dtype=np.float32)
+                    setattr(self,field,array)
+                array.flags.writeable=True
+                array[i0:i1,j0:j1,levels]=get_missing_as_nan(self.adjust_dimensions(data))
+                array.flags.writeable=False
+            synth.close()
 
 
     def set_axes(self,config):
@@ -172,8 +571,9 @@ class Synthesis(object):
             setattr(self,axis,self.read_synth(value))
 
         ref_point = [38.3191, -123.0729] # Bodega Bay
-        self.LAT = self.set_geoGrid('latitude',ref_point)
-        self.LON = self.set_geoGrid('longitude',ref_point)
+        with Profiler.span('geogrid'):
+            self.LAT = self.set_geoGrid('latitude',ref_point)
+            self.LON = self.set_geoGrid('longitude',ref_point)
 
 
     def set_time(self):
@@ -192,7 +592,7 @@ class Synthesis(object):
         else:
             scale = getattr(synth.variables[var],'scale_factor')
             array = np.squeeze(synth.variables[var][:])/scale 
-            array = self.adjust_dimensions(array)
+            array = get_missing_as_nan(self.adjust_dimensions(array))
 
         # close netCDF  file.
         synth.close()
@@ -239,12 +639,12 @@ class Synthesis(object):
 
         print "\nArray shapes:"
         print "--------------------"
+        ''' arrays only; bookkeeping attributes (loaded,
+            derived_max_mb, ...) and fields not read yet
+            (lazy) are skipped '''
         for attr, value in self.__dict__.iteritems():    
-            if attr not in ['file', 'start','end'] and len(value)>0:
-                try:
-                    print ( "%4s = %s" % (attr, value.shape) )
-                except AttributeError:
-                    print ( "%4s = %s" % (attr, len(value) ) )
+            if hasattr(value,'shape') and value.size>0:
+                print ( "%4s = %s" % (attr, value.shape) )
         print ""
 
     def print_axis(self,axis):
@@ -321,3 +721,202 @@ class Synthesis(object):
 
 
 
+
+class SynthesisCollection(object):
+    """ Stack of CEDRIC syntheses sharing the same grid.
+
+        Legs are opened lazily and each field is stacked
+        into a memory-mapped (leg,x,y,z) array the first
+        time it is requested, so cross-leg statistics do not
+        need to reload every file through vitas.main.
+
+        Use:
+            legs = ['c03/leg01.cdf','c03/leg02.cdf','c04/leg10.cdf']
+            C = SynthesisCollection(legs,config)
+            c03 = C.select(case='c03')
+            dbz = c03.get_field('DBZ')  # (leg,x,y,z)
+    """
+    def __init__(self,files,config,**kwargs):
+
+        self.config = config
+        self.files = list(files)
+        self.folder = config['folder_synthesis']
+        self.legs = []
+        self.X = None
+        self.Y = None
+        self.Z = None
+        self.LAT = None
+        self.LON = None
+        self.start = None
+        self.end = None
+
+        ''' memory-mapped stacks shared among selections '''
+        self._store = kwargs.get('store',None)
+        self._index = kwargs.get('index',None)
+
+        ''' legs already opened by a parent collection '''
+        self.legs = kwargs.get('legs',None)
+        if self.legs is None:
+            self.legs = [self._open_leg(f) for f in self.files]
+
+        self.start = np.array([leg['start'] for leg in self.legs])
+        self.end = np.array([leg['end'] for leg in self.legs])
+
+        if self._store is None:
+            self._store = {'tmpdir':None,'fields':{},'filled':{},
+                           'grid':None,'legs':self.legs}
+        if self._index is None:
+            self._index = range(len(self.legs))
+
+        if self._store['grid'] is not None:
+            self._set_grid(self._store['grid'])
+
+    def __len__(self):
+        return len(self.legs)
+
+    def _open_leg(self,f):
+
+        ''' reads only the time of the leg '''
+        if f.startswith('/'):
+            path = f
+        else:
+            path = self.folder+'/'+f
+        synth = Synthesis(path)
+        synth.set_time()
+        parts = f.split('/')
+        leg = {}
+        leg['file'] = f
+        leg['case'] = parts[-2] if len(parts) > 1 else None
+        leg['leg'] = parts[-1].replace('.cdf','')
+        leg['start'] = synth.start
+        leg['end'] = synth.end
+        leg['synth'] = synth
+        return leg
+
+    def __getitem__(self,field):
+        return self.get_field(field)
+
+    @property
+    def time(self):
+        ''' mid time of each leg '''
+        return np.array([st+(en-st)/2 for st,en in zip(self.start,self.end)])
+
+    def _set_grid(self,grid):
+        self.X = grid['X']
+        self.Y = grid['Y']
+        self.Z = grid['Z']
+        self.LAT = grid['LAT']
+        self.LON = grid['LON']
+
+    def _load_grid(self):
+
+        ''' axes are taken from the first leg '''
+        synth = self.legs[0]['synth']
+        synth.set_axes(self.config)
+        grid = {'X':synth.X, 'Y':synth.Y, 'Z':synth.Z,
+                'LAT':synth.LAT, 'LON':synth.LON}
+        self._store['grid'] = grid
+        self._set_grid(grid)
+
+    def _make_stack(self,field):
+
+        import atexit
+        import shutil
+        import tempfile
+
+        if self._store['grid'] is None:
+            self._load_grid()
+
+        if self._store['tmpdir'] is None:
+            tmpdir = tempfile.mkdtemp(prefix='vitas_collection_')
+            ''' removed by close() or when python exits '''
+            atexit.register(shutil.rmtree,tmpdir,True)
+            self._store['tmpdir'] = tmpdir
+
+        ''' the stack has a slot for every leg of the parent
+            collection; legs are read when first requested '''
+        legs = self._store['legs']
+        shape = (len(legs),self.X.size,self.Y.size,self.Z.size)
+        fname = self._store['tmpdir']+'/'+field+'.dat'
+        stack = np.memmap(fname,dtype=np.float32,mode='w+',shape=shape)
+
+        self._store['fields'][field] = stack
+        self._store['filled'][field] = set()
+        return stack
+
+    def _fill_stack(self,field,index):
+
+        ''' reads the legs of index not stacked yet '''
+        stack = self._store['fields'][field]
+        filled = self._store['filled'][field]
+        legs = self._store['legs']
+
+        varname = self.config['synthesis_field_name'][field]
+        for n in index:
+            if n in filled:
+                continue
+            leg = legs[n]
+            array = leg['synth'].read_synth(varname)
+            if array.shape != stack.shape[1:]:
+                raise ValueError('Grid of '+leg['file']+' '+str(array.shape)+
+                                 ' does not match '+str(stack.shape[1:]))
+            stack[n] = array
+            filled.add(n)
+        stack.flush()
+
+    def get_field(self,field):
+
+        ''' returns a (leg,x,y,z) view of field; only the
+            legs of this collection are read '''
+        try:
+            stack = self._store['fields'][field]
+        except KeyError:
+            stack = self._make_stack(field)
+        self._fill_stack(field,self._index)
+
+        idx = self._index
+        if len(idx) == len(stack) and list(idx) == range(len(stack)):
+            return stack
+        elif len(idx) > 0 and list(idx) == range(idx[0],idx[-1]+1):
+            ''' contiguous legs are returned as a view '''
+            return stack[idx[0]:idx[-1]+1]
+        else:
+            return stack[list(idx)]
+
+    def select(self,start=None,end=None,case=None):
+
+        ''' returns a collection with legs overlapping
+            [start,end] and belonging to case(s)
+        '''
+        if isinstance(case,basestring):
+            case = [case]
+
+        files = []
+        index = []
+        legs = []
+        for n,leg in zip(self._index,self.legs):
+            if start is not None and leg['end'] < start:
+                continue
+            if end is not None and leg['start'] > end:
+                continue
+            if case is not None and leg['case'] not in case:
+                continue
+            files.append(leg['file'])
+            index.append(n)
+            legs.append(leg)
+
+        return SynthesisCollection(files,self.config,
+                                   store=self._store,
+                                   index=index,
+                                   legs=legs)
+
+    def close(self):
+
+        ''' removes memory-mapped stacks from disk '''
+        import shutil
+
+        self._store['fields'].clear()
+        self._store['filled'].clear()
+        if self._store['tmpdir'] is not None:
+            shutil.rmtree(self._store['tmpdir'],ignore_errors=True)
+            self._store['tmpdir'] = None
@@ -36,6 +36,26 @@ def coords_prof(s):
         raise argparse.ArgumentTypeError("Coordinates must be (lat,lon)")
 
 
+''' fields of the synthesis and derived fields
+    (AircraftAnalysis.derived_fields) '''
+field_names=['DBZ','SPD','CON','VOR','U','V','WVA','WUP',
+             'DIR','TSPD','ZETA','DIV']
+
+def field(s):
+    ''' field name or COMP<azimuth> (wind component) '''
+    if s in field_names:
+        return s
+    try:
+        if s.startswith('COMP'):
+            float(s[4:])
+            return s
+    except ValueError:
+        pass
+    raise argparse.ArgumentTypeError("Field must be one of "+
+                                     ",".join(field_names)+
+                                     " or COMP<azimuth>")
+
+
 def start(params=None):
 
     parser = argparse.ArgumentParser(description=usage(),
@@ -58,10 +78,28 @@ def start(params=None):
                             metavar='file',
                             required=False,
                             help=    "netCDF NOAA-P3 standard tape file using RAF format." \
-                                    "\nExample: 010123I.nc")
+                                    "\nExample: 010123I.nc" \
+                                    "\nIf omitted, the tape covering the synthesis time is used")
     group_input.add_argument('--print_list_synth',
                             action='store_true',
                             help="print list with synthesis availables")
+    group_input.add_argument('--case',
+                            metavar='str',
+                            nargs='+',
+                            default=None,
+                            help="list only syntheses of given case(s)." \
+                                    "\nExample: c03 c07")
+    group_input.add_argument('--over',
+                            metavar='str',
+                            default=None,
+                            help="list only syntheses covering a location in vitas.config markers_locations")
+    group_input.add_argument('--hours',
+                            metavar='hour (int)',
+                            type=int,
+                            nargs=2,
+                            default=None,
+                            help="list only syntheses overlapping given UTC hours (wraps past midnight)." \
+                                    "\nExample: 18 22")
     
     """ Plot Options """
     plot_options=parser.add_argument_group('Plot options')
@@ -100,9 +138,11 @@ def start(params=None):
     group_fields.add_argument('--field', '-f',
                             metavar='STR',
                             nargs='+',
-                            choices=['DBZ','SPD','CON','VOR','U','V','WVA','WUP'],
+                            type=field,
                             default=None,
-                            help="specify radar field(s) to be plotted")    
+                            help="specify radar field(s) to be plotted: " \
+                            +",".join(field_names)+" or COMP<azimuth> " \
+                            "(wind component toward azimuth [deg])")    
 
     """ Print Options """
     print_options=parser.add_argument_group('Print options')
@@ -112,6 +152,13 @@ def start(params=None):
     print_options.add_argument('--print_global_atts',
                             action='store_true',
                             help="print CEDRIC file global attributes and exit")    
+    print_options.add_argument('--profile',
+                            metavar='prefix',
+                            nargs='?',
+                            const='vitas_profile',
+                            default=None,
+                            help="print timing and peak memory of each step and \
+                                    save them in prefix.txt and prefix.json")
     print_options.add_argument('--print_axis','-pa',
                             metavar='STR',
                             nargs='+',
@@ -139,6 +186,12 @@ def start(params=None):
                             required=False,
                             help=" initial coordinate, azimuth [degrees], and \
                                     distance [km] for cross section")
+    slice_options.add_argument('--curtain', '-cu',
+                            metavar='spacing (float)',
+                            type=float,
+                            required=False,
+                            help="vertical section along the flight track with \
+                                    given along-track spacing [km]")
 
     """ Terrain options """
     terrain_options=parser.add_argument_group('Terrain options')
@@ -0,0 +1,330 @@
+#
+# Catalog of CEDRIC syntheses and standard tapes
+#
+# The catalog is a small JSON index that records
+# time coverage, geographic extent and fields of each
+# synthesis leg, together with the time coverage of the
+# standard tapes. It is updated incrementally using the
+# modification time of each file.
+#
+# Use:
+#     import Catalog
+#     cat = Catalog.build(config)
+#     legs = Catalog.query(cat, over='BBY', hours=(18,22))
+#
+
+import os
+import json
+import datetime
+
+import numpy as np
+
+from netCDF4 import Dataset
+
+''' same reference point used by AircraftAnalysis.Synthesis '''
+ref_point = [38.3191, -123.0729] # Bodega Bay
+
+time_fmt = '%Y-%m-%d %H:%M:%S'
+
+
+def get_catalog_file(config):
+
+    ''' catalog_file of vitas.config or vitas_catalog.json
+        in folder_synthesis (not in the current folder) '''
+    if 'catalog_file' in config:
+        return config['catalog_file']
+    else:
+        return os.path.join(config['folder_synthesis'], 'vitas_catalog.json')
+
+
+def in_hours(entry, hours):
+
+    ''' True if [start,end] of the leg overlaps the UTC
+        hours of the day [h0,h1); h0 > h1 wraps past
+        midnight, e.g. (22,2) '''
+    start = datetime.datetime.strptime(entry['start'], time_fmt)
+    end = datetime.datetime.strptime(entry['end'], time_fmt)
+    duration = (end-start).total_seconds()/3600.
+    width = (hours[1]-hours[0]) % 24
+    if duration >= 24 or width == 0:
+        return True
+
+    t0 = start.hour+start.minute/60.+start.second/3600.
+    for shift in [-24, 0, 24]:
+        if t0+shift < hours[0]+width and t0+duration+shift >= hours[0]:
+            return True
+    return False
+
+
+def load(config):
+
+    catfile = get_catalog_file(config)
+    if os.path.isfile(catfile):
+        with open(catfile) as f:
+            catalog = json.load(f)
+    else:
+        catalog = {'synthesis':{}, 'flight':{}}
+
+    return catalog
+
+
+def save(catalog, config):
+
+    catfile = get_catalog_file(config)
+    with open(catfile,'w') as f:
+        json.dump(catalog, f, indent=1, sort_keys=True)
+
+
+def build(config, verbose=False):
+
+    ''' scans synthesis and flight level folders
+        and updates entries whose files changed
+    '''
+    catalog = load(config)
+
+    ''' standard tapes '''
+    changed = update_flights(catalog, config, verbose=verbose)
+
+    ''' syntheses with format CaseName/LegName '''
+    synthpath = config['folder_synthesis']
+    found = []
+    for case in sorted(os.listdir(synthpath)):
+        if not os.path.isdir(synthpath+'/'+case):
+            continue
+        for fname in sorted(os.listdir(synthpath+'/'+case)):
+            if not fname.endswith('.cdf'):
+                continue
+            key = case+'/'+fname
+            found.append(key)
+            fullpath = synthpath+'/'+key
+            mtime = os.path.getmtime(fullpath)
+            entry = catalog['synthesis'].get(key)
+            if entry is None or entry['mtime'] != mtime:
+                if verbose:
+                    print 'Indexing '+key
+                entry = index_synthesis(fullpath, config)
+                entry['mtime'] = mtime
+                entry['case'] = case
+                catalog['synthesis'][key] = entry
+                changed = True
+    for key in catalog['synthesis'].keys():
+        if key not in found:
+            del catalog['synthesis'][key]
+            changed = True
+
+    ''' match std tapes (flight entries might have changed) '''
+    for key, entry in catalog['synthesis'].iteritems():
+        stdtape = match_stdtape(catalog, entry['start'], entry['end'])
+        if entry.get('stdtape') != stdtape:
+            entry['stdtape'] = stdtape
+            changed = True
+
+    if changed:
+        save(catalog, config)
+
+    return catalog
+
+
+def update_flights(catalog, config, verbose=False):
+
+    ''' indexes time coverage of new or modified
+        std tapes; returns True if catalog changed
+    '''
+    changed = False
+    stdpath = config['folder_flight_level']
+    found = []
+    for fname in sorted(os.listdir(stdpath)):
+        if not fname.endswith('.nc'):
+            continue
+        found.append(fname)
+        fullpath = stdpath+'/'+fname
+        mtime = os.path.getmtime(fullpath)
+        entry = catalog['flight'].get(fname)
+        if entry is None or entry['mtime'] != mtime:
+            if verbose:
+                print 'Indexing '+fname
+            catalog['flight'][fname] = index_stdtape(fullpath)
+            catalog['flight'][fname]['mtime'] = mtime
+            changed = True
+    for fname in catalog['flight'].keys():
+        if fname not in found:
+            del catalog['flight'][fname]
+            changed = True
+
+    return changed
+
+
+def index_synthesis(synthfile, config):
+
+    import AircraftAnalysis as AA
+
+    synth = AA.Synthesis(synthfile)
+    synth.set_time()
+
+    nc = Dataset(synthfile,'r')
+    grid = config['synthesis_grid_name']
+    x = nc.variables[grid['X']][:]
+    y = nc.variables[grid['Y']][:]
+    z = nc.variables[grid['Z']][:]
+    ncvars = nc.variables.keys()
+    nc.close()
+
+    ''' only endpoints are needed for the extent '''
+    synth.X = np.array([x.min(), x.max()])
+    synth.Y = np.array([y.min(), y.max()])
+    lons = synth.set_geoGrid('longitude', ref_point)
+    lats = synth.set_geoGrid('latitude', ref_point)
+
+    fields = [k for k,v in config['synthesis_field_name'].iteritems()
+                if v in ncvars]
+
+    entry = {}
+    entry['start'] = synth.start.strftime(time_fmt)
+    entry['end'] = synth.end.strftime(time_fmt)
+    entry['extent'] = [float(lons[0]), float(lons[1]),
+                       float(lats[0]), float(lats[1])]
+    entry['shape'] = [len(x), len(y), len(z)]
+    entry['fields'] = sorted(fields)
+
+    return entry
+
+
+def index_stdtape(stdfile):
+
+    ''' time coverage from base_time and the first
+        and last values of Time; the remaining variables
+        of the tape are not read
+    '''
+    nc = Dataset(stdfile,'r')
+    base_time = float(nc.variables['base_time'][:])
+    secs = nc.variables['Time']
+    t0 = float(secs[0])
+    t1 = float(secs[-1])
+    nc.close()
+
+    epoch = datetime.datetime(1970,1,1)
+    entry = {}
+    entry['start'] = (epoch+datetime.timedelta(seconds=base_time+t0)).strftime(time_fmt)
+    entry['end'] = (epoch+datetime.timedelta(seconds=base_time+t1)).strftime(time_fmt)
+
+    return entry
+
+
+def match_stdtape(catalog, start, end):
+
+    ''' returns the std tape covering [start,end] or,
+        if none covers the whole window, the tape with
+        the largest overlap; None if no tape overlaps
+    '''
+    if isinstance(start, datetime.datetime):
+        start = start.strftime(time_fmt)
+    if isinstance(end, datetime.datetime):
+        end = end.strftime(time_fmt)
+
+    st = datetime.datetime.strptime(start, time_fmt)
+    en = datetime.datetime.strptime(end, time_fmt)
+
+    best = None
+    best_overlap = 0
+    for fname, entry in sorted(catalog['flight'].iteritems()):
+        fst = datetime.datetime.strptime(entry['start'], time_fmt)
+        fen = datetime.datetime.strptime(entry['end'], time_fmt)
+        if fst <= st and fen >= en:
+            return fname
+        overlap = (min(en,fen)-max(st,fst)).total_seconds()
+        if overlap > best_overlap:
+            best = fname
+            best_overlap = overlap
+
+    return best
+
+
+def resolve_stdtape(cedfile, config):
+
+    ''' returns the name of the std tape in folder_flight_level
+        that matches the time window of cedfile (CaseName/LegName)
+    '''
+    import AircraftAnalysis as AA
+
+    catalog = load(config)
+    changed = update_flights(catalog, config)
+
+    synthfile = config['folder_synthesis']+'/'+cedfile
+    entry = catalog['synthesis'].get(cedfile)
+    if entry is not None and entry['mtime'] == os.path.getmtime(synthfile):
+        start, end = entry['start'], entry['end']
+    else:
+        synth = AA.Synthesis(synthfile)
+        synth.set_time()
+        start, end = synth.start, synth.end
+
+    stdtape = match_stdtape(catalog, start, end)
+
+    if entry is not None and entry.get('stdtape') != stdtape:
+        entry['stdtape'] = stdtape
+        changed = True
+
+    if changed:
+        save(catalog, config)
+
+    return stdtape
+
+
+def query(catalog, **kwargs):
+
+    ''' query legs by time, hours of the day, case and
+        location; returns a sorted list of (key,entry)
+
+        kwargs:
+            start, end: datetime or string with time_fmt
+            hours: (h0,h1) UTC hours of the day overlapping
+                   the leg (h0 > h1 wraps past midnight)
+            case: str or list of str
+            over: (lat,lon) or name in markers_locations
+            config: needed when over is a name
+    '''
+    start = kwargs.get('start', None)
+    end = kwargs.get('end', None)
+    hours = kwargs.get('hours', None)
+    case = kwargs.get('case', None)
+    over = kwargs.get('over', None)
+
+    if isinstance(start, datetime.datetime):
+        start = start.strftime(time_fmt)
+    if isinstance(end, datetime.datetime):
+        end = end.strftime(time_fmt)
+    if isinstance(case, basestring):
+        case = [case]
+    if isinstance(over, basestring):
+        loc = kwargs['config']['markers_locations'][over]
+        over = (loc['lat'], loc['lon'])
+
+    out = []
+    for key, entry in sorted(catalog['synthesis'].iteritems()):
+        if start is not None and entry['end'] < start:
+            continue
+        if end is not None and entry['start'] > end:
+            continue
+        if case is not None and entry['case'] not in case:
+            continue
+        if hours is not None and not in_hours(entry, hours):
+            continue
+        if over is not None:
+            lx, rx, by, ty = entry['extent']
+            lat, lon = over
+            if not (lx <= lon <= rx and by <= lat <= ty):
+                continue
+        out.append((key, entry))
+
+    return out
+
+
+def print_list(legs):
+
+    print "\n{:<16}{:<22}{:<22}{:<12}".format('Synthesis','Start (UTC)','End (UTC)','Std tape')
+    print "-"*72
+    for key, entry in legs:
+        print "{:<16}{:<22}{:<22}{:<12}".format(key, entry['start'],
+                                                entry['end'],
+                                                str(entry['stdtape']))
+    print ""
@@ -186,6 +186,34 @@ def get_distance_along_flight_track(**kwargs):
 	else:
 		return distance_from_p0
 
+def get_cumulative_distance(**kwargs):
+
+	''' cumulative distance along track [km] using
+		the haversine formula (vectorized) 
+	'''
+	lat=np.radians(np.asarray(kwargs['lat'],dtype=float))
+	lon=np.radians(np.asarray(kwargs['lon'],dtype=float))
+	earth_radius=6371.0 #[km]
+
+	dlat=np.diff(lat)
+	dlon=np.diff(lon)
+	a=np.sin(dlat/2)**2+np.cos(lat[:-1])*np.cos(lat[1:])*np.sin(dlon/2)**2
+	step=2*earth_radius*np.arcsin(np.sqrt(a))
+	step[np.isnan(step)]=0
+
+	return np.concatenate(([0.],np.cumsum(step)))
+
+def get_ticks_every(distance,frequency):
+
+	''' indices of the samples closest to every
+		frequency [km] of a monotonic distance array
+	'''
+	search=np.asarray(distance)
+	if search.size == 0:
+		return np.array([],dtype=int)
+	target=np.arange(0,int(search[-1]),frequency)
+	return find_nearest2(search,target)
+
 def round_to_closest_int(value,base):
 
 	if isinstance(value,Sequence):
@@ -5,8 +5,8 @@
 # July 2015
 
 
-import Terrain as TR
 import AircraftAnalysis as AA 
+import Profiler
 import sys
 
 def set_working_files(**kwargs):
@@ -31,27 +31,21 @@ def set_working_files(**kwargs):
 		stdpath=config['folder_flight_level']
 		dtmfile=config['filepath_dtm']
 
-		synthfile = synthpath+'/'+cedfile
 		flightfile = stdpath+'/'+stdfile
 
 		""" creates a synthesis instance """
-		try:
-			SYNTH=AA.Synthesis(synthfile)		
-			SYNTH.set_fields(config)
-			SYNTH.set_axes(config)
-			SYNTH.set_time()
-		except RuntimeError:
-			print "Input Synth Error: check path or file name\n"
-			sys.exit()
+		SYNTH=get_synthesis(cedfile,config)
 
 		""" creates a std tape instance """
 		try:
-			FLIGHT=AA.Flight(flightfile)
+			with Profiler.span('ingest'):
+				FLIGHT=AA.Flight(flightfile)
 		except RuntimeError:
 			print "Input Flight Error: check path or file name\n"
 			sys.exit()
 
 		""" creates terrain instance """
+		import Terrain as TR
 		try:
 			TERRAIN=TR.Terrain(dtmfile)
 		except RuntimeError:
@@ -66,3 +60,22 @@ def set_working_files(**kwargs):
 		print "Error in Filehandler.py"
 		sys.exit()
 
+def get_synthesis(cedfile,config,lazy=False):
+
+	""" synthesis instance only; used by print
+		options that do not need flight or terrain.
+		With lazy, fields are read by SYNTH.require()
+	"""
+	synthfile = config['folder_synthesis']+'/'+cedfile
+	try:
+		with Profiler.span('ingest'):
+			SYNTH=AA.Synthesis(synthfile)		
+			SYNTH.set_fields(config,lazy=lazy)
+			SYNTH.set_axes(config)
+			SYNTH.set_time()
+	except RuntimeError:
+		print "Input Synth Error: check path or file name\n"
+		sys.exit()
+
+	return SYNTH
+
@@ -15,13 +15,12 @@ import matplotlib.colors as colors
 import matplotlib.cm as cmx
 import matplotlib.pyplot as plt
 import Common as cm 
-import pandas as pd
+import Profiler
+import Smoothing
 import numpy as np
 import seaborn as sns 
 
-from itertools import product
 from scipy.spatial import cKDTree
-import statsmodels.api as sm
 from scipy.interpolate import UnivariateSpline
 
 ''' set color codes in seaborn '''
@@ -46,6 +45,7 @@ class FlightPlot(object):
             elif key == 'time':
                 self.time=value
 
+    @Profiler.timed('rendering')
     def plot_meteo(self,xaxis,dots):
 
         topo=Terrain.get_topo(lats=self.met['lats'], lons=self.met['lons'])
@@ -124,10 +124,12 @@ class FlightPlot(object):
             data is achieved by:
 
             1) Find all the indexes of the synth grid where the flight trajectory intersects
+               (nearest grid cells are given by the flight track index)
             2) Filter out repeated indexes of the trajectory (LINE)
             3) Save geographic coordinates of the LINE
-            4) In the synth grid, search the 9 nearest neighbors along each point of LINE
-            5) Fill missing synth values by averaging the neighbors
+            4) Average the synth grid over 3x3 cells ignoring missing
+               values (Smoothing.box_mean), which also fills them
+            5) Take raw and averaged synth values at each point of LINE
             6) In the flight data, search 15 values nearest to each point of LINE 
             7) Average each set of 15 values of the flight array
         """
@@ -143,7 +145,6 @@ class FlightPlot(object):
         idx = np.where(synth_z==zlevel)
         data = np.squeeze(synth[:,:,idx])
 
-        flgt_lats,flgt_lons=zip(*self.flightPath)
         flight_altitude=self.met['palt']
         
         if flightmet in ['u','v']:
@@ -159,16 +160,11 @@ class FlightPlot(object):
             flight_wspd=self.met[flightmet]
             
 
-        flgt_lats = np.asarray(cm.around(flgt_lats,4))
-        flgt_lons = np.asarray(cm.around(flgt_lons,4))
         synth_lats = np.asarray(cm.around(synth_lats,4))
         synth_lons = np.asarray(cm.around(synth_lons,4))
 
-        idx_lat=[]
-        idx_lon=[]
-        for lat,lon in zip(flgt_lats,flgt_lons):
-            idx_lat.append(cm.find_index_recursively(array=synth_lats,value=lat,decimals=4))
-            idx_lon.append(cm.find_index_recursively(array=synth_lons,value=lon,decimals=4))
+        """ nearest grid cells along the track (from the track index) """
+        idx_lon,idx_lat=kwargs['cells']
 
         """ filter out repeated indexes """
         indexes_filtered=[]
@@ -190,44 +186,19 @@ class FlightPlot(object):
             line_lat.append(synth_lats[lat])            
         linesynth=zip(line_lon,line_lat)
 
-        """ search nearest neighbors """
-        synth_coord=list(product(synth_lons,synth_lats))
-        tree = cKDTree(synth_coord)
-        neigh = 9
-        dist, idx = tree.query(linesynth, k=neigh, eps=0, p=2, distance_upper_bound=0.1)
-
-        """ convert to one-column array """
-        grid_shape=data.shape
-        data = data.reshape(grid_shape[0]*grid_shape[1],1)
-
-        """ gets the center point """
-        idx_split=zip(*idx)
-        idx0 = list(idx_split[0])
+        """ average 3x3 neighbors of every cell """
+        data = np.ma.filled(np.ma.asarray(data,dtype=float),np.nan)
+        data_mean = Smoothing.box_mean(data, 3)
 
-        """ extract center point value """
-        data_extract=data[idx0]
+        """ raw and averaged values at center points of line """
+        line_center = indexes_filtered
+        data_extract = [data[i,j] for i,j in line_center]
+        data_extract2 = [data_mean[i,j] for i,j in line_center]
 
-        """ average neighbors """
-        data_extract2=[]
-        for i in idx:
-            data_extract2.append(np.nanmean(data[i]))
-
-        """ save center points of line """
-        line_center=[]
-        line_neighbors=[]
-        for i in idx:
-            value=np.unravel_index(i[0], grid_shape)
-            line_center.append(value)
-            for j in i[1:]:
-                value=np.unravel_index(j, grid_shape)
-                line_neighbors.append(value)
-
-        """ convert back to 2D array """
-        data=data.reshape(121,131)
-    
 
         """ swap coordinates to (lon,lat)"""
-        flight_coord = [(t[1], t[0]) for t in self.flightPath]
+        flight_coord = np.column_stack((self.flightPath.lons,
+                                        self.flightPath.lats))
         tree = cKDTree(flight_coord)
         neigh = 15
         dist, idx = tree.query(linesynth, k=neigh, eps=0, p=2, distance_upper_bound=0.1)
@@ -243,7 +214,7 @@ class FlightPlot(object):
         """ make plots """
 
         jet = plt.get_cmap('jet')
-        cNorm = colors.Normalize(vmin=np.amin(data), vmax=np.amax(data))
+        cNorm = colors.Normalize(vmin=np.nanmin(data), vmax=np.nanmax(data))
         scalarMap = cmx.ScalarMappable(norm=cNorm, cmap=jet)
         synth_alt=str(int(zlevel[0]*1000))
         flgt_alt=str(int(np.average(flgt_altitude)))
@@ -323,6 +294,7 @@ class FlightPlot(object):
             #-------------
             # regression
             #=============
+            import statsmodels.api as sm
             xs = x[~np.isnan(y)]
             ys = y[~np.isnan(y)]
             model=sm.OLS(ys,xs)
@@ -367,16 +339,15 @@ class FlightPlot(object):
         print met.corr()
         print "------------------------\n"
 
-    def plot_wind_comp_var(self,data,xaxis):
-
-        met=data[['wdir','wspd','wvert']]
+    def plot_wind_comp_var(self,moments,xaxis):
 
         ''' wind components and their variance'''
-        u_comp,v_comp = get_wind_components(met.wspd,met.wdir)
-        w_comp=met.wvert
-        u_var = pd.rolling_var(u_comp,60,center=True)
-        v_var = pd.rolling_var(v_comp,60,center=True)
-        w_var = pd.rolling_var(w_comp,60,center=True)
+        u_comp=moments.u
+        v_comp=moments.v
+        w_comp=moments.w
+        u_var = moments.u_var
+        v_var = moments.v_var
+        w_var = moments.w_var
         fig,(ax1,ax2,ax3) = plt.subplots(3,sharex=True)
         fs=14
         xpos=0.02
@@ -401,18 +372,12 @@ class FlightPlot(object):
         fig.subplots_adjust(hspace=0.1)
         plt.draw()
 
-    def plot_tke(self,data,xaxis):
+    def plot_tke(self,data,moments,xaxis):
 
-        met=data[['wdir','wspd','wvert','lats','lons']]
+        met=data[['lats','lons']]
         topo=np.asarray(Terrain.get_topo(lats=met['lats'], lons=met['lons']))
 
-        u_comp,v_comp = get_wind_components(met.wspd,met.wdir)
-        w_comp=met.wvert
-        u_var = pd.rolling_var(u_comp,60,center=True)
-        v_var = pd.rolling_var(v_comp,60,center=True)
-        w_var = pd.rolling_var(w_comp,60,center=True)
-
-        tke = 0.5*(u_var+v_var+w_var)
+        tke = moments.tke
         plt.figure()
         plt.plot(xaxis,tke)
         ax=plt.gca()
@@ -422,12 +387,12 @@ class FlightPlot(object):
         add_second_y_in(ax,topo,xaxis=xaxis,color='g',label='Topography [m]')
         plt.draw()
 
-    def plot_vertical_heat_flux(self,data,xdata):
+    def plot_vertical_heat_flux(self,data,moments,xdata):
 
-        met=data[['theta','wvert','lats','lons']]
+        met=data[['lats','lons']]
         topo=np.asarray(Terrain.get_topo(lats=met['lats'], lons=met['lons']))
         
-        v_heatflux = pd.rolling_cov(met.wvert, met.theta, 60, center=True)
+        v_heatflux = moments.heat_flux
 
         plt.figure()
         plt.plot(xdata,v_heatflux)
@@ -438,17 +403,14 @@ class FlightPlot(object):
         add_second_y_in(ax,topo,xaxis=xdata, color='r',label='Topography [m]')
         plt.draw()
 
-    def plot_vertical_momentum_flux(self,data,xdata,terrain):
+    def plot_vertical_momentum_flux(self,data,moments,xdata,terrain):
 
-        met=data[['wdir','wspd','wvert','lats','lons']]
+        met=data[['lats','lons']]
         # topo=np.asarray(Terrain.get_topo(lats=met['lats'], lons=met['lons']))
         topo2=np.asarray(Terrain.get_topo2(lats=met['lats'], lons=met['lons'],terrain=terrain))
 
-        u_comp,v_comp = get_wind_components(met.wspd,met.wdir)
-        w_comp=met.wvert
-
-        u_moflux = pd.rolling_cov(u_comp, w_comp, 60, center=True)
-        v_moflux = pd.rolling_cov(v_comp, w_comp, 60, center=True)
+        u_moflux = moments.u_moflux
+        v_moflux = moments.v_moflux
 
         fig, ax = plt.subplots(2,1, sharex=True)
         l1=ax[0].plot(xdata,u_moflux,label='U-moment')
@@ -467,20 +429,15 @@ class FlightPlot(object):
 
         plt.draw()
 
-    def plot_turbulence_spectra(self,data):
+    def plot_turbulence_spectra(self,data,spectra):
         
-        from scipy import fftpack
-
         array=np.squeeze(data[['wvert']].values)
         galt=np.squeeze(data[['galt']].values)
         acft_alt=np.mean(galt)
-        variance=np.var(array)
+        variance=spectra['variance']['wvert']
 
-        print array.size
-        F = fftpack.fft(array)
-        cut_half = int(len(array)/2)
-        ps = 2*np.abs( F[:cut_half] )**2
-        freq=np.linspace(1,len(ps),len(ps))/len(F)
+        freq=spectra['freq']
+        ps=spectra['psd']['wvert']
         
         ' power density '
         fig,ax=plt.subplots(2,1,figsize=(8,10))
@@ -489,7 +446,7 @@ class FlightPlot(object):
 
         ' intertial subrange '
         x=np.linspace(0.005, 0.5, 1000)
-        inertial = x**(-5/3.)
+        inertial = x**(-5/3.)*ps[0]*freq[0]**(5/3.)
         ln=ax[1].loglog(x,inertial,linestyle='--',color='k',linewidth=3,label='-5/3')
 
         ' set spectrum label to seconds '
@@ -498,14 +455,17 @@ class FlightPlot(object):
             xSeconds.append(int(1/x))
         ax[1].set_xticklabels(xSeconds)
 
-        ax[0].text(0.1,0.15,'Variance:' + '{:2.1f}'.format(variance),transform=ax[0].transAxes,weight='bold')
-        ax[0].text(0.1,0.1,'Acft altitude: '+ '{:2.1f}'.format(acft_alt)+' m MSL',transform=ax[0].transAxes,weight='bold')
+        slope=spectra['slope']['wvert']
+        eps=spectra['eps']
+        ax[0].text(0.1,0.2,'Variance:' + '{:2.1f}'.format(variance),transform=ax[0].transAxes,weight='bold')
+        ax[0].text(0.1,0.15,'Acft altitude: '+ '{:2.1f}'.format(acft_alt)+' m MSL',transform=ax[0].transAxes,weight='bold')
+        ax[1].text(0.05,0.1,'Inertial slope: '+'{:2.2f}'.format(slope),transform=ax[1].transAxes,weight='bold')
+        ax[1].text(0.05,0.05,'Dissipation: '+'{:.1e}'.format(eps)+' m2 s-3',transform=ax[1].transAxes,weight='bold')
         ax[0].set_ylabel('vvel [m s^-1]')
         ax[0].set_xlabel('seconds from beg of leg')
         ax[0].set_ylim([-3,3])
-        ax[1].set_ylim([1e-2,1e7])
         ax[1].set_xlabel('seconds')
-        ax[1].set_ylabel('2|F|^2')
+        ax[1].set_ylabel('PSD [m2 s-2 Hz-1]')
         ax[1].legend(handles=ln)
 
         ax[1].xaxis.grid(b=True, which='minor')
@@ -577,9 +537,3 @@ def adjust_xaxis(axes,new_xticks):
         xticks=axes[i].get_xticks()
         new_xticks = cm.round_to_closest_int(new_xticks,10)
         axes[i].set_xticks(new_xticks)
-
-def get_wind_components(wspd,wdir):
-    deg2rad=np.pi/180
-    u = -wspd*np.sin(wdir*deg2rad)
-    v = -wspd*np.cos(wdir*deg2rad)
-    return u,v
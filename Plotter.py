@@ -12,10 +12,10 @@ import Flightdata as fd
 import Terrain
 import numpy as np
 import Common as cm
+import Profiler
 import matplotlib.pyplot as plt
 #import matplotlib as mpl
 import datetime
-import Windprof2 as wp
 import seaborn as sns
 
 from geographiclib.geodesic import Geodesic
@@ -56,57 +56,92 @@ def print_correlation(SYNTH,FLIGHT):
     flight = fd.FlightPlot(name=flight_name, time=[SYNTH.start, SYNTH.end])
     flight.print_correlation_matrix(data)
 
-def plot_wind_comp_var(SYNTH,FLIGHT):
+def get_turbulence(SYNTH,FLIGHT,**kwargs):
+
+    """ windowed moments are computed once for each
+        time window and window length; kwargs are passed
+        to Turbulence.get_moments (window [s], window_km)
+    """
+    import Turbulence
+
+    window=FLIGHT.get_window(SYNTH.start, SYNTH.end)
+    key=tuple(sorted(kwargs.items()))
+    if key not in window.turbulence:
+        data = FLIGHT.get_meteo(SYNTH.start, SYNTH.end)
+        window.turbulence[key]=Turbulence.get_moments(data,
+                                                      distance=window.distance,
+                                                      **kwargs)
+
+    return window.turbulence[key]
+
+def plot_wind_comp_var(SYNTH,FLIGHT,**kwargs):
 
     flight_xaxis, _ =get_xaxis(SYNTH,FLIGHT)
     flight_name = SYNTH.file[-13:]
-    data = FLIGHT.get_meteo(SYNTH.start, SYNTH.end)
+    moments = get_turbulence(SYNTH,FLIGHT,**kwargs)
     flight = fd.FlightPlot(name=flight_name, time=[SYNTH.start, SYNTH.end])
-    flight.plot_wind_comp_var(data, flight_xaxis)
+    flight.plot_wind_comp_var(moments, flight_xaxis)
 
-def plot_tke(SYNTH,FLIGHT):
+def plot_tke(SYNTH,FLIGHT,**kwargs):
 
     flight_xaxis, _ =get_xaxis(SYNTH,FLIGHT)
     flight_name = SYNTH.file[-13:]
     data = FLIGHT.get_meteo(SYNTH.start, SYNTH.end)
+    moments = get_turbulence(SYNTH,FLIGHT,**kwargs)
     flight = fd.FlightPlot(name=flight_name, time=[SYNTH.start, SYNTH.end])
-    flight.plot_tke(data,flight_xaxis)    
+    flight.plot_tke(data,moments,flight_xaxis)    
 
-def plot_vertical_heat_flux(SYNTH,FLIGHT):
+def plot_vertical_heat_flux(SYNTH,FLIGHT,**kwargs):
 
     flight_xaxis, _ =get_xaxis(SYNTH,FLIGHT)
     flight_name = SYNTH.file[-13:]
     data = FLIGHT.get_meteo(SYNTH.start, SYNTH.end)
+    moments = get_turbulence(SYNTH,FLIGHT,**kwargs)
     flight = fd.FlightPlot(name=flight_name, time=[SYNTH.start, SYNTH.end])
-    flight.plot_vertical_heat_flux(data,flight_xaxis)    
+    flight.plot_vertical_heat_flux(data,moments,flight_xaxis)    
 
-def plot_vertical_momentum_flux(SYNTH,FLIGHT,terrain):
+def plot_vertical_momentum_flux(SYNTH,FLIGHT,terrain,**kwargs):
 
     flight_xaxis, _ =get_xaxis(SYNTH,FLIGHT)
     flight_name = SYNTH.file[-13:]
     data = FLIGHT.get_meteo(SYNTH.start, SYNTH.end)
+    moments = get_turbulence(SYNTH,FLIGHT,**kwargs)
     flight = fd.FlightPlot(name=flight_name, time=[SYNTH.start, SYNTH.end])
-    flight.plot_vertical_momentum_flux(data,flight_xaxis,terrain)    
+    flight.plot_vertical_momentum_flux(data,moments,flight_xaxis,terrain)    
+
+def plot_turbulence_spectra(SYNTH,FLIGHT,**kwargs):
 
-def plot_turbulence_spectra(SYNTH,FLIGHT):
+    """ kwargs are passed to Spectra.get_leg_spectra
+        (method, nperseg, frange, ...)
+    """
+    import Spectra
 
-    # flight_xaxis, _ =get_xaxis(SYNTH,FLIGHT)
     flight_name = SYNTH.file[-13:]
     data = FLIGHT.get_meteo(SYNTH.start, SYNTH.end)
+    spectra = Spectra.get_leg_spectra(FLIGHT, SYNTH.start, SYNTH.end, **kwargs)
     flight = fd.FlightPlot(name=flight_name, time=[SYNTH.start, SYNTH.end])
-    flight.plot_turbulence_spectra(data)    
+    flight.plot_turbulence_spectra(data,spectra)    
+
+def get_flight_curtain(SYNTH,FLIGHT,spacing=0.5):
+
+    """ vertical section of the synthesis following the
+        flight track, resampled every spacing [km]; the same
+        curtain samples any field (curtain.sample(SYNTH.U))
+    """
+    import Section
+
+    window=FLIGHT.get_window(SYNTH.start, SYNTH.end)
+    return Section.Curtain(SYNTH, window.lats, window.lons, spacing=spacing)
 
 def get_xaxis(SYNTH,FLIGHT):
     """ flight path from standard tape """
-    fpath=FLIGHT.get_path(SYNTH.start, SYNTH.end)
-    fp=zip(*fpath)
-    x = fp[1] # longitude
-    y = fp[0] # latitude
+    window=FLIGHT.get_window(SYNTH.start, SYNTH.end)
     frequency=10 #[km]
-    [flight_xaxis, flight_xticks] = cm.get_distance_along_flight_track(lon=x,lat=y,
-                                                            ticks_every=frequency)
+    flight_xaxis = window.distance
+    flight_xticks = window.get_distance_ticks(frequency)
     return flight_xaxis,flight_xticks
 
+@Profiler.timed('comparison')
 def compare_synth_flight(Synth,StdTape,**kwargs):
 
     level = kwargs['level']
@@ -114,25 +149,30 @@ def compare_synth_flight(Synth,StdTape,**kwargs):
 #    zoomOpt = kwargs['zoomin']
     
     met=StdTape.get_meteo(Synth.start, Synth.end)    
-    flight_path=StdTape.get_path(Synth.start, Synth.end)    
+    window=StdTape.get_window(Synth.start, Synth.end)    
     flight_name = Synth.file[-13:]
     flight=fd.FlightPlot(meteo=met,
                          name=flight_name,
-                         flightPath=flight_path)
+                         flightPath=window)
 
     lat=Synth.LAT
     lon=Synth.LON
     z=Synth.Z
 
+    """ nearest grid cells of the flight track """
+    i,j,valid = StdTape.get_track_index().get_grid_cells(Synth)
+    inside = valid[window.slice]
+    cells = (i[window.slice][inside], j[window.slice][inside])
+
     """ synthesis horizontal velocity"""
     
     fl_u,sy_u = flight.compare_with_synth(array=Synth.U,met='u',
-                                          x=lon,y=lat,z=z,
+                                          x=lon,y=lat,z=z,cells=cells,
                                           level=z[level],
                                           noplot=noplot)
     
     fl_v,sy_v = flight.compare_with_synth(array=Synth.V,met='v',
-                                          x=lon,y=lat,z=z,
+                                          x=lon,y=lat,z=z,cells=cells,
                                           level=z[level],
                                           noplot=noplot)
 
@@ -148,10 +188,15 @@ def compare_synth_flight(Synth,StdTape,**kwargs):
     return comp
 
 
+@Profiler.timed('comparison')
 def make_synth_profile(SYNTH,coords,markers,noplot):
 
     U = SYNTH.U
     V = SYNTH.V
+    SPD = SYNTH.get_field('SPD')
+    DIR = SYNTH.get_field('DIR')
+    ''' upslope component (cross-barrier 230 deg) '''
+    UPS = SYNTH.get_field('COMP50')
     LAT=SYNTH.LAT
     LON=SYNTH.LON
     Z=SYNTH.Z
@@ -171,13 +216,9 @@ def make_synth_profile(SYNTH,coords,markers,noplot):
 
         uprof = U[lonx,latx,:]
         vprof = V[lonx,latx,:]
-        wspd = np.sqrt(uprof**2+vprof**2)
-        sprofspd.append(wspd)
-        wdir = 270. - ( np.arctan2(vprof,uprof) * 180./np.pi )
-        sprofdir.append(wdir)
-        dirU = np.radians(230)
-        cross_barrier = uprof*np.sin(dirU)+vprof*np.cos(dirU)
-        sprofU.append(-cross_barrier)
+        sprofspd.append(SPD[lonx,latx,:])
+        sprofdir.append(DIR[lonx,latx,:])
+        sprofU.append(UPS[lonx,latx,:])
 
 
     ''' profile '''
@@ -214,26 +255,16 @@ def make_synth_profile(SYNTH,coords,markers,noplot):
 #    return sprofspd, sprofdir, sprofU, Z
     return uprof, vprof, sprofU, Z
 
+@Profiler.timed('comparison')
 def make_synth_profile_withnearest(SYNTH,target_latlon,max_dist,n_neigh):
     
-    from scipy.spatial import cKDTree
-    
-    
-    U = SYNTH.U.data  #(lons, lats, alts)
-    V = SYNTH.V.data  #(lons, lats, alts)
+    import Smoothing
+
     LAT = SYNTH.LAT
     LON = SYNTH.LON
     x = SYNTH.X
     y = SYNTH.Y
     z = SYNTH.Z
-    
-    U[U==-32768.] = np.nan
-    V[V==-32768.] = np.nan
-   
-    ''' kdTree with entire cartesian domain in km '''
-    Y,X = np.meshgrid(y,x)
-    coords_domain = zip(X.flatten(),Y.flatten())
-    tree = cKDTree(coords_domain)     
 
     ''' map lat/lon target to cartesian target with grid 
         centered at radar '''    
@@ -243,34 +274,12 @@ def make_synth_profile_withnearest(SYNTH,target_latlon,max_dist,n_neigh):
     lon_idx=int(np.ceil(f(target_latlon[0][1])))
     target_cart = (x[lon_idx],y[lat_idx])
 
-    ''' query indices of neighs using euclidean distance'''
-    dist, idx = tree.query(target_cart,k=n_neigh,eps=0,p=2,
-                           distance_upper_bound=max_dist)
-
-    ''' index in grid space '''
-    Yg,Xg = np.meshgrid(range(len(LAT)),range(len(LON)))
-    grid_domain = zip(Xg.flatten(),Yg.flatten())
-    neigh_idx = [grid_domain[i] for i in idx]
-    
-    ''' check if everything is ok '''
-#    plt.pcolormesh(range(len(y)),range(len(x)),U[:,:,2],cmap='jet')
-#    plt.xlim([0,130])
-#    plt.ylim([0,120])
-#    plt.scatter(*zip(*neigh_idx))
-#    plt.show()        
-    
-    uprof = list()
-    vprof = list()    
-    for n in neigh_idx:
-        uprof.append(U[n[0],n[1],:])
-        vprof.append(V[n[0],n[1],:])
-
-    uprof = np.array(uprof)
-    vprof = np.array(vprof)
-    
-    uprof_mean = np.nanmean(uprof,axis=0)    
-    vprof_mean = np.nanmean(vprof,axis=0)
+    ''' mean of the valid values of the n_neigh nearest
+        cells within max_dist [km] '''
+    uprof_mean = Smoothing.nearest_mean(SYNTH.U,x,y,target_cart,max_dist,n_neigh)
+    vprof_mean = Smoothing.nearest_mean(SYNTH.V,x,y,target_cart,max_dist,n_neigh)
     
+    ''' upslope component (cross-barrier 230 deg) '''
     dirU = np.radians(230)
     cross_barrier = uprof_mean*np.sin(dirU)+vprof_mean*np.cos(dirU)
     sprofU_mean = -cross_barrier
@@ -280,11 +289,12 @@ def make_synth_profile_withnearest(SYNTH,target_latlon,max_dist,n_neigh):
     
     
 
+@Profiler.timed('comparison')
 def compare_with_windprof(SYNTH,**kwargs):
 
+    import Windprof2 as wp
+
     loc=kwargs['location']
-    U = SYNTH.U
-    V = SYNTH.V
     LAT=SYNTH.LAT
     LON=SYNTH.LON
     Z=SYNTH.Z
@@ -300,10 +310,8 @@ def compare_with_windprof(SYNTH,**kwargs):
     f=interp1d(LON,range(len(LON)))
     lonx=int(np.ceil(f(loc['lon'])))
 
-    uprof = U[lonx,latx,:]
-    vprof = V[lonx,latx,:]
-    sprofspd=np.sqrt(uprof**2+vprof**2)
-    sprofdir=270. - ( np.arctan2(vprof,uprof) * 180./np.pi )
+    sprofspd=SYNTH.get_field('SPD')[lonx,latx,:]
+    sprofdir=SYNTH.get_field('DIR')[lonx,latx,:]
 
     ''' wind profiler '''
     case=kwargs['case']
@@ -382,6 +390,9 @@ def plot_synth(SYNTH , FLIGHT, DTM,**kwargs):
     except TypeError:
         P.slice=None
 
+    """ read levels and area of the plot (lazy synthesis) """
+    SYNTH.require(**get_synth_selection(P,**kwargs))
+
     """ synthesis time """
     P.synth_start=SYNTH.start
     P.synth_end=SYNTH.end
@@ -397,22 +408,20 @@ def plot_synth(SYNTH , FLIGHT, DTM,**kwargs):
     elif P.windv_verticalComp=='WUP':
         P.w_array=SYNTH.WUP
     P.file=SYNTH.file
+    P.synth=SYNTH
 
     """ general  geographic domain boundaries """
     P.set_geographic_extent(SYNTH)
 
     """ flight path from standard tape """
-    fpath=FLIGHT.get_path(SYNTH.start, SYNTH.end)
-    P.set_flight_path(fpath)
+    window=FLIGHT.get_window(SYNTH.start, SYNTH.end)
+    P.set_flight_path(window)
 
-    """ coast line """
-    P.set_coastline()
+    """ coast line (kept in kwargs['coastlines'] if given) """
+    P.set_coastline(cache=kwargs.get('coastlines'))
 
-    """ get array """
-    if P.var == 'SPD':
-        array=get_HorizontalWindSpeed(P.u_array,P.v_array)
-    else:
-        array=getattr(SYNTH , P.var)        
+    """ get array (read or derived) """
+    array=SYNTH.get_field(P.var)
 
 
     """ make horizontal plane plot """
@@ -444,8 +453,45 @@ def plot_synth(SYNTH , FLIGHT, DTM,**kwargs):
         cross = P.cross_section(field=array)            
         return [P,cross]
 
+    if kwargs.get('curtain'):
+        curtain = get_flight_curtain(SYNTH,FLIGHT,spacing=kwargs['curtain'])
+        met = FLIGHT.get_meteo(SYNTH.start, SYNTH.end)
+        palt = np.asarray(met['palt'],dtype=float)/1000. #[km]
+        altitude = curtain.resample(palt, window.distance)
+        section = P.flight_section(field=array,
+                                   curtain=curtain,
+                                   altitude=altitude)
+        return [P,section]
+
     return P
 
+def get_synth_selection(P,**kwargs):
+
+    ''' levels and bbox of the synthesis used by a plot;
+        slices and curtains need the whole synthesis '''
+    if P.slicem or P.slicez or P.slice or kwargs.get('curtain'):
+        return {}
+
+    if P.panel:
+        levels=[P.panel[0]]
+    else:
+        levels=range(1,7) # as in Common.chop_horizontal
+
+    bbox=None
+    margin=0
+    if P.planExtent:
+        bbox=tuple(P.planExtent)
+        margin=P.zoomMargin+max(P.windv_jump['x'],P.windv_jump['y'])
+    elif P.zoomOpt:
+        lat,lon=P.zoomCenter[P.zoomOpt[0]]
+        dx=P.zoomDelta['x']/2.
+        dy=P.zoomDelta['y']/2.
+        bbox=(lon-dx,lon+dx,lat-dy,lat+dy)
+        ''' covers the crop of SynthPlot.set_crop '''
+        margin=P.zoomMargin+max(P.windv_jump['x'],P.windv_jump['y'])
+
+    return {'levels':levels,'bbox':bbox,'margin':margin}
+
 def get_TotalWindSpeed(U,V,W):
 
     return np.sqrt(U**2 + V**2 + W**2)
@@ -0,0 +1,198 @@
+'''
+***************************************
+    Timing and memory spans of a VITAS
+    run
+
+    Code blocks are wrapped in named
+    spans; nested spans are reported as
+    parent/child. When profiling is off
+    span() returns a shared do-nothing
+    context, so instrumented code runs as
+    before.
+
+    Profiling is turned on with the
+    --profile option of vitas.py or the
+    VITAS_PROFILE environment variable
+    (its value is used as report prefix).
+
+    Use:
+        import Profiler
+        with Profiler.span('ingest'):
+            ...
+        @Profiler.timed('rendering')
+        def horizontal_plane(...)
+        Profiler.report('vitas_profile')  # .txt and .json
+***************************************
+'''
+
+import os
+import sys
+import json
+import time
+import resource
+import functools
+
+enabled = False
+prefix = 'vitas_profile'
+default_env = 'VITAS_PROFILE'
+
+''' statistics by span path in order of first entry '''
+stats = {}
+order = []
+stack = []
+run_start = None
+
+
+class NullSpan(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+null_span = NullSpan()
+
+
+class Span(object):
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        stack.append(self.name)
+        self.path = '/'.join(stack)
+        if self.path not in stats:
+            order.append(self.path)
+            stats[self.path] = {'count':0, 'wall':0., 'max':0.,
+                                'peak_mb':0., 'peak_increase_mb':0.}
+        self.rss0 = get_peak_mb()
+        self.t0 = time.time()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.time() - self.t0
+        rss = get_peak_mb()
+        stack.pop()
+        s = stats[self.path]
+        s['count'] += 1
+        s['wall'] += wall
+        s['max'] = max(s['max'], wall)
+        s['peak_mb'] = max(s['peak_mb'], rss)
+        s['peak_increase_mb'] += rss - self.rss0
+        return False
+
+
+def span(name):
+
+    if not enabled:
+        return null_span
+    return Span(name)
+
+
+def timed(name):
+
+    ''' decorator version of span '''
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            with Span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def enable(report_prefix=None):
+
+    global enabled, prefix, run_start
+    enabled = True
+    if report_prefix:
+        prefix = report_prefix
+    reset()
+    run_start = time.time()
+
+
+def enable_from_env():
+
+    ''' turns profiling on if VITAS_PROFILE is set; a
+        value other than 1 is used as report prefix
+    '''
+    value = os.environ.get(default_env)
+    if value:
+        enable(None if value == '1' else value)
+    return enabled
+
+
+def disable():
+
+    global enabled
+    enabled = False
+
+
+def reset():
+
+    stats.clear()
+    del order[:]
+    del stack[:]
+
+
+def get_peak_mb():
+
+    ''' peak resident memory of the process; ru_maxrss
+        is in kB on linux and bytes on mac '''
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        rss = rss/1024.
+    return rss/1024.
+
+
+def get_report():
+
+    total = time.time() - run_start if run_start else 0.
+    spans = []
+    for path in order:
+        s = dict(stats[path])
+        s['span'] = path
+        spans.append(s)
+    return {'total_wall':total, 'peak_mb':get_peak_mb(), 'spans':spans}
+
+
+def format_report(rep):
+
+    lines = []
+    lines.append("\n{:<40}{:>7}{:>11}{:>11}{:>11}{:>11}".format('Span','Count',
+                 'Total [s]','Max [s]','Peak [MB]','+Peak [MB]'))
+    lines.append("-"*91)
+    for s in rep['spans']:
+        depth = s['span'].count('/')
+        name = '  '*depth + s['span'].split('/')[-1]
+        lines.append("{:<40}{:>7}{:>11.3f}{:>11.3f}{:>11.1f}{:>11.1f}".format(name,
+                     s['count'], s['wall'], s['max'], s['peak_mb'],
+                     s['peak_increase_mb']))
+    lines.append("-"*91)
+    lines.append("{:<40}{:>7}{:>11.3f}{:>11}{:>11.1f}".format('Run', '',
+                 rep['total_wall'], '', rep['peak_mb']))
+    return '\n'.join(lines)+'\n'
+
+
+def report(report_prefix=None):
+
+    ''' prints the report and writes prefix.txt and
+        prefix.json; does nothing when profiling is off
+    '''
+    if not enabled:
+        return None
+    if report_prefix is None:
+        report_prefix = prefix
+
+    rep = get_report()
+    text = format_report(rep)
+    print text
+    with open(report_prefix+'.txt', 'w') as f:
+        f.write(text)
+    with open(report_prefix+'.json', 'w') as f:
+        json.dump(rep, f, indent=1, sort_keys=True)
+
+    return rep
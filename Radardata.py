@@ -9,6 +9,7 @@ June, 2015
 import Terrain 
 import sys
 import os
+import AircraftAnalysis as AA
 
 from mpl_toolkits.basemap import Basemap
 from mpl_toolkits.axes_grid1 import ImageGrid
@@ -18,12 +19,58 @@ from matplotlib import colors
 import matplotlib.pyplot as plt
 
 import Common as cm  
+import Profiler
+import Section
+import Smoothing
 import seaborn as sns
 
 import numpy as np
 
-from scipy.spatial import cKDTree
-from scipy.ndimage.filters import gaussian_filter
+''' raster base layers by layer, extent, level and DTM
+    (see SynthPlot.add_base_layer); cleared when full '''
+base_layers = {}
+base_layers_max = 64
+
+''' figure templates by name and layout (figure_templates
+    key of vitas.config); figures drawn since the last
+    pop_template_figures() '''
+templates = {}
+template_drawn = []
+
+''' color maps and norms of add_field2 by field setup '''
+cmaps = {}
+
+''' (name, range, delta) of derived fields missing in
+    vitas.config; COMP: any wind component '''
+derived_styles = {'DIR':('hls',[90,450],30),
+                  'TSPD':('RdBu_r',[0,40],2),
+                  'ZETA':('PuOr',[-2,2],1),
+                  'DIV':('RdBu_r',[-2,2],1),
+                  'COMP':('RdBu_r',[-20,20],4)}
+
+
+def clear_figure(fig,positions):
+
+    ''' removes what was plotted on a template figure:
+        artists of its axes and axes added later (e.g.
+        colorbars), restoring the original positions '''
+    base=[ax for ax,pos in positions]
+    for ax in list(fig.axes):
+        if ax not in base:
+            fig.delaxes(ax)
+    for ax,pos in positions:
+        for artist in (ax.collections+ax.images+ax.lines+
+                       ax.patches+ax.texts+ax.artists):
+            artist.remove()
+        ax.set_position(pos)
+        ax.ignore_existing_data_limits=True
+
+def pop_template_figures():
+
+    ''' template figures drawn since the last call '''
+    figs=list(template_drawn)
+    del template_drawn[:]
+    return figs
 
 
 class SynthPlot(object):
@@ -41,7 +88,7 @@ class SynthPlot(object):
         self.extent={'lx':None,'rx':None,'by':None,'ty':None}
         self.figure_size=None
         self.file=None
-        self.flight={'lon':None, 'lat':None}
+        self.flight={'lon':None, 'lat':None, 'distance':None}
         self.flightColor=None
         self.flightWidth=None
         self.flightStyle=None
@@ -75,6 +122,7 @@ class SynthPlot(object):
         self.u_array=[]
         self.v_array=[]
         self.var=None
+        self.synth=None
         self.w_array=[]
         self.wind=None
         self.windv_jump=None
@@ -89,12 +137,21 @@ class SynthPlot(object):
         self.zoomCenter=None
         self.zoomDelta=None
         self.zoomOpt=None
+        self.zoomMargin=2
+        self.planExtent=None
+        self.baseLayers=True
+        self.templates=False
+        self.terrainCache=None
+        self.baseLayerDpi=None
+        self.crop=None
+        self.crop_extent=None
+        self.sectionInterp={}
 
     def config(self,config):
         try:
-            self.cmapName=config['synthesis_field_cmap_name']
-            self.cmapRange=config['synthesis_field_cmap_range']
-            self.cmapDelta=config['synthesis_field_cmap_delta']
+            self.cmapName=dict(config['synthesis_field_cmap_name'])
+            self.cmapRange=dict(config['synthesis_field_cmap_range'])
+            self.cmapDelta=dict(config['synthesis_field_cmap_delta'])
             self.coastColor=config['coast_line_color']
             self.coastStyle=config['coast_line_style']
             self.coastWidth=config['coast_line_width']
@@ -127,10 +184,23 @@ class SynthPlot(object):
             self.windv_scale=config['wind_vector_scale']
             self.zoomCenter=config['zoom_center']
             self.zoomDelta=config['zoom_del']
+            ''' optional '''
+            self.sectionInterp=config.get('section_interp',{})
+            self.zoomMargin=config.get('zoom_margin',2)
+            self.planExtent=config.get('plan_extent',None)
+            self.baseLayers=config.get('base_layers',True)
+            self.templates=config.get('figure_templates',False)
+            self.terrainCache=config.get('terrain_cache',None)
+            self.baseLayerDpi=config.get('base_layer_dpi',None)
         except KeyError as e:
             print "Please add the "+e.args[0]+" key to vitas.config\n"
             sys.exit()
 
+        for field,(name,vrange,delta) in derived_styles.iteritems():
+            self.cmapName.setdefault(field,name)
+            self.cmapRange.setdefault(field,vrange)
+            self.cmapDelta.setdefault(field,delta)
+
     def set_geographic_extent(self,synth):
 
         self.lats=synth.LAT
@@ -141,28 +211,40 @@ class SynthPlot(object):
         self.extent['lx']=min(synth.LON)
         self.extent['rx']=max(synth.LON)
 
-    def set_coastline(self):
+    @Profiler.timed('basemap')
+    def set_coastline(self,cache=None):
+
+        ''' cache: dict-like with coastlines by extent
+            (plan_extent if given, so legs share it) '''
+        if self.planExtent:
+            key=tuple(self.planExtent)
+        else:
+            key=tuple(self.get_extent())
+        if cache is not None and key in cache:
+            self.coast['lon'],self.coast['lat']=cache[key]
+            return
 
         M = Basemap(        projection='cyl',
-                            llcrnrlat=self.extent['by'],
-                            urcrnrlat=self.extent['ty'],
-                            llcrnrlon=self.extent['lx'],
-                            urcrnrlon=self.extent['rx'],
+                            llcrnrlat=key[2],
+                            urcrnrlat=key[3],
+                            llcrnrlon=key[0],
+                            urcrnrlon=key[1],
                             resolution='i')
         coastline = M.coastpolygons
 
         self.coast['lon']= coastline[1][0][13:-1]
         self.coast['lat']= coastline[1][1][13:-1]
+        if cache is not None:
+            cache[key]=(self.coast['lon'],self.coast['lat'])
     
-    def set_flight_path(self,stdtape):
+    def set_flight_path(self,window):
 
-        try:
-            fp = zip(*stdtape)
-            self.flight['lat']=fp[0]
-            self.flight['lon']=fp[1]
-        except IndexError:
+        if len(window) == 0:
             print "Error: Check REORDER synth time and input standard tape file"
             sys.exit(1)
+        self.flight['lat']=window.lats
+        self.flight['lon']=window.lons
+        self.flight['distance']=window.distance
 
     def set_panel(self,**kwargs):
 
@@ -203,6 +285,7 @@ class SynthPlot(object):
             self.rows_cols=(rows,cols)
             self.geo_textsize=12
 
+    @Profiler.timed('slicing')
     def get_slices(self,array):
 
         if self.slice_type == 'horizontal':
@@ -223,13 +306,55 @@ class SynthPlot(object):
 
         return extent
 
+    def set_crop(self,extent):
+
+        ''' index windows of lons and lats covering extent
+            plus zoomMargin grid points, so zoomed plots only
+            contour and draw vectors where they are seen.
+            Windows start at a multiple of the wind vector
+            jump to keep vectors on the same grid points
+        '''
+        if extent is None:
+            self.crop=None
+            self.crop_extent=None
+            return
+
+        windows=[]
+        for axis,lo,hi,jump in [(self.lons,extent[0],extent[1],self.windv_jump['x']),
+                                (self.lats,extent[2],extent[3],self.windv_jump['y'])]:
+            idx=np.where((axis>=lo) & (axis<=hi))[0]
+            if idx.size == 0:
+                windows.append(slice(None))
+                continue
+            i0=max(idx.min()-self.zoomMargin,0)
+            i0=i0-i0%jump
+            i1=min(idx.max()+self.zoomMargin+1,axis.size)
+            windows.append(slice(i0,i1))
+        self.crop=tuple(windows)
+
+        lons,lats=self.get_axes()
+        self.crop_extent=[min(lons),max(lons),min(lats),max(lats)]
+
+    def get_axes(self):
+
+        ''' lons and lats of the cropped domain '''
+        if self.crop is None:
+            return self.lons,self.lats
+        return self.lons[self.crop[0]],self.lats[self.crop[1]]
+
     def get_var_title(self,var):
+        if var.startswith('COMP'):
+            return 'Wind component toward '+var[4:]+' deg [m/s]'
         var_title={    'DBZ': 'Reflectivity factor [dBZ]',
                     'SPD': 'Horizontal wind speed [m/s]',
                     'U': 'wind u-component [m/s]',
                     'V': 'wind v-component[m/s]',
                     'VOR': 'Vorticity [1/s]',
                     'CON': 'Convergence [1/s]',
+                    'DIR': 'Wind direction [deg]',
+                    'TSPD': 'Total wind speed [m/s]',
+                    'ZETA': 'Vorticity (finite differences) [10-3 s-1]',
+                    'DIV': 'Divergence (finite differences) [10-3 s-1]',
                     'WVA': 'wind w-component (variational) [m/s]',
                     'WUP': 'wind w-component (vertical integration) [m/s]'}
         title=var_title[var]
@@ -343,13 +468,16 @@ class SynthPlot(object):
             xjump=self.windv_jump['x']
             yjump=self.windv_jump['y']
     
-            x=cm.resample(self.lons,res=xjump)
-            y=cm.resample(self.lats,res=yjump)
+            lons,lats=self.get_axes()
+            x=cm.resample(lons,res=xjump)
+            y=cm.resample(lats,res=yjump)
 
             uu=cm.resample(comp1,xres=xjump,yres=yjump)
             vv=cm.resample(comp2,xres=xjump,yres=yjump)
             
+            ''' above the terrain base layer '''
             Q=grid_ax.quiver(x,y,uu,vv, 
+                                zorder=1.1,
                                 units='dots', 
                                 scale=self.windv_scale, 
                                 scale_units='dots',
@@ -417,8 +545,8 @@ class SynthPlot(object):
         if self.flightDotOn:        
             """ add dots and text """
             frequency=10 # [km]
-            [dist_from_p0,idxs] = cm.get_distance_along_flight_track(lon=x, lat=y, 
-                                                                ticks_every=frequency)
+            dist_from_p0 = self.flight['distance']
+            idxs = cm.get_ticks_every(dist_from_p0,frequency)
             
             for i in idxs:
                 value=cm.round_to_closest_int(dist_from_p0[i],frequency)
@@ -450,8 +578,8 @@ class SynthPlot(object):
         if self.flightDotOn:        
             """ add dots and text """
             frequency=10 # [km]
-            [dist_from_p0,idxs] = cm.get_distance_along_flight_track(lon=x, lat=y, 
-                                                                ticks_every=frequency)
+            dist_from_p0 = self.flight['distance']
+            idxs = cm.get_ticks_every(dist_from_p0,frequency)
 
             self.flight_track_distance=dist_from_p0
             self.flight_dot_index=idxs
@@ -516,27 +644,26 @@ class SynthPlot(object):
         else:
             extent = None
 
-        ' contour values '
-        cval = range(0,50,5)
-
-        ''' make a color map of fixed colors '''
-        snsmap=sns.color_palette(self.cmapName[field], len(cval))
-        cmap = colors.ListedColormap(snsmap)
+        ' contour values (derived fields: their color range) '
+        style = 'COMP' if field.startswith('COMP') else field
+        if AA.get_derived(field) is not None and style in self.cmapRange:
+            vmin,vmax = self.cmapRange[style]
+            vdelta = self.cmapDelta[style]
+            cval = np.arange(vmin,vmax+vdelta/2.,vdelta)
+        else:
+            cval = range(0,50,5)
 
-        vdelta=self.cmapDelta[field]
-        vmin=self.cmapRange[field][0]
-        vmax=self.cmapRange[field][1]
-        bounds=range(vmin, vmax+vdelta, vdelta)
-        norm = colors.BoundaryNorm(bounds, cmap.N)
+        cmap, norm = self.get_cmap_norm(field, len(cval))
         
 
         
-        '  need to remask, otherwise gives error '
-        a = ma.masked_equal(array.data,-32768.)        
+        ''' missing values are NaN (see Synthesis) '''
+        a = ma.masked_invalid(array)
         
         if extent is None:
             ' horizontal plot '
-            LONS,LATS = np.meshgrid(self.lons,self.lats)
+            lons,lats = self.get_axes()
+            LONS,LATS = np.meshgrid(lons,lats)
 
 #            im = axis.pcolormesh(LONS, LATS, a,
 #                                 vmin=vmin,
@@ -560,6 +687,70 @@ class SynthPlot(object):
 
         
 
+    def get_cmap_norm(self,field,ncolors):
+
+        ''' color map of fixed colors and its norm; built
+            once per name, number of colors and range '''
+        if field.startswith('COMP'):
+            field='COMP'
+        vdelta=self.cmapDelta[field]
+        vmin=self.cmapRange[field][0]
+        vmax=self.cmapRange[field][1]
+        key=(self.cmapName[field],ncolors,vmin,vmax,vdelta)
+        if key not in cmaps:
+            ''' make a color map of fixed colors '''
+            snsmap=sns.color_palette(self.cmapName[field], ncolors)
+            cmap = colors.ListedColormap(snsmap)
+            bounds=range(vmin, vmax+vdelta, vdelta)
+            norm = colors.BoundaryNorm(bounds, cmap.N)
+            cmaps[key]=(cmap,norm)
+        return cmaps[key]
+
+    def get_figure(self,name,figsize,grid=None,style=None):
+
+        ''' new figure and axes (ImageGrid with grid
+            arguments, otherwise one axis). In template mode
+            figures are off-screen and the figure of the same
+            name and layout is reused with its plotted
+            artists removed, so only data and text change
+            between runs
+        '''
+        if grid is None:
+            key=(name,tuple(figsize),None)
+        else:
+            key=(name,tuple(figsize),repr(sorted(grid.items())))
+
+        ''' a template not yet drawn since the last
+            pop_template_figures() (a run can plot several
+            figures of the same layout) '''
+        free=[t for t in templates.get(key,[])
+                if t[0] not in template_drawn]
+        if self.templates and free:
+            fig,axes,positions=free[0]
+            clear_figure(fig,positions)
+        else:
+            with sns.axes_style(style):
+                if self.templates:
+                    from matplotlib.figure import Figure
+                    from matplotlib.backends.backend_agg import FigureCanvasAgg
+                    fig=Figure(figsize=figsize)
+                    FigureCanvasAgg(fig)
+                else:
+                    fig=plt.figure(figsize=figsize)
+                if grid is None:
+                    axes=fig.add_subplot(111)
+                else:
+                    axes=ImageGrid(fig,111,**grid)
+            if self.templates:
+                positions=[(ax,ax.get_position(original=True).frozen())
+                           for ax in fig.axes]
+                templates.setdefault(key,[]).append((fig,axes,positions))
+
+        if self.templates and fig not in template_drawn:
+            template_drawn.append(fig)
+
+        return fig,axes
+
     def add_terrain_profile(self,axis,profile,profaxis):
 
         ''' to kilometers '''
@@ -597,16 +788,17 @@ class SynthPlot(object):
         axis.set_xticks(major_ticks)                                                       
         axis.set_xticks(minor_ticks, minor=True) 
 
-    def add_location_markers(self,axis, grid_idx):
+    def add_location_markers(self,axis, grid_idx, markers=True):
 
         for name, val in self.markersLocations.iteritems():
             ''' find indices of coordinates '''
             lat_idx=cm.find_index_recursively(array=self.lats,value=val['lat'],decimals=2)
             lon_idx=cm.find_index_recursively(array=self.lons,value=val['lon'],decimals=2)
             ''' add marker '''
-            axis.plot(self.lons[lon_idx],self.lats[lat_idx],val['type'],
-                    color=val['color'],
-                    markersize=5)
+            if markers:
+                axis.plot(self.lons[lon_idx],self.lats[lat_idx],val['type'],
+                        color=val['color'],
+                        markersize=5)
             if grid_idx == 0:
                 ''' add label '''        
                 axis.text(self.lons[lon_idx],self.lats[lat_idx],name, 
@@ -615,6 +807,85 @@ class SynthPlot(object):
                         verticalalignment='bottom',
                         weight='bold')
 
+    def add_base_layer(self,axis,name,extent,level=None):
+
+        ''' static layers of the horizontal plane drawn as
+            an image rendered once and reused by every panel,
+            field and leg with the same extent:
+                terrain: terrain contours at level [km] (per
+                         DTM, i.e. synthesis domain)
+                overlay: coastline and location markers
+            The flight path depends on the leg and is drawn
+            as vectors.
+        '''
+        size=self.get_panel_size(axis)
+        dpi=self.baseLayerDpi or axis.figure.dpi
+        if name == 'terrain':
+            dtm=Terrain.get_dtm(self)
+            key=(name,tuple(extent),level,self.terrain.file,
+                 tuple(dtm['extent']),size,dpi)
+            zorder=1    # over the field, under wind vectors
+        else:
+            key=(name,tuple(extent),size,dpi)
+            zorder=2    # as lines
+
+        if key not in base_layers:
+            if len(base_layers) >= base_layers_max:
+                base_layers.clear()
+            base_layers[key]=self.render_layer(name,extent,level,size,dpi)
+
+        axis.imshow(base_layers[key],
+                    extent=extent,
+                    origin='upper',
+                    aspect='auto',
+                    interpolation='bilinear',
+                    zorder=zorder)
+
+    @Profiler.timed('base_layer')
+    def render_layer(self,name,extent,level,size,dpi):
+
+        ''' RGBA array of a base layer on a transparent
+            off-screen figure of the panel size at dpi '''
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        fig=Figure(figsize=size,dpi=dpi)
+        canvas=FigureCanvasAgg(fig)
+        fig.patch.set_alpha(0)
+        ax=fig.add_axes([0,0,1,1])
+        ax.set_axis_off()
+
+        if name == 'terrain':
+            Terrain.add_contour(ax,level,self)
+        else:
+            self.add_coastline(ax)
+            if self.markersLocations:
+                self.add_location_markers(ax,None)
+
+        ax.set_xlim(extent[0], extent[1])
+        ax.set_ylim(extent[2], extent[3])
+        canvas.draw()
+        width,height=canvas.get_width_height()
+        rgba=np.frombuffer(canvas.buffer_rgba(),dtype=np.uint8)
+
+        return rgba.reshape(height,width,4).copy()
+
+    def get_panel_size(self,axis):
+
+        ''' size of a panel [inches] given by the
+            ImageGrid layout '''
+        from matplotlib.tight_layout import get_renderer
+
+        fig=axis.figure
+        locator=axis.get_axes_locator()
+        if locator is None:
+            bbox=axis.get_position()
+        else:
+            bbox=locator(axis,get_renderer(fig))
+        width,height=fig.get_size_inches()
+        return (round(bbox.width*width,1), round(bbox.height*height,1))
+
+    @Profiler.timed('rendering')
     def horizontal_plane(self , **kwargs):
 
         field_array=kwargs['field']
@@ -622,11 +893,6 @@ class SynthPlot(object):
         v_array=self.v_array
         w_array=self.w_array
 
-        if self.mask:
-            field_array.mask=w_array.mask
-            u_array.mask=w_array.mask
-            v_array.mask=w_array.mask
-
         if self.panel:
             self.set_panel(option='single')
             figsize=self.figure_size['single']
@@ -636,33 +902,54 @@ class SynthPlot(object):
 
         self.slice_type='horizontal'
 
-        with sns.axes_style("white"):
-            fig = plt.figure(figsize=figsize)
-            plot_grids=ImageGrid( fig,111,
-                                    nrows_ncols = self.rows_cols,
-                                    axes_pad = 0.0,
-                                    add_all = True,
-                                    share_all=False,
-                                    label_mode = "L",
-                                    cbar_location = "top",
-                                    cbar_mode="single")
+        fig,plot_grids=self.get_figure('plan',figsize,style='white',
+                                        grid=dict(nrows_ncols = self.rows_cols,
+                                                  axes_pad = 0.0,
+                                                  add_all = True,
+                                                  share_all=False,
+                                                  label_mode = "L",
+                                                  cbar_location = "top",
+                                                  cbar_mode="single"))
+        fig.set_label('plan')
     
         ''' field extent '''
         extent1=self.get_extent()
 
-        ''' if zoomOpt is false then extent1=extent2 '''            
-        if self.zoomOpt:
+        ''' if zoomOpt is false then extent1=extent2;
+            plan_extent fixes it for all legs (not clipped
+            to the synthesis, e.g. animate.py) '''
+        if self.planExtent:
+            extent2=list(self.planExtent)
+            self.set_crop(extent2)
+        elif self.zoomOpt:
             opt=self.zoomOpt[0]
             extent2=cm.zoom_in(self,extent1,self.zoomCenter[opt])
+            self.set_crop(extent2)
         else:
             extent2=extent1
+            self.set_crop(None)
 
+        ''' crop to zoom before any artist is created '''
+        if self.crop:
+            xs,ys=self.crop
+            field_array=field_array[xs,ys,:]
+            u_array=u_array[xs,ys,:]
+            v_array=v_array[xs,ys,:]
+            w_array=w_array[xs,ys,:]
 
         ''' make slices '''
         field_group = self.get_slices(field_array)
         ucomp = self.get_slices(u_array)
         vcomp = self.get_slices(v_array)        
 
+        if self.mask:
+            ''' blank where w is missing, level by level;
+                synthesis arrays are read-only '''
+            missing = [np.isnan(w) for w in self.get_slices(w_array)]
+            field_group = [np.where(m,np.nan,a) for m,a in zip(missing,field_group)]
+            ucomp = [np.where(m,np.nan,a) for m,a in zip(missing,ucomp)]
+            vcomp = [np.where(m,np.nan,a) for m,a in zip(missing,vcomp)]
+
         ''' creates iterator group '''
         group=zip(plot_grids,self.zlevels,field_group,ucomp,vcomp)
         gn=0
@@ -670,15 +957,25 @@ class SynthPlot(object):
         ''' make gridded plot '''
         for g,k,field,u,v in group:
 
-            self.add_coastline(g)
-            self.add_flight_path2(g)
+            if self.baseLayers:
+                self.add_base_layer(g,'overlay',extent2)
+            else:
+                self.add_coastline(g)
+                self.add_flight_path2(g)
 
             im, cmap, norm = self.add_field2(g,
                                             array=field.T,
                                             field=self.var)
 
+            if self.baseLayers:
+                ''' over the field, as in the overlay layer '''
+                self.add_flight_path2(g)
+
             if self.terrain.file:
-                Terrain.add_contour(g,k,self)
+                if self.baseLayers:
+                    self.add_base_layer(g,'terrain',extent2,level=k)
+                else:
+                    Terrain.add_contour(g,k,self)
 
             if self.wind:
                 self.add_windvector(g,u.T,v.T,gn)
@@ -687,7 +984,8 @@ class SynthPlot(object):
                 self.add_slice_line(g,gn)
 
             if self.markersLocations:
-                self.add_location_markers(g, gn)
+                ''' markers are in the overlay layer '''
+                self.add_location_markers(g, gn, markers=not self.baseLayers)
 
             g.set_xlim(extent2[0], extent2[1])
             g.set_ylim(extent2[2], extent2[3])                
@@ -731,9 +1029,10 @@ class SynthPlot(object):
         # fig.suptitle(t1+t2+t3+self.file)
         fig.suptitle(t1+t2+t3)
 
-        plt.draw()
+        fig.canvas.draw_idle()
         self.haxis=g
 
+    @Profiler.timed('rendering')
     def vertical_plane(self,**kwargs):
 
         field_array=None
@@ -755,17 +1054,20 @@ class SynthPlot(object):
         self.set_panel(option=self.slice_type,wind=isWind)        
 
         figsize=self.figure_size['vertical']
-        fig = plt.figure(figsize=figsize)
-
-        plot_grids=ImageGrid( fig,111,
-                                nrows_ncols = self.rows_cols,
-                                axes_pad = 0.0,
-                                add_all = True,
-                                share_all=False,
-                                label_mode = "L",
-                                cbar_location = "top",
-                                cbar_mode="single",
-                                aspect=True)
+        if isWind:
+            label=self.sliceo+'_'+windname
+        else:
+            label=self.sliceo
+        fig,plot_grids=self.get_figure(label,figsize,
+                                        grid=dict(nrows_ncols = self.rows_cols,
+                                                  axes_pad = 0.0,
+                                                  add_all = True,
+                                                  share_all=False,
+                                                  label_mode = "L",
+                                                  cbar_location = "top",
+                                                  cbar_mode="single",
+                                                  aspect=True))
+        fig.set_label(label)
 
         """ get list with slices """
         uComp  = self.get_slices(u_array)
@@ -887,23 +1189,15 @@ class SynthPlot(object):
         # show figure
         plt.draw()
 
+    @Profiler.timed('rendering')
     def cross_section(self,**kwargs):
     
         field_array=kwargs['field']
 
-        ''' calculate wind components'''
-        u_array=self.u_array
-        v_array=self.v_array
-        ''' along cross section assuming self.azimuth within [0, 90]     '''
-        wind_dir_section = self.azimuth -180.
-        wx = u_array*np.sin(wind_dir_section*np.pi/180.)
-        wy = v_array*np.cos(wind_dir_section*np.pi/180.)
-        wind_array = -(wx+wy)
-        ''' perpendicular to cross section '''
-        orthogonal_dir_section =wind_dir_section + 90.
-        qx = u_array*np.sin(orthogonal_dir_section*np.pi/180.)
-        qy = v_array*np.cos(orthogonal_dir_section*np.pi/180.)
-        orth_array = (qx+qy)            
+        ''' wind components along and perpendicular to the
+            cross section (derived fields of the synthesis) '''
+        wind_array = self.synth.get_field(AA.component_name(self.azimuth))
+        orth_array = self.synth.get_field(AA.component_name(self.azimuth-90.))
 
         self.slice_type='cross_section'
         self.set_panel(option=self.slice_type,wind=False)        
@@ -915,68 +1209,23 @@ class SynthPlot(object):
         latix_1=cm.find_index_recursively(array=self.lats,value=self.slice[1][0],decimals=2)
         lonix_1=cm.find_index_recursively(array=self.lons,value=self.slice[1][1],decimals=2)
 
-        ''' create grid for the entire domain '''
-        xx = np.arange(0,self.axesval['x'].size)
-        yy = np.arange(0,self.axesval['y'].size)
-        zz = np.arange(0,self.axesval['z'].size)
-        xm,ym,zm = np.meshgrid(xx,yy,zz)
-
-        ''' convert grid and plotting field to vector columns'''
-        xd=np.reshape(xm,[1,xm.size]).tolist()
-        yd=np.reshape(ym,[1,ym.size]).tolist()
-        zd=np.reshape(zm,[1,zm.size]).tolist()
-        xd=xd[0]
-        yd=yd[0]
-        zd=zd[0]
-
-        ''' specify grid for interpolated cross section '''
-        hres = 100
-        vres = 44
-        xi = np.linspace(lonix_0, lonix_1, hres)
-        yi = np.linspace(latix_0, latix_1, hres)
-        zi = np.linspace(0, 43, vres)
-        zi=np.array([zi,]*hres)
-        ki=np.ma.empty([vres,hres])
-        wi=np.ma.empty([vres,hres])
-        qi=np.ma.empty([vres,hres])
-#        fillv = field_array.fill_value
-        
-        ''' convert to standard numpy array (not masked)
-        and replace fill values for nans '''
-        kd=np.ma.filled(field_array, fill_value=np.nan)
-        wd=np.ma.filled(wind_array, fill_value=np.nan)
-        qd=np.ma.filled(orth_array, fill_value=np.nan)
-
-        ''' convert to 1 column array '''
-        kd=np.reshape(kd,[kd.size,1])
-        wd=np.reshape(wd,[wd.size,1])
-        qd=np.reshape(qd,[qd.size,1])
-
-        ''' create kdTree with entire domain'''
-        coords=zip(xd,yd,zd)
-        tree = cKDTree(coords)
-
-        ''' interpolate using kdTree (nearest neighbor) 
-            and averaging the neighborhood
-        '''
-        neigh = 8
-        for k in range(vres):
-            coords = zip(yi, xi, zi[:,k])
-            dist, idx = tree.query( coords, k=neigh, eps=0, p=1, distance_upper_bound=10)        
-            kd_mean = np.nanmean(kd[idx],axis=1)
-            wd_mean = np.nanmean(wd[idx],axis=1)
-            qd_mean = np.nanmean(qd[idx],axis=1)
-            ki[k,:]=kd_mean.T
-            wi[k,:]=wd_mean.T
-            qi[k,:]=qd_mean.T
-        
+        ''' neighbors and weights of the section are computed
+            once for all levels and used for every field '''
+        engine = Section.Engine(field_array.shape, **self.sectionInterp)
+        points = engine.get_points((lonix_0,latix_0),(lonix_1,latix_1))
+        vres, hres = points['shape']
+        ki = np.ma.masked_invalid(engine.interpolate(field_array, points))
+        wi = np.ma.masked_invalid(engine.interpolate(wind_array, points))
+        qi = np.ma.masked_invalid(engine.interpolate(orth_array, points))
+
         component = [wi, qi]
         comptitle = ['Along-section wind speed [m s-1] (contours)\n',
                     'Cross-section wind speed [m s-1] (contours)\n']
         for n in range(2):
             """make plot with wind speed along cross section """
-            with sns.axes_style("white"):
-                fig,ax = plt.subplots(figsize=(8,11*0.5))
+            label=['section_along','section_cross'][n]
+            fig,ax = self.get_figure(label,(8,11*0.5),style='white')
+            fig.set_label(label)
 
             ''' add field as image '''
             zsynth = self.axesval['z']
@@ -992,9 +1241,11 @@ class SynthPlot(object):
             self.terrain.array['profile']=prof
             
             ''' add contour of wind section '''
-            X,Y = np.meshgrid(np.linspace(0, self.distance, hres), zsynth)
+            zsection = np.interp(points['z'], np.arange(zsynth.size), zsynth)
+            X,Y = np.meshgrid(np.linspace(0, self.distance, hres), zsection)
             sigma=0.5
-            section = gaussian_filter(component[n], sigma,mode='nearest')    
+            ''' missing values neither spread nor filled '''
+            section = Smoothing.gaussian(component[n], sigma, fill=False)
             cs = ax.contour(X,Y,section,colors='k',
                             linewidths=1.5, levels=range(-4,26,2))    
             # cs = ax.contour(X,Y,component[n],colors='k',linewidths=0.5, levels=range(-4,26,2))            
@@ -1039,7 +1290,81 @@ class SynthPlot(object):
             line_end='End time: '+self.synth_end.strftime('%Y-%m-%d %H:%M')+' UTC'        
             fig.suptitle(titext+line_start+line_end)
 
-            plt.subplots_adjust(top=0.85,right=1.0)
-            plt.draw()
+            fig.subplots_adjust(top=0.85,right=1.0)
+            fig.canvas.draw_idle()
 
-        return ki,component
\ No newline at end of file
+        return ki,component
+
+
+    @Profiler.timed('rendering')
+    def flight_section(self,**kwargs):
+
+        ''' vertical section following the flight track;
+            curtain is a Section.Curtain of the flight path
+        '''
+        field_array=kwargs['field']
+        curtain=kwargs['curtain']
+        altitude=kwargs['altitude'] # [km] along the curtain
+
+        self.slice_type='cross_section'
+        ki = curtain.sample(field_array)
+        ui = curtain.sample(self.u_array)
+        vi = curtain.sample(self.v_array)
+
+        ''' wind along the track using the local heading
+            of the resampled path '''
+        dlon = np.gradient(curtain.lons)*np.cos(np.radians(curtain.lats))
+        dlat = np.gradient(curtain.lats)
+        heading = np.arctan2(dlon, dlat)
+        wi = ui*np.sin(heading) + vi*np.cos(heading)
+
+        fig,ax = self.get_figure('curtain',(8,11*0.5),style='white')
+        fig.set_label('curtain')
+
+        zsynth = self.axesval['z']
+        gate_hgt=0.25 #[km]
+        distance = curtain.distance
+        extent = [0, distance[-1], zsynth[0]-gate_hgt/2., zsynth[-1]+gate_hgt/2.]
+        im, cmap, norm = self.add_field2(ax,array=np.ma.masked_invalid(ki),
+                                         field=self.var, extent=extent)
+
+        ''' contours of along-track wind '''
+        X,Y = np.meshgrid(distance, zsynth)
+        cs = ax.contour(X,Y,np.ma.masked_invalid(wi),colors='k',
+                        linewidths=1.5, levels=range(-4,26,2))
+        ax.clabel(cs, fontsize=12, fmt='%1.0f',)
+
+        ''' flight altitude '''
+        ax.plot(distance, altitude, color=self.flightColor,
+                linewidth=self.flightWidth,
+                linestyle=self.flightStyle)
+
+        ax.set_yticks(zsynth[1::2])
+        ytlabels = ["{:3.1f}".format(z) for z in zsynth[1::2]]
+        ax.set_yticklabels(ytlabels)
+        ax.set_ylim(0. , 7.5)
+        ax.set_xlim(0. , distance[-1])
+
+        legname = os.path.basename(self.file)
+        ta=ax.transAxes
+        ax.text(0.05,0.9, legname[:3].upper() + " " + legname[3:5], transform = ta,weight='bold')
+        ax.text(0.05,0.85, 'spacing: {:3.1f} km'.format(curtain.spacing), transform = ta)
+
+        ax.set_xlabel('Distance along flight track [km]')
+        ax.set_ylabel('Altitude [km]')
+
+        if self.verticalGridMajorOn:
+            ax.grid(True, which = 'major',linewidth=1)
+
+        fig.colorbar(im,cmap=cmap, norm=norm)
+
+        titext='Dual-Doppler Synthesis: '+ self.get_var_title(self.var)+' (color coded)\n'
+        titext=titext+'Along-track wind speed [m s-1] (contours)\n'
+        line_start='Start time: '+self.synth_start.strftime('%Y-%m-%d %H:%M')+' UTC\n'
+        line_end='End time: '+self.synth_end.strftime('%Y-%m-%d %H:%M')+' UTC'
+        fig.suptitle(titext+line_start+line_end)
+
+        fig.subplots_adjust(top=0.85,right=1.0)
+        fig.canvas.draw_idle()
+
+        return ki,wi
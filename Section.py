@@ -0,0 +1,249 @@
+'''
+***************************************
+    Vertical sections (curtains) of the
+    synthesis along arbitrary polylines
+
+    The polyline (e.g. the flight track)
+    is resampled at a fixed along-track
+    spacing and bilinear weights in the
+    horizontal are computed once, so any
+    number of fields can be sampled with
+    the same interpolator.
+
+    Straight sections between two grid
+    points use a neighborhood average
+    (Engine) whose resolution, number of
+    neighbors and weighting are set by
+    the grid or the section_interp key of
+    vitas.config.
+
+    Use:
+        w = FLIGHT.get_window(SYNTH.start, SYNTH.end)
+        C = Section.Curtain(SYNTH, w.lats, w.lons, spacing=0.5)
+        dbz = C.sample(SYNTH.DBZ)  # (z, distance)
+
+        E = Section.Engine(SYNTH.DBZ.shape, weighting='idw')
+        pts = E.get_points((i0,j0), (i1,j1))
+        dbz = E.interpolate(SYNTH.DBZ, pts)  # (z, distance)
+***************************************
+'''
+
+import numpy as np
+
+import Common as cm
+import Profiler
+
+from scipy.spatial import cKDTree
+
+''' kdTrees of grid index space by grid shape '''
+trees = {}
+
+''' defaults of the section_interp key '''
+interp_defaults = {'hres':None,        # samples along section (None: grid)
+                   'vres':None,        # samples in vertical (None: grid)
+                   'neighbors':8,
+                   'weighting':'mean', # mean, idw or gaussian
+                   'max_dist':10,      # [grid points]
+                   'sigma':1.0,        # gaussian width [grid points]
+                   'power':1}          # idw power
+
+
+class Curtain(object):
+
+    @Profiler.timed('interpolation')
+    def __init__(self, synth, lats, lons, spacing=0.5):
+
+        ''' spacing: along-track spacing [km] '''
+        self.spacing = spacing
+        self.z = np.asarray(synth.Z)
+
+        lats = np.ma.filled(lats, np.nan).astype(float)
+        lons = np.ma.filled(lons, np.nan).astype(float)
+        good = ~(np.isnan(lats) | np.isnan(lons))
+        self.lats, self.lons, self.distance = resample_polyline(lats[good],
+                                                                lons[good],
+                                                                spacing)
+
+        ''' fractional grid indices and bilinear weights '''
+        LON = np.asarray(synth.LON)
+        LAT = np.asarray(synth.LAT)
+        fi = np.interp(self.lons, LON, np.arange(LON.size),
+                       left=np.nan, right=np.nan)
+        fj = np.interp(self.lats, LAT, np.arange(LAT.size),
+                       left=np.nan, right=np.nan)
+        self.inside = ~(np.isnan(fi) | np.isnan(fj))
+        fi[~self.inside] = 0
+        fj[~self.inside] = 0
+
+        i0 = np.clip(np.floor(fi).astype(int), 0, LON.size-2)
+        j0 = np.clip(np.floor(fj).astype(int), 0, LAT.size-2)
+        wi = fi - i0
+        wj = fj - j0
+        self.corners = [(i0, j0, (1-wi)*(1-wj)),
+                        (i0+1, j0, wi*(1-wj)),
+                        (i0, j0+1, (1-wi)*wj),
+                        (i0+1, j0+1, wi*wj)]
+
+    @Profiler.timed('interpolation')
+    def sample(self, field):
+
+        ''' field (x,y,z) sampled along the polyline;
+            returns a (z, distance) array. Missing corners
+            are excluded and the remaining weights normalized
+        '''
+        field = np.ma.filled(field, np.nan)
+        total = np.zeros((self.distance.size, self.z.size))
+        weight = np.zeros_like(total)
+        for i, j, w in self.corners:
+            col = field[i, j, :]
+            ok = ~np.isnan(col)
+            total += np.where(ok, col, 0.)*w[:, None]
+            weight += ok*w[:, None]
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out = total/weight
+        out[weight == 0] = np.nan
+        out[~self.inside] = np.nan
+
+        return out.T
+
+    def sample_at(self, curtain, altitude):
+
+        ''' values of curtain at altitude [km] of each
+            resampled point (e.g. flight level)
+        '''
+        out = np.empty(self.distance.size)
+        for n in range(self.distance.size):
+            out[n] = np.interp(altitude[n], self.z, curtain[:, n],
+                               left=np.nan, right=np.nan)
+        return out
+
+    def resample(self, values, distance):
+
+        ''' values given at distance [km] (e.g. in-situ data)
+            interpolated to the curtain points
+        '''
+        values = np.ma.filled(values, np.nan).astype(float)
+        good = ~np.isnan(values)
+        return np.interp(self.distance, distance[good], values[good],
+                         left=np.nan, right=np.nan)
+
+
+def resample_polyline(lats, lons, spacing):
+
+    ''' points every spacing [km] along the polyline;
+        returns lats, lons and distance from the first point
+    '''
+    dist = cm.get_cumulative_distance(lat=lats, lon=lons)
+    target = np.arange(0, dist[-1]+spacing/2., spacing)
+
+    ''' drop repeated points so dist is strictly increasing '''
+    keep = np.concatenate(([True], np.diff(dist) > 0))
+    new_lats = np.interp(target, dist[keep], lats[keep])
+    new_lons = np.interp(target, dist[keep], lons[keep])
+
+    return new_lats, new_lons, target
+
+
+class Engine(object):
+
+    def __init__(self, shape, **kwargs):
+
+        ''' shape: (x,y,z) shape of the synthesis fields;
+            kwargs as in interp_defaults. Distances are
+            measured in grid points so the neighborhood
+            does not depend on the grid spacing
+        '''
+        opts = dict(interp_defaults)
+        opts.update((k, v) for k, v in kwargs.iteritems() if v is not None)
+        if opts['weighting'] not in ['mean','idw','gaussian']:
+            raise ValueError('Unknown section weighting: '+str(opts['weighting']))
+
+        self.shape = tuple(shape)
+        self.hres = opts['hres']
+        self.vres = opts['vres']
+        self.neighbors = opts['neighbors']
+        self.weighting = opts['weighting']
+        self.max_dist = opts['max_dist']
+        self.sigma = opts['sigma']
+        self.power = opts['power']
+        self.tree = get_tree(self.shape)
+
+    @Profiler.timed('interpolation')
+    def get_points(self, start, end):
+
+        ''' neighbors and weights of the section between
+            grid indices start=(i0,j0) and end=(i1,j1) at all
+            levels; computed once and used for any field
+        '''
+        nx, ny, nz = self.shape
+        hres = self.hres
+        if hres is None:
+            ''' one sample per grid point crossed '''
+            hres = int(np.ceil(np.hypot(end[0]-start[0], end[1]-start[1])))+1
+        vres = self.vres
+        if vres is None:
+            vres = nz
+
+        xi = np.linspace(start[0], end[0], hres)
+        yi = np.linspace(start[1], end[1], hres)
+        zi = np.linspace(0, nz-1, vres)
+
+        ''' all levels in one query '''
+        query = np.column_stack((np.tile(xi, vres),
+                                 np.tile(yi, vres),
+                                 np.repeat(zi, hres)))
+        k = min(self.neighbors, self.tree.n)
+        dist, idx = self.tree.query(query, k=k, eps=0, p=1,
+                                    distance_upper_bound=self.max_dist)
+        if k == 1:
+            dist = dist[:, None]
+            idx = idx[:, None]
+
+        ''' missing neighbors come with index tree.n '''
+        found = idx < self.tree.n
+        idx[~found] = 0
+
+        if self.weighting == 'mean':
+            w = found.astype(float)
+        elif self.weighting == 'idw':
+            with np.errstate(divide='ignore'):
+                w = 1./dist**self.power
+            ''' exact matches take all the weight '''
+            exact = np.isinf(w)
+            w[exact.any(axis=1)] = 0
+            w[exact] = 1
+        else:
+            w = np.exp(-0.5*(dist/self.sigma)**2)
+        w[~found] = 0
+
+        return {'idx':idx, 'w':w, 'shape':(vres, hres), 'z':zi}
+
+    @Profiler.timed('interpolation')
+    def interpolate(self, field, points):
+
+        ''' weighted average of the neighbors of each point
+            excluding missing values; returns (vres,hres) array
+        '''
+        data = np.ma.filled(field, np.nan).ravel()
+        vals = data[points['idx']]
+        ok = ~np.isnan(vals)
+        w = np.where(ok, points['w'], 0.)
+        wsum = w.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out = (np.where(ok, vals, 0.)*w).sum(axis=1)/wsum
+        out[wsum == 0] = np.nan
+
+        return out.reshape(points['shape'])
+
+
+def get_tree(shape):
+
+    ''' kdTree of the grid indices of a field with
+        given (x,y,z) shape, built once per shape
+    '''
+    if shape not in trees:
+        with Profiler.span('kdtree'):
+            coords = np.indices(shape).reshape(3, -1).T
+            trees[shape] = cKDTree(coords)
+    return trees[shape]
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+
+'''
+***************************************
+    Persistent VITAS worker
+
+    Keeps a VITAS session (Session.py) with
+    syntheses, standard tapes, terrain and
+    section interpolators in memory and
+    answers requests over a Unix socket, so
+    interactive sessions and batch scripts
+    pay the setup once.
+
+    Requests are dictionaries with an 'op'
+    key (info, profile, section, curtain,
+    collocation, plot, stats, stop); the
+    reply is a dictionary sent back with
+    pickle. Requests are served one at a
+    time. Figures of plot requests are
+    saved (Agg backend) and their names
+    returned.
+
+    Use:
+        $ python Server.py start &      # from the VITAS folder
+        $ python Server.py stop
+
+        import Server
+        out = Server.request('profile', ced='c03/leg01.cdf',
+                             coords=[(38.5,-123.2)])
+        out = Server.request('plot', args='-c c03/leg01.cdf -f DBZ -p 1',
+                             output='leg01_dbz')
+***************************************
+'''
+
+import os
+import sys
+import socket
+import tempfile
+import traceback
+
+from multiprocessing.connection import Listener, Client
+
+import ArgParser as parser
+import Session
+
+default_socket = os.path.join(tempfile.gettempdir(),
+                              'vitas_{}.sock'.format(os.getuid()))
+
+
+class Worker(object):
+
+    ''' answers requests with the operations of a
+        Session.VitasSession (do_<op> methods)
+    '''
+    def __init__(self, session):
+
+        self.session = session
+
+    def handle(self, req):
+
+        op = req.pop('op')
+        method = getattr(self, 'do_'+op, None)
+        if method is None:
+            return {'error':'Unknown request: '+op}
+        try:
+            return method(**req)
+        except SystemExit:
+            return {'error':'request exited (check the arguments)'}
+        except Exception as e:
+            traceback.print_exc()
+            return {'error':'{}: {}'.format(type(e).__name__, e)}
+
+    def do_stats(self):
+        return self.session.stats()
+
+    def do_info(self, ced):
+        return self.session.info(ced)
+
+    def do_profile(self, ced, coords, nearest=None):
+        return self.session.profile(ced, coords, nearest=nearest)
+
+    def do_section(self, ced, start, end, fields=('DBZ','U','V'), **kwargs):
+        return self.session.section(ced, start, end, fields=fields, **kwargs)
+
+    def do_curtain(self, ced, std=None, spacing=0.5, fields=('DBZ','U','V')):
+        return self.session.curtain(ced, std=std, spacing=spacing, fields=fields)
+
+    def do_collocation(self, ced, std=None, level=0):
+        return self.session.collocation(ced, std=std, level=level)
+
+    def do_plot(self, args, output, fmt='png'):
+
+        ''' runs vitas with args (string) in the session
+            and saves every figure as output_N.fmt;
+            returns the file names
+        '''
+        import matplotlib.pyplot as plt
+
+        args = parser.start(args)
+        args.multi = False
+        plt.close('all')
+        try:
+            self.session.run(args)
+        finally:
+            names = []
+            for n in plt.get_fignums():
+                name = '{}_{}.{}'.format(output, n, fmt)
+                plt.figure(n).savefig(name)
+                names.append(name)
+            plt.close('all')
+        return {'files':names}
+
+
+def is_listening(address):
+
+    ''' True if a server accepts connections on address '''
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(address)
+        return True
+    except socket.error:
+        return False
+    finally:
+        sock.close()
+
+
+def serve(address=default_socket):
+
+    if os.path.exists(address):
+        if is_listening(address):
+            raise RuntimeError('A VITAS worker is already listening on '+address)
+        ''' stale socket of a worker that did not stop '''
+        os.remove(address)
+
+    import matplotlib
+    matplotlib.use('Agg')
+
+    worker = Worker(Session.VitasSession())
+
+    ''' socket readable only by the user '''
+    mask = os.umask(0o077)
+    listener = Listener(address, family='AF_UNIX')
+    os.umask(mask)
+    print "VITAS worker listening on "+address
+
+    try:
+        while True:
+            conn = listener.accept()
+            try:
+                req = conn.recv()
+                if req.get('op') == 'stop':
+                    conn.send({'stopped':True})
+                    break
+                conn.send(worker.handle(req))
+            except EOFError:
+                pass
+            finally:
+                conn.close()
+    finally:
+        listener.close()
+        if os.path.exists(address):
+            os.remove(address)
+
+
+def request(op, address=default_socket, **kwargs):
+
+    ''' sends a request to the worker and returns the
+        reply; raises RuntimeError if the request failed
+    '''
+    kwargs['op'] = op
+    conn = Client(address, family='AF_UNIX')
+    try:
+        conn.send(kwargs)
+        out = conn.recv()
+    finally:
+        conn.close()
+
+    if isinstance(out, dict) and 'error' in out:
+        raise RuntimeError(out['error'])
+    return out
+
+
+if __name__ == "__main__":
+
+    if len(sys.argv) < 2 or sys.argv[1] not in ['start','stop']:
+        print "Use: python Server.py start|stop [socket]"
+        sys.exit()
+
+    address = sys.argv[2] if len(sys.argv) > 2 else default_socket
+    if sys.argv[1] == 'start':
+        try:
+            serve(address)
+        except RuntimeError as e:
+            print e
+            sys.exit(1)
+    else:
+        request('stop', address)
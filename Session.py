@@ -0,0 +1,448 @@
+'''
+***************************************
+    VITAS session
+
+    Owns vitas.config and keeps syntheses,
+    standard tapes, terrain and coastlines
+    loaded between calls, so plots and
+    queries of the same legs (ipython,
+    batch scripts, Server.py) do not read
+    the files again. Caches are LRU with a
+    maximum number of items; syntheses
+    also have a memory limit [MB].
+
+    Use:
+        import Session
+        S = Session.VitasSession()
+        S.run('-c c03/leg01.cdf -f DBZ -p 1 --wind')
+        S.run('-c c03/leg01.cdf -f SPD -p 1')  # leg in memory
+        out = S.profile('c03/leg01.cdf', coords=[(38.5,-123.2)])
+***************************************
+'''
+
+import sys
+
+import numpy as np
+
+from collections import OrderedDict
+
+import Filehandler as fh
+import ArgParser as parser
+import VitasConfigParser as configp
+import Profiler
+
+
+class Cache(object):
+
+    ''' least recently used items are dropped when
+        there are more than max_items or, if given,
+        their size exceeds max_mb (size: function
+        returning the size of an item in MB)
+    '''
+    def __init__(self, max_items, max_mb=None, size=None):
+
+        self.max_items = max_items
+        self.max_mb = max_mb
+        self.size = size
+        self.items = OrderedDict()
+        self.sizes = {}
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, key):
+        value = self.items.pop(key)
+        self.items[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        if key in self.items:
+            self.items.pop(key)
+        self.items[key] = value
+        if self.size is not None:
+            self.sizes[key] = self.size(value)
+        self.trim()
+
+    def get(self, key, default=None):
+        if key in self.items:
+            return self[key]
+        return default
+
+    def keys(self):
+        return self.items.keys()
+
+    def get_mb(self):
+        return sum(self.sizes.values())
+
+    def is_full(self):
+        if len(self.items) > self.max_items:
+            return True
+        return self.max_mb is not None and self.get_mb() > self.max_mb
+
+    def trim(self):
+
+        ''' keeps at least the last item '''
+        while len(self.items) > 1 and self.is_full():
+            key, _ = self.items.popitem(last=False)
+            self.sizes.pop(key, None)
+
+    def clear(self):
+        self.items.clear()
+        self.sizes.clear()
+
+
+def get_synth_mb(synth):
+
+    ''' memory of the arrays of a synthesis, derived
+        fields included [MB] '''
+    arrays = vars(synth).values()+synth.derived.values()
+    total = 0
+    for value in arrays:
+        if isinstance(value, np.ndarray):
+            total += value.nbytes
+    return total/1024.**2
+
+
+class VitasSession(object):
+
+    def __init__(self, config=None, max_legs=4, max_mb=2000, max_tapes=2,
+                 max_sections=50):
+
+        ''' config: vitas.config dictionary (read from the
+            current folder if None)
+        '''
+        if config is None:
+            with Profiler.span('config'):
+                config = configp.start()
+        self.config = config
+        self.synth = Cache(max_legs, max_mb=max_mb, size=get_synth_mb)
+        self.flight = Cache(max_tapes)
+        self.terrain = Cache(max_legs)
+        self.coastlines = Cache(max_legs)
+        self.points = Cache(max_sections)
+        self.curtains = Cache(max_sections)
+
+    ''' loaded objects '''
+
+    def get_synth(self, cedfile, lazy=False):
+
+        ''' lazy: only the parts asked with SYNTH.require()
+            are read (e.g. by Plotter.plot_synth); otherwise
+            the whole synthesis is read if it was not yet
+        '''
+        if cedfile not in self.synth:
+            self.synth[cedfile] = fh.get_synthesis(cedfile, self.config,
+                                                   lazy=lazy)
+        SYNTH = self.synth[cedfile]
+        if not lazy:
+            SYNTH.require()
+        ''' update its size in the cache '''
+        self.synth[cedfile] = SYNTH
+        return SYNTH
+
+    def get_stdfile(self, cedfile, stdfile=None):
+
+        if stdfile is None:
+            import Catalog
+            stdfile = Catalog.resolve_stdtape(cedfile, self.config)
+            if stdfile is None:
+                raise ValueError('No standard tape covers '+cedfile)
+        return stdfile
+
+    def get_flight(self, stdfile):
+
+        import AircraftAnalysis as AA
+
+        if stdfile not in self.flight:
+            path = self.config['folder_flight_level']+'/'+stdfile
+            with Profiler.span('ingest'):
+                self.flight[stdfile] = AA.Flight(path)
+        return self.flight[stdfile]
+
+    def get_terrain(self, cedfile):
+
+        ''' one Terrain per synthesis, so the DTM clipped to
+            its extent (Terrain.array) is kept between plots
+        '''
+        import Terrain as TR
+
+        if cedfile not in self.terrain:
+            self.terrain[cedfile] = TR.Terrain(self.config['filepath_dtm'])
+        return self.terrain[cedfile]
+
+    def get_files(self, **kwargs):
+
+        ''' same arguments and output as
+            Filehandler.set_working_files
+        '''
+        cedfile = kwargs['cedfile']
+        stdfile = kwargs['stdfile']
+        lazy = kwargs.get('lazy', False)
+        return (self.get_synth(cedfile, lazy=lazy),
+                self.get_flight(stdfile),
+                self.get_terrain(cedfile))
+
+    def stats(self):
+
+        return {'synthesis':self.synth.keys(),
+                'synthesis_mb':self.synth.get_mb(),
+                'flight':self.flight.keys(),
+                'terrain':self.terrain.keys(),
+                'coastlines':len(self.coastlines),
+                'sections':len(self.points),
+                'curtains':len(self.curtains)}
+
+    def clear(self):
+
+        for cache in [self.synth, self.flight, self.terrain,
+                      self.coastlines, self.points, self.curtains]:
+            cache.clear()
+
+    ''' operations '''
+
+    def run(self, args):
+
+        ''' same as vitas.py with args (string or parsed
+            arguments) using the loaded objects
+        '''
+        if isinstance(args, basestring):
+            args = parser.start(args)
+
+        cedfile = args.ced
+        stdfile = args.std
+        plotFields = args.field
+        multi = args.multi
+        print_shapes = args.print_shapes
+        print_global_atts = args.print_global_atts
+        print_axis = args.print_axis
+        print_list_synth = args.print_list_synth
+        terrain = args.terrain
+        slope = args.slope
+        meteo = args.meteo
+        valid = args.valid
+        prof = args.prof
+        nearest = args.nearest
+        noplot = args.no_plot
+        config = self.config
+
+        """ print synhesis availables """
+        if print_list_synth:
+            import Catalog
+            catalog = Catalog.build(config)
+            legs = Catalog.query(catalog,
+                                 case=args.case,
+                                 over=args.over,
+                                 hours=args.hours,
+                                 config=config)
+            Catalog.print_list(legs)
+            sys.exit()
+
+        """ print options only read the synthesis, so
+            plotting, terrain and flight modules are not
+            imported
+        """
+        if print_shapes or print_global_atts or print_axis:
+            SYNTH = self.get_synth(cedfile)
+
+        """ print shape of attribute arrays """
+        if print_shapes:
+            SYNTH.print_shapes()
+            if not print_global_atts:
+                sys.exit()
+
+        """ print global attirutes of cedric synthesis """
+        if print_global_atts:
+            SYNTH.print_global_atts()
+            sys.exit()
+
+        """ print axis values """
+        if print_axis:
+            for ax in print_axis:
+                if ax.isupper():
+                    ax=ax.lower()
+                SYNTH.print_axis(ax)
+            sys.exit()
+
+        """ match std tape to synthesis time if not given """
+        if cedfile and stdfile is None:
+            import Catalog
+            stdfile = Catalog.resolve_stdtape(cedfile, config)
+            if stdfile is None:
+                print "No standard tape covers "+cedfile+"\n"
+                sys.exit()
+
+        """ retrieves synthesis and flight instances
+            from AircraftAnalysis
+        """
+        SYNTH, FLIGHT, TERRAIN = self.get_files(cedfile=cedfile,
+                                                stdfile=stdfile,
+                                                config=config,
+                                                lazy=bool(plotFields))
+
+        """ plotting backends """
+        with Profiler.span('imports'):
+            import Plotter
+            import matplotlib.pyplot as plt
+
+        """ make synthesis plots """
+        if plotFields:
+            for f in plotFields:
+                P=Plotter.plot_synth(SYNTH,FLIGHT,TERRAIN,
+                                    var=f,
+                                    wind=args.wind,
+                                    panel=args.panel,
+                                    slicem = args.slicem,
+                                    slicez = args.slicez,
+                                    slice = args.slice,
+                                    curtain = args.curtain,
+                                    zoomIn=args.zoomin,
+                                    mask = args.mask,
+                                    coastlines=self.coastlines,
+                                    config=config)
+
+        """ make terrain plots """
+        if terrain or slope:
+            # P[0] might produce error if P is not a list,
+            # check in ploth_synth.cross_section
+            Plotter.plot_terrain(P[0],
+                                 terrain=terrain,
+                                 slope=slope,
+                                 terrain_file=config['filepath_dtm'])
+
+        """ other options use the whole synthesis """
+        SYNTH.require()
+
+        """ make flight level meteo plot """
+        if meteo:
+            Plotter.plot_flight_meteo(SYNTH,FLIGHT)
+
+        """ compare synth and flight level """
+        if valid:
+            out = Plotter.compare_synth_flight(SYNTH,FLIGHT,
+                                         level=valid,
+                                         zoomin=args.zoomin,
+                                         noplot=noplot)
+            return out
+
+        """ make profile from synthesis """
+        if prof:
+            if nearest is None:
+                markers=['o','s','D','*']
+                out = Plotter.make_synth_profile(SYNTH,coords=prof,
+                                                 markers=markers,
+                                                 noplot=noplot)
+            else:
+                ' (4.5km,n=12) or (7.0km,n=30) seem good choices '
+                out = Plotter.make_synth_profile_withnearest(SYNTH,
+                                                             target_latlon=prof,
+                                                             max_dist=nearest[0][0], # [km]
+                                                             n_neigh =nearest[0][1])
+
+            try:
+                ' if P exists '
+                for i,p in enumerate(prof):
+                    lat,lon = p
+                    P.haxis.scatter(lon,lat,
+                                    s=config['sounding_size'],
+                                    c=config['sounding_color'],
+                                    marker=config['sounding_marker'],
+                                    lw=3)
+            except UnboundLocalError:
+                ' if P does not exist just pass '
+                pass
+            return out
+
+        if multi:
+            plt.close('all')
+            return P
+        else:
+            ''' use this one with ipython '''
+            with Profiler.span('rendering'):
+                plt.show(block=False)
+
+    def info(self, ced):
+
+        SYNTH = self.get_synth(ced)
+        fields = [k for k in self.config['synthesis_field_name']]
+        return {'start':SYNTH.start, 'end':SYNTH.end,
+                'shape':SYNTH.get_field(fields[0]).shape,
+                'fields':sorted(fields),
+                'X':SYNTH.X, 'Y':SYNTH.Y, 'Z':SYNTH.Z,
+                'LAT':SYNTH.LAT, 'LON':SYNTH.LON}
+
+    def profile(self, ced, coords, nearest=None):
+
+        ''' coords: list of (lat,lon); nearest: (max_dist,n_neigh) '''
+        import Plotter
+
+        SYNTH = self.get_synth(ced)
+        if nearest is None:
+            u, v, cross, z = Plotter.make_synth_profile(SYNTH, coords=coords,
+                                                        markers=None,
+                                                        noplot=True)
+        else:
+            u, v, cross, z = Plotter.make_synth_profile_withnearest(SYNTH,
+                                                        target_latlon=coords,
+                                                        max_dist=nearest[0],
+                                                        n_neigh=nearest[1])
+        return {'u':u, 'v':v, 'cross_barrier':cross, 'z':z}
+
+    def section(self, ced, start, end, fields=('DBZ','U','V'), **kwargs):
+
+        ''' straight section between start and end (lat,lon);
+            kwargs as in Section.interp_defaults
+        '''
+        import Section
+
+        SYNTH = self.get_synth(ced)
+        i0 = np.abs(SYNTH.LON-start[1]).argmin()
+        j0 = np.abs(SYNTH.LAT-start[0]).argmin()
+        i1 = np.abs(SYNTH.LON-end[1]).argmin()
+        j1 = np.abs(SYNTH.LAT-end[0]).argmin()
+
+        field = SYNTH.get_field(fields[0])
+        key = (ced, i0, j0, i1, j1, tuple(sorted(kwargs.iteritems())))
+        if key not in self.points:
+            engine = Section.Engine(field.shape, **kwargs)
+            self.points[key] = (engine, engine.get_points((i0,j0), (i1,j1)))
+        engine, points = self.points[key]
+
+        out = {'z':np.interp(points['z'], np.arange(SYNTH.Z.size), SYNTH.Z)}
+        for name in fields:
+            out[name] = engine.interpolate(SYNTH.get_field(name), points)
+        return out
+
+    def curtain(self, ced, std=None, spacing=0.5, fields=('DBZ','U','V')):
+
+        ''' section along the flight track of the synthesis '''
+        import Section
+
+        std = self.get_stdfile(ced, std)
+        SYNTH = self.get_synth(ced)
+        key = (ced, std, spacing)
+        if key not in self.curtains:
+            FLIGHT = self.get_flight(std)
+            window = FLIGHT.get_window(SYNTH.start, SYNTH.end)
+            self.curtains[key] = Section.Curtain(SYNTH, window.lats,
+                                                 window.lons, spacing=spacing)
+        curtain = self.curtains[key]
+
+        out = {'distance':curtain.distance, 'lats':curtain.lats,
+               'lons':curtain.lons, 'z':curtain.z}
+        for name in fields:
+            out[name] = curtain.sample(SYNTH.get_field(name))
+        return out
+
+    def collocation(self, ced, std=None, level=0):
+
+        ''' flight level and synthesis wind at a level '''
+        import Plotter
+
+        std = self.get_stdfile(ced, std)
+        SYNTH = self.get_synth(ced)
+        FLIGHT = self.get_flight(std)
+        return Plotter.compare_synth_flight(SYNTH, FLIGHT, level=level,
+                                            zoomin=None, noplot=True)
@@ -0,0 +1,147 @@
+'''
+***************************************
+    NaN-aware smoothing and neighborhood
+    means over the regular synthesis or
+    terrain grid (2D or 3D)
+
+    Normalized convolution: missing values
+    (NaN or masked) get zero weight and the
+    sum of the kernel over the valid cells
+    is divided out, so they do not spread
+    and edges are not biased. Box means use
+    summed-area tables (cumulative sums
+    along each axis), so every cell costs
+    the same whatever the box size, in one
+    pass over the grid.
+
+    Use:
+        import Smoothing
+        m = Smoothing.box_mean(SYNTH.U, (3,3,1))   # 3x3 cells, each level
+        g = Smoothing.gaussian(section, 0.5)
+        p = Smoothing.nearest_mean(SYNTH.U, x, y, (x0,y0), 4.5, 12)  # profile
+***************************************
+'''
+
+import numpy as np
+
+from scipy.ndimage import gaussian_filter
+from scipy.spatial import cKDTree
+
+''' kd-trees of (x,y) grids '''
+neighbor_trees = {}
+
+
+def get_valid(array):
+
+    ''' float64 copy of array with zeros at missing
+        values and mask of valid values '''
+    data = np.ma.filled(np.ma.asarray(array, dtype=float), np.nan)
+    valid = ~np.isnan(data)
+    return np.where(valid, data, 0.), valid
+
+
+def get_sizes(size, ndim):
+
+    ''' size of the box along each axis (odd number of
+        cells; 1 leaves an axis untouched) '''
+    if np.isscalar(size):
+        size = [size]*ndim
+    if len(size) != ndim:
+        raise ValueError('Box size must have {} values'.format(ndim))
+    return [int(s)//2*2+1 for s in size]
+
+
+def box_sum(array, size):
+
+    ''' sum over a box centered at every cell using a
+        summed-area table along each axis; the box is
+        clipped at the edges '''
+    out = np.asarray(array, dtype=float)
+    for axis, s in enumerate(get_sizes(size, out.ndim)):
+        if s == 1:
+            continue
+        n = out.shape[axis]
+        half = s//2
+        shape = list(out.shape)
+        shape[axis] = 1
+        table = np.concatenate([np.zeros(shape), np.cumsum(out, axis=axis)],
+                               axis=axis)
+        upper = np.minimum(np.arange(n)+half+1, n)
+        lower = np.maximum(np.arange(n)-half, 0)
+        out = table.take(upper, axis=axis)-table.take(lower, axis=axis)
+    return out
+
+
+def box_mean(array, size, min_count=1, fill=True):
+
+    ''' mean of the valid values in a box centered at
+        every cell; NaN where the box has less than
+        min_count valid values (masked if array is
+        masked) or, if not fill, where array is missing '''
+    data, valid = get_valid(array)
+    total = box_sum(data, size)
+    count = box_sum(valid, size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out = total/count
+    out[count < max(min_count, 1)-0.5] = np.nan
+    if not fill:
+        out[~valid] = np.nan
+    return get_output(out, array)
+
+
+def gaussian(array, sigma, truncate=4.0, min_weight=0., fill=True):
+
+    ''' Gaussian smoothing with normalized convolution;
+        sigma [grid points] is a number or one value per
+        axis (0 leaves an axis untouched). NaN where the
+        weight of valid values is not above min_weight
+        or, if not fill, where array is missing '''
+    data, valid = get_valid(array)
+    total = gaussian_filter(data, sigma, mode='constant', truncate=truncate)
+    weight = gaussian_filter(valid.astype(float), sigma, mode='constant',
+                             truncate=truncate)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out = total/weight
+    out[weight <= max(min_weight, 1e-12)] = np.nan
+    if not fill:
+        out[~valid] = np.nan
+    return get_output(out, array)
+
+
+def get_neighbor_tree(x, y):
+
+    ''' kd-tree of the cells of the (x,y) grid (first
+        axis x), built once per grid '''
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    key = (x.tostring(), y.tostring())
+    if key not in neighbor_trees:
+        Y, X = np.meshgrid(y, x)
+        neighbor_trees[key] = cKDTree(np.column_stack((X.ravel(), Y.ravel())))
+    return neighbor_trees[key]
+
+
+def nearest_mean(array, x, y, point, max_dist, n):
+
+    ''' mean over the leading (x,y) axes of the valid
+        values of the n cells nearest to point within
+        max_dist (euclidean, units of x and y; fewer if
+        the radius holds less), e.g. the mean profile of
+        an (x,y,z) array; NaN where there are none '''
+    tree = get_neighbor_tree(x, y)
+    dist, idx = tree.query(point, k=n, eps=0, p=2,
+                           distance_upper_bound=max_dist)
+    idx = np.atleast_1d(idx)
+    idx = idx[idx < tree.n]
+    i, j = np.unravel_index(idx, (np.size(x), np.size(y)))
+    data, valid = get_valid(array[i, j])
+    count = valid.sum(axis=0)
+    return np.where(count > 0, data.sum(axis=0)/np.maximum(count, 1), np.nan)
+
+
+def get_output(out, array):
+
+    ''' masked array if the input was masked '''
+    if isinstance(array, np.ma.MaskedArray):
+        return np.ma.masked_invalid(out)
+    return out
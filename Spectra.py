@@ -0,0 +1,278 @@
+'''
+***************************************
+    Spectral analysis of flight level
+    data
+
+    Power spectral densities (Welch or
+    multitaper) and cospectra of several
+    variables, inertial subrange slopes
+    and dissipation rates from the -5/3
+    law using Taylor's hypothesis.
+    Spectra of one leg are cached in its
+    flight window, and legs can be
+    processed in batch.
+
+    Use:
+        spec = Spectra.get_leg_spectra(FLIGHT, SYNTH.start, SYNTH.end)
+        spec['psd']['wvert'], spec['slope']['wvert'], spec['eps']
+        table = Spectra.get_batch([(FLIGHT,st1,en1),(FLIGHT,st2,en2)])
+***************************************
+'''
+
+import numpy as np
+import pandas as pd
+
+from scipy import signal
+
+''' defaults '''
+variables = ['wvert','u','v','theta']
+cospectra = [('wvert','theta'),('wvert','u')]
+inertial_range = (0.05, 0.4) # [Hz] fitting range at 1 Hz sampling
+kolmogorov = 0.52            # one-dimensional Kolmogorov constant
+
+
+def get_psd(x, **kwargs):
+
+    ''' one-sided power spectral density of x
+
+        fs: sampling frequency [Hz] (default 1)
+        method: 'welch' (default) or 'multitaper'
+        nperseg: Welch segment length (default 256)
+        detrend: 'linear' (default), 'constant' or False
+        NW: multitaper time-bandwidth product (default 4)
+    '''
+    fs = kwargs.get('fs', 1.0)
+    method = kwargs.get('method', 'welch')
+    nperseg = kwargs.get('nperseg', 256)
+    detrend = kwargs.get('detrend', 'linear')
+
+    x = fill_gaps(x)
+    nperseg = min(nperseg, x.size)
+
+    if method == 'welch':
+        freq, psd = signal.welch(x, fs=fs, window='hann',
+                                 nperseg=nperseg,
+                                 detrend=detrend)
+    elif method == 'multitaper':
+        freq, psd = multitaper(x, x, fs=fs, detrend=detrend,
+                               NW=kwargs.get('NW', 4))
+        psd = psd.real
+    else:
+        raise ValueError('Unknown spectral method: '+str(method))
+
+    return freq[1:], psd[1:]
+
+
+def get_cospectrum(x, y, **kwargs):
+
+    ''' one-sided cospectrum (real part of the cross
+        spectral density) of x and y; same kwargs as get_psd
+    '''
+    fs = kwargs.get('fs', 1.0)
+    method = kwargs.get('method', 'welch')
+    nperseg = kwargs.get('nperseg', 256)
+    detrend = kwargs.get('detrend', 'linear')
+
+    x = fill_gaps(x)
+    y = fill_gaps(y)
+    nperseg = min(nperseg, x.size)
+
+    if method == 'welch':
+        freq, csd = signal.csd(x, y, fs=fs, window='hann',
+                               nperseg=nperseg,
+                               detrend=detrend)
+    elif method == 'multitaper':
+        freq, csd = multitaper(x, y, fs=fs, detrend=detrend,
+                               NW=kwargs.get('NW', 4))
+    else:
+        raise ValueError('Unknown spectral method: '+str(method))
+
+    return freq[1:], csd[1:].real
+
+
+def multitaper(x, y, fs=1.0, detrend='linear', NW=4):
+
+    ''' one-sided multitaper cross spectral density
+        using Slepian (dpss) tapers
+    '''
+    from scipy.signal.windows import dpss
+
+    n = x.size
+    if detrend:
+        x = signal.detrend(x, type=detrend)
+        y = signal.detrend(y, type=detrend)
+
+    K = int(2*NW-1)
+    tapers = dpss(n, NW, Kmax=K)
+    fx = np.fft.rfft(tapers*x, axis=1)
+    fy = np.fft.rfft(tapers*y, axis=1)
+    csd = np.mean(fx*np.conj(fy), axis=0)/fs
+
+    ''' one-sided: double all but DC (and Nyquist if n even) '''
+    if n % 2 == 0:
+        csd[1:-1] *= 2
+    else:
+        csd[1:] *= 2
+    freq = np.fft.rfftfreq(n, d=1./fs)
+
+    return freq, csd
+
+
+def fill_gaps(x):
+
+    ''' linear interpolation of missing values '''
+    x = np.asarray(np.ma.filled(x, np.nan), dtype=float)
+    bad = np.isnan(x)
+    if bad.any() and not bad.all():
+        idx = np.arange(x.size)
+        x[bad] = np.interp(idx[bad], idx[~bad], x[~bad])
+    return x
+
+
+def fit_inertial(freq, psd, frange=inertial_range):
+
+    ''' slope and intercept of log10(psd) vs log10(freq)
+        within frange
+    '''
+    sel = (freq >= frange[0]) & (freq <= frange[1]) & (psd > 0)
+    if sel.sum() < 3:
+        return np.nan, np.nan
+    slope, intercept = np.polyfit(np.log10(freq[sel]),
+                                  np.log10(psd[sel]), 1)
+    return slope, intercept
+
+
+def get_dissipation(freq, psd, speed, frange=inertial_range,
+                    transverse=True):
+
+    ''' dissipation rate [m2 s-3] from the inertial subrange
+        of a one-dimensional spectrum. Frequency is converted
+        to wavenumber with Taylor's hypothesis (k=2*pi*f/U)
+        and S(k) = alpha*eps^(2/3)*k^(-5/3), with alpha
+        increased by 4/3 for transverse components (w)
+    '''
+    sel = (freq >= frange[0]) & (freq <= frange[1]) & (psd > 0)
+    if sel.sum() < 3 or not np.isfinite(speed) or speed <= 0:
+        return np.nan
+
+    alpha = kolmogorov*4/3. if transverse else kolmogorov
+    k = 2*np.pi*freq[sel]/speed
+    Sk = psd[sel]*speed/(2*np.pi)
+    eps = (Sk*k**(5/3.)/alpha)**1.5
+
+    return np.median(eps)
+
+
+def get_spectra(data, **kwargs):
+
+    ''' spectra of a leg
+
+        data: DataFrame (or dict) with the variables; u and v
+              are computed from wspd and wdir if needed
+        speed: true airspeed [m s-1] for Taylor's hypothesis
+               (see get_airspeed)
+        variables, cospectra, frange and get_psd kwargs
+
+        returns dict with freq, psd, cospectrum, slope,
+        variance and eps (from wvert)
+    '''
+    varnames = kwargs.pop('variables', variables)
+    copairs = kwargs.pop('cospectra', cospectra)
+    frange = kwargs.pop('frange', inertial_range)
+    speed = kwargs.pop('speed', np.nan)
+
+    series = {}
+    names = set(varnames) | set([v for p in copairs for v in p])
+    for name in names:
+        series[name] = get_series(data, name)
+
+    out = {'freq':None, 'psd':{}, 'cospectrum':{}, 'slope':{},
+           'variance':{}, 'eps':np.nan, 'speed':speed}
+    for name in varnames:
+        freq, psd = get_psd(series[name], **kwargs)
+        out['freq'] = freq
+        out['psd'][name] = psd
+        out['slope'][name] = fit_inertial(freq, psd, frange)[0]
+        out['variance'][name] = np.nanvar(series[name])
+    for pair in copairs:
+        _, cosp = get_cospectrum(series[pair[0]], series[pair[1]], **kwargs)
+        out['cospectrum'][pair] = cosp
+
+    if 'wvert' in out['psd']:
+        out['eps'] = get_dissipation(out['freq'], out['psd']['wvert'],
+                                     speed, frange)
+
+    return out
+
+
+def get_series(data, name):
+
+    if name in ['u','v'] and name not in data:
+        wspd = np.asarray(data['wspd'], dtype=float)
+        wdir = np.asarray(data['wdir'], dtype=float)*np.pi/180.
+        if name == 'u':
+            return -wspd*np.sin(wdir)
+        else:
+            return -wspd*np.cos(wdir)
+    return np.asarray(data[name], dtype=float)
+
+
+def get_airspeed(window):
+
+    ''' mean horizontal true airspeed [m s-1] of a flight
+        window, i.e. ground velocity (grdspeed, track) minus
+        the wind (wspd, wdir). The standard tape has no
+        airspeed, and ground speed would stretch (tailwind)
+        or shrink (headwind) the distance the aircraft
+        samples through the air.
+    '''
+    def column(name):
+        return np.ma.filled(np.ma.asarray(window[name], dtype=float), np.nan)
+
+    track = column('track')*np.pi/180.
+    wdir = column('wdir')*np.pi/180.
+    gs = column('grdspeed')
+    wspd = column('wspd')
+    ''' wdir is the direction the wind blows from '''
+    ua = gs*np.sin(track)+wspd*np.sin(wdir)
+    va = gs*np.cos(track)+wspd*np.cos(wdir)
+    return np.nanmean(np.hypot(ua, va))
+
+
+def get_leg_spectra(FLIGHT, start, end, **kwargs):
+
+    ''' spectra of the flight window [start,end]; results
+        are cached in the window for each set of kwargs
+    '''
+    window = FLIGHT.get_window(start, end)
+    key = tuple(sorted((k, str(v)) for k, v in kwargs.iteritems()))
+    if key not in window.spectra:
+        data = FLIGHT.get_meteo(start, end)
+        if 'speed' not in kwargs:
+            kwargs['speed'] = get_airspeed(window)
+        window.spectra[key] = get_spectra(data, **kwargs)
+
+    return window.spectra[key]
+
+
+def get_batch(legs, **kwargs):
+
+    ''' summary of spectra for many legs
+
+        legs: list of (FLIGHT, start, end)
+
+        returns a DataFrame with variance and inertial
+        subrange slope of each variable and the
+        dissipation rate of each leg
+    '''
+    rows = []
+    for FLIGHT, start, end in legs:
+        spec = get_leg_spectra(FLIGHT, start, end, **kwargs)
+        row = {'file':FLIGHT.file, 'start':start, 'end':end,
+               'eps':spec['eps']}
+        for name, slope in spec['slope'].iteritems():
+            row['slope_'+name] = slope
+            row['var_'+name] = spec['variance'][name]
+        rows.append(row)
+
+    return pd.DataFrame(rows)
@@ -7,15 +7,18 @@
 
 from os.path import isfile
 from mpl_toolkits.axes_grid1 import ImageGrid
-from scipy.spatial import cKDTree
 #from itertools import product
 #import Radardata as rd
 import Common as cm 
+import Profiler
+import Smoothing
 
 import tempfile
+import atexit
 import os
-import glob
-import gdal
+import shutil
+import pickle
+import hashlib
 #import sys
 import numpy as np
 import matplotlib.pyplot as plt
@@ -26,6 +29,24 @@ from geographiclib.geodesic import Geodesic
 gdal_translate = '/home/raul/miniconda3/envs/py27/bin/gdal_translate'
 gdal_warp = '/home/raul/miniconda3/envs/py27/bin/gdalwarp'
 
+''' clipped and resampled DTM by (dem file, its mtime,
+	extent, size); the resampled file of each key is kept
+	in tempdir (removed at exit) and copied to
+	terrain_resampled.tmp when used '''
+dtms = {}
+dtm_files = set()
+current_dtm = None
+
+''' terrain contour polygons by (dem file, its mtime,
+	dtm extent, levels, crop extent); also written to the
+	optional terrain_cache folder of vitas.config '''
+contours = {}
+
+''' temporary files written with GDAL '''
+temp_files = ['terrain_clipped.tmp', 'terrain_clipped.tfw',
+			  'terrain_resampled.tmp', 'terrain_resampled.tfw',
+			  'terrain_slope.tmp']
+
 class Terrain(object):
 	def __init__(self,filepath):
 		if filepath:
@@ -36,13 +57,17 @@ class Terrain(object):
 		self.array=None
 
 
-def add_contour(axis,z,Plot):
+def get_dtm(Plot):
 
+	''' DTM of the synthesis of Plot, kept in its
+		Terrain (one per synthesis in a session) '''
 	if not Plot.terrain.array:
-		dtm=make_array(Plot.terrain.file,Plot)
-		Plot.terrain.array=dtm
-	else:
-		dtm=Plot.terrain.array
+		Plot.terrain.array=make_array(Plot.terrain.file,Plot)
+	return Plot.terrain.array
+
+def add_contour(axis,z,Plot):
+
+	dtm=get_dtm(Plot)
 
 	# cont=axis.contour(dtm['xg'],dtm['yg'],dtm['data'],
 	# 				levels=Plot.terrainContours,
@@ -56,12 +81,93 @@ def add_contour(axis,z,Plot):
 	levels = range(start_contour, end_contour, delta)
 	palette = sns.color_palette("Greys_r", len(levels)+2)
 	colors = palette[2:]
-	cont=axis.contourf(dtm['xg'],dtm['yg'],dtm['data'],
-					levels=levels,
-					colors=colors)
+
+	''' polygons computed once per dtm, levels and crop '''
+	crop_extent=getattr(Plot,'crop_extent',None)
+	key=(Plot.terrain.file, get_mtime(Plot.terrain.file),
+		 tuple(dtm['extent']), tuple(levels),
+		 None if crop_extent is None else tuple(crop_extent))
+	geometry=get_contour_geometry(dtm, levels, colors, key,
+								  folder=getattr(Plot,'terrainCache',None))
+	add_contour_geometry(axis, geometry)
 
 	# axis.clabel(cont, Plot.terrainContours ,fmt='%.0f',fontsize=12,inline_spacing=2)	
 
+def get_contour_geometry(dtm, levels, colors, key, folder=None):
+
+	''' list of (paths, facecolor) of each filled contour
+		band, from memory, the folder or computed '''
+	if key in contours:
+		return contours[key]
+
+	cache_file=None
+	if folder:
+		name=hashlib.md5(repr(key)).hexdigest()
+		cache_file=os.path.join(folder,'terrain_contours_'+name+'.pkl')
+		if isfile(cache_file):
+			with open(cache_file,'rb') as f:
+				contours[key]=pickle.load(f)
+			return contours[key]
+
+	''' contourf on an off-screen axis '''
+	from matplotlib.figure import Figure
+	with Profiler.span('terrain_contours'):
+		xg,yg,data=crop(dtm,key[-1])
+		ax=Figure().add_subplot(111)
+		cont=ax.contourf(xg,yg,data,
+						levels=levels,
+						colors=colors)
+		geometry=[]
+		for c in cont.collections:
+			facecolor=c.get_facecolor()
+			if len(facecolor) == 0:
+				continue
+			geometry.append((c.get_paths(), tuple(facecolor[0])))
+
+	contours[key]=geometry
+	if cache_file:
+		if not os.path.isdir(folder):
+			os.makedirs(folder)
+		with open(cache_file,'wb') as f:
+			pickle.dump(geometry,f,pickle.HIGHEST_PROTOCOL)
+
+	return geometry
+
+def add_contour_geometry(axis, geometry):
+
+	''' filled contours as patch collections '''
+	from matplotlib.collections import PathCollection
+
+	for paths,facecolor in geometry:
+		if not paths:
+			continue
+		coll=PathCollection(paths,
+							facecolors=[facecolor],
+							edgecolors='none',
+							linewidths=0,
+							antialiaseds=False)
+		axis.add_collection(coll,autolim=False)
+
+def crop(dtm,extent):
+
+	''' axes and data of dtm covering extent
+		[lx,rx,by,ty] plus one pixel; whole dtm
+		if extent is None
+	'''
+	xg=dtm['xg']
+	yg=dtm['yg']
+	if extent is None:
+		return xg,yg,dtm['data']
+
+	ix=np.where((xg>=extent[0]) & (xg<=extent[1]))[0]
+	iy=np.where((yg>=extent[2]) & (yg<=extent[3]))[0]
+	if ix.size == 0 or iy.size == 0:
+		return xg,yg,dtm['data']
+	xs=slice(max(ix.min()-1,0),ix.max()+2)
+	ys=slice(max(iy.min()-1,0),iy.max()+2)
+
+	return xg[xs],yg[ys],dtm['data'][ys,xs]
+
 def plot_altitude_mask(axis,S,dtm):
 
 	extent=S.get_extent()
@@ -109,8 +215,7 @@ def plot_altitude_map(SynthPlot,terrain):
 	# else:
 	# 	dem_file=tempfile.gettempdir()+'/terrain_resampled.tmp'
 
-	for f in glob.glob('/tmp/terrain_*'):
-		os.remove(f)
+	clear_temp_files()
 
 	extent=SynthPlot.get_extent()
 
@@ -209,6 +314,8 @@ def plot_map(SynthPlot,data):
 
 def get_data(dtmfile):
 
+	import gdal
+
 	''' store dtm in data '''
 #	print dtmfile
 	datafile = gdal.Open(dtmfile)
@@ -272,14 +379,16 @@ def make_3d_mask(data,levels,res):
 
 	return mask
 
+@Profiler.timed('terrain')
 def make_array(dem_file, Plot):
-	
+
+	''' clipped and resampled DTM of the synthesis
+		domain; GDAL runs once per extent and size '''
+	global current_dtm
+
 	temp_file=tempfile.gettempdir()+'/terrain_clipped.tmp'
 	out_file=tempfile.gettempdir()+'/terrain_resampled.tmp'
 
-	for f in glob.glob('/tmp/terrain_*'):
-		os.remove(f)
-
 	''' same boundaries as synthesis'''
 	ulx = min(Plot.lons)
 	uly = max(Plot.lats)		
@@ -302,6 +411,19 @@ def make_array(dem_file, Plot):
 	resampx_to=int(len(xvalues)*factor)
 	resampy_to=int(len(yvalues)*factor)
 
+	key=(dem_file, get_mtime(dem_file), ulx, uly, lrx, lry,
+		 resampx_to, resampy_to)
+	key_file=os.path.join(tempfile.gettempdir(),
+						  'vitas_dtm_'+hashlib.md5(repr(key)).hexdigest()+'.tif')
+	if key in dtms and isfile(key_file):
+		''' other functions read terrain_resampled.tmp '''
+		if current_dtm != key:
+			shutil.copyfile(key_file,out_file)
+			current_dtm=key
+		return dtms[key]
+
+	clear_temp_files()
+
 	# if isfile(out_file):
 	# 	data,_,_=get_data(out_file)
 	# else:
@@ -311,7 +433,10 @@ def make_array(dem_file, Plot):
 	input_param = (resampy_to,resampx_to,temp_file, out_file)	
 	resample_dem(input_param)
 #	print out_file
-	data,_,_=get_data(out_file)
+	data,_,gt=get_data(out_file)
+	shutil.copyfile(out_file,key_file)
+	dtm_files.add(key_file)
+	current_dtm=key
 
 	# mask=make_3d_mask(data,levels,res)
 	mask=[]
@@ -324,15 +449,20 @@ def make_array(dem_file, Plot):
 	dtm['extent']=data['extent']
 	dtm['xg']=data['xg']
 	dtm['yg']=data['yg']
+	dtm['geotransform']=gt
 	dtm['profile']=None
+	dtms[key]=dtm
 	
 	return dtm
 
+@Profiler.timed('terrain')
 def get_altitude_profile(Plot):
 
-	dem_file=tempfile.gettempdir()+'/terrain_resampled.tmp'
-	dtm,dtmfile,gt = get_data(dem_file)
-	data=dtm['array']
+	''' from the DTM of the synthesis in memory (not
+		terrain_resampled.tmp, which may hold the DTM
+		of another synthesis in a session) '''
+	dtm=get_dtm(Plot)
+	data=dtm['data']
 	altitude=[]
 	if Plot.sliceo=='zonal':		
 		geoax=dtm['yg']
@@ -351,7 +481,7 @@ def get_altitude_profile(Plot):
 		c1=Plot.slice[1]
 		npoints=100
 		line = interpolateLine(c0,c1,npoints)
-		altitude = getAltitudeProfile(line,dtmfile,gt)
+		altitude = get_elevation(line,data,dtm['geotransform'])
 		return altitude 
 
 	axis=[]
@@ -362,6 +492,7 @@ def get_altitude_profile(Plot):
 	prof['axis']=axis
 	return prof
 
+@Profiler.timed('terrain')
 def get_topo(**kwargs):
 
 	lats=kwargs['lats']
@@ -399,14 +530,14 @@ def get_topo(**kwargs):
 	
 	return altitude
 
+@Profiler.timed('terrain')
 def get_topo2(**kwargs):
 
 	lats=kwargs['lats']
 	lons=kwargs['lons']
 	terrain=kwargs['terrain']
 
-	for f in glob.glob('/tmp/terrain_*'):
-		os.remove(f)
+	clear_temp_files()
 
 	lx=min(lons)
 	uy=max(lats)
@@ -425,30 +556,41 @@ def get_topo2(**kwargs):
 
 	dtm,_,_=get_data(res_file)
 	data=dtm['array']
-	xg=dtm['xg']
-	yg=dtm['yg']
+	xg=np.asarray(dtm['xg'])
+	yg=np.asarray(dtm['yg'])
+
+	''' mean of 3x3 cells of the whole DTM, then the
+		nearest cell of each point '''
+	mean=Smoothing.box_mean(data,3)
+	lons=np.asarray(lons,dtype=float)
+	lats=np.asarray(lats,dtype=float)
+	i=cm.find_nearest2(xg,lons)
+	if yg[0] > yg[-1]:
+		''' rows from north to south '''
+		j=yg.size-1-cm.find_nearest2(yg[::-1],lats)
+	else:
+		j=cm.find_nearest2(yg,lats)
+
+	return mean[j,i].tolist()
+
+
+def get_mtime(dem_file):
 
-	xm,ym = np.meshgrid(xg,yg)
-	xd=np.reshape(xm,[1,xm.size]).tolist()[0]
-	yd=np.reshape(ym,[1,ym.size]).tolist()[0]
-	kd=np.reshape(data,[data.size,1])
+	''' modification time of the DEM, so an updated DEM
+		does not match cached DTMs and contours '''
+	if dem_file and isfile(dem_file):
+		return os.path.getmtime(dem_file)
+	return None
 
-	''' create kdTree with entire domain'''
-	coords=zip(xd,yd)
-	tree = cKDTree(coords)
-	topo=[]
-	neigh=8
-	for c in zip(lons,lats):
-		dist , idx = tree.query( c, k=neigh, eps=0, p=1, distance_upper_bound=1)
-		# print idx
-		# print dist
-		# print kd[idx]
-		# sys.exit()
-		kd_mean = np.nanmean(kd[idx],axis=0)
-		topo.append(kd_mean[0])
+def remove_dtm_files():
 
-	return topo
+	''' resampled DTMs (vitas_dtm_*.tif) of this process '''
+	for f in dtm_files:
+		if isfile(f):
+			os.remove(f)
+	dtm_files.clear()
 
+atexit.register(remove_dtm_files)
 
 def find_nearest(array,value):
 
@@ -456,6 +598,20 @@ def find_nearest(array,value):
 	return idx
 
 
+def clear_temp_files():
+
+	''' removes the temporary terrain files of this
+		process (in tempfile.gettempdir(), a folder of
+		its own in export and animation workers); the
+		resampled file no longer holds a cached DTM '''
+	global current_dtm
+
+	for name in temp_files:
+		f=os.path.join(tempfile.gettempdir(),name)
+		if isfile(f):
+			os.remove(f)
+	current_dtm=None
+
 def clip_dem(input_param):
 	
 	''' clip original dtm '''
@@ -495,6 +651,20 @@ def getDtmElevation(x,y,layer,gt):
 	col.append(0)
 	return col[0]
 
+def get_elevation(line,data,gt):
+
+	''' as getAltitudeProfile with the DTM array in
+		memory; NaN outside the DTM '''
+	lats=np.array([point[0] for point in line])
+	lons=np.array([point[1] for point in line])
+	px=np.floor((lons-gt[0])/gt[1]).astype(int)
+	py=np.floor((lats-gt[3])/gt[5]).astype(int)
+	rows,cols=data.shape
+	inside=(px>=0) & (px<cols) & (py>=0) & (py<rows)
+	altitude=np.full(len(line),np.nan)
+	altitude[inside]=data[py[inside],px[inside]]
+	return altitude.tolist()
+
 def getAltitudeProfile(line,layer,gt):
 	altitude=[]
 	for point in line:
@@ -0,0 +1,153 @@
+'''
+***************************************
+    Windowed second moments of flight
+    level data
+
+    All variances and covariances of
+    (u, v, w, theta) are computed in one
+    vectorized pass using cumulative sums,
+    so the cost does not depend on the
+    window length. Windows are centered and
+    their length is given in seconds or in
+    km along track.
+
+    Use:
+        met = FLIGHT.get_meteo(start, end)
+        mom = Turbulence.get_moments(met, window=60)
+        mom = Turbulence.get_moments(met, window_km=5)
+***************************************
+'''
+
+import numpy as np
+import pandas as pd
+
+import Common as cm
+
+''' variables entering the moments '''
+components = ['u','v','w','theta']
+
+
+def get_moments(data, **kwargs):
+
+    ''' returns a DataFrame with the components, their
+        windowed variances and covariances, tke, vertical
+        heat flux and vertical momentum fluxes
+
+        data: DataFrame with wspd, wdir, wvert, theta
+              (and lats, lons if window_km is used)
+        window: window length [s] (default 60)
+        window_km: window length [km]; overrides window
+        distance: distance along track [km] of each sample;
+                  computed from lats, lons if not given
+        min_valid: fraction of valid samples required
+                   in a window (default 1.0)
+    '''
+    window = kwargs.get('window', 60)
+    window_km = kwargs.get('window_km', None)
+    min_valid = kwargs.get('min_valid', 1.0)
+
+    ''' coordinate used to define windows '''
+    if window_km is not None:
+        coord = kwargs.get('distance', None)
+        if coord is None:
+            coord = cm.get_cumulative_distance(lat=np.asarray(data['lats']),
+                                               lon=np.asarray(data['lons']))
+        coord = np.asarray(coord, dtype=float)
+        length = float(window_km)
+    else:
+        ''' rounded to remove noise from float conversion of Time '''
+        secs = (data.index - data.index[0]).total_seconds()
+        coord = np.round(np.asarray(secs, dtype=float), 3)
+        length = float(window)
+
+    u, v = get_wind_components(np.asarray(data['wspd'], dtype=float),
+                               np.asarray(data['wdir'], dtype=float))
+    w = np.asarray(data['wvert'], dtype=float)
+    theta = np.asarray(data['theta'], dtype=float)
+    X = np.column_stack((u, v, w, theta))
+
+    lo, hi = get_window_bounds(coord, length)
+
+    mean, cov, valid = windowed_moments(X, lo, hi)
+
+    ''' windows truncated by the edges of the data
+        or with missing samples are discarded '''
+    spacing = np.median(np.diff(coord))
+    complete = ((coord - length/2. >= coord[0]) &
+                (coord + length/2. - spacing <= coord[-1]))
+    good = complete & (valid >= min_valid) & (hi - lo > 1)
+    cov[~good] = np.nan
+
+    out = pd.DataFrame(index=data.index)
+    for i, name in enumerate(components):
+        out[name] = X[:, i]
+    for i, a in enumerate(components):
+        for j, b in enumerate(components):
+            if j < i:
+                continue
+            if i == j:
+                out[a+'_var'] = cov[:, i, j]
+            else:
+                out[a+'_'+b] = cov[:, i, j]
+
+    out['tke'] = 0.5*(out['u_var']+out['v_var']+out['w_var'])
+    out['heat_flux'] = out['w_theta']
+    out['u_moflux'] = out['u_w']
+    out['v_moflux'] = out['v_w']
+
+    return out
+
+
+def get_window_bounds(coord, length):
+
+    ''' indices [lo,hi) of samples with coordinate within
+        [c-length/2, c+length/2); coord has to be monotonic.
+        At 1 Hz this is the same window used by pandas
+        rolling with center=True
+    '''
+    lo = np.searchsorted(coord, coord - length/2., side='left')
+    hi = np.searchsorted(coord, coord + length/2., side='left')
+
+    return lo, hi
+
+
+def windowed_moments(X, lo, hi):
+
+    ''' windowed means and covariance matrices of the
+        columns of X between rows [lo,hi); NaNs are
+        excluded pairwise. Returns mean (n,k),
+        cov (n,k,k) and fraction of valid samples (n)
+    '''
+    n, k = X.shape
+    ok = ~np.isnan(X)
+    Xf = np.where(ok, X, 0.)
+
+    ''' pairwise products and pairwise valid counts '''
+    XX = Xf[:, :, None]*Xf[:, None, :]
+    OO = (ok[:, :, None] & ok[:, None, :]).astype(float)
+    XO = Xf[:, :, None]*OO
+
+    def windowed_sum(a):
+        c = np.concatenate((np.zeros((1,)+a.shape[1:]), np.cumsum(a, axis=0)))
+        return c[hi]-c[lo]
+
+    sxx = windowed_sum(XX)
+    cnt = windowed_sum(OO)
+    sx = windowed_sum(XO)          # sum of x_i where x_i and x_j valid
+    sy = np.swapaxes(sx, 1, 2)     # sum of x_j where x_i and x_j valid
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = (sxx - sx*sy/cnt)/(cnt-1)
+        diag = np.arange(k)
+        mean = sx[:, diag, diag]/cnt[:, diag, diag]
+        valid = cnt[:, diag, diag].min(axis=1)/(hi-lo)
+
+    return mean, cov, valid
+
+
+def get_wind_components(wspd, wdir):
+
+    deg2rad = np.pi/180
+    u = -wspd*np.sin(wdir*deg2rad)
+    v = -wspd*np.cos(wdir*deg2rad)
+    return u, v
@@ -41,15 +41,15 @@ def start():
 
 	if not isdir(synthpath):
 		print "Please check input folder_synthesis\n"
-		sys.exit()
+		sys.exit(1)
 
 	if not isdir(stdpath):
 		print "Please check input folder_flight_level\n"
-		sys.exit()
+		sys.exit(1)
 
 	if not isfile(dtmfile):
 		print "Please check input filepath_dtm\n"
-		sys.exit()
+		sys.exit(1)
 
 
 	config['folder_synthesis']=synthpath
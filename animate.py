@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+
+'''
+ Animation of consecutive legs
+
+ Renders one horizontal plane (field and level) of
+ each leg on the same extent in a pool of processes
+ and assembles the frames into a MP4 or GIF with a
+ local encoder (ffmpeg, or ImageMagick convert for
+ GIF), or keeps them as numbered PNG files:
+
+     frames/frame_0000.png, frames/frame_0001.png, ...
+
+ The extent is fixed (plan_extent of SynthPlot), so
+ coastline and terrain layers are drawn once per process
+ and figures are reused as templates; each frame adds
+ the field, flight path and wind vectors.
+
+ Use:
+     $ python animate.py --case c03 -f DBZ -p 2 --wind -o c03_dbz.mp4
+     $ python animate.py -c c03/leg01.cdf c03/leg02.cdf c03/leg03.cdf \
+             -f SPD --zoomin offshore --fps 2 -o c03_spd.gif
+     $ python animate.py --case c03 -f VOR --extent -124 -122.8 37.9 38.9 \
+             -o frames
+'''
+
+import os
+import sys
+import glob
+import time
+import shutil
+import argparse
+import traceback
+import tempfile
+import subprocess
+import multiprocessing
+
+from distutils.spawn import find_executable
+
+import ArgParser as vitas_args
+import VitasConfigParser as configp
+import export_figures
+
+
+def get_legs(config, legs=None, cases=None):
+
+    ''' legs (given, or all of the cases) sorted by start
+        time and their catalog entries '''
+    import Catalog
+
+    catalog = Catalog.build(config)
+    if legs is None:
+        entries = Catalog.query(catalog, case=cases)
+    else:
+        entries = []
+        for key in legs:
+            if key in catalog['synthesis']:
+                entries.append((key, catalog['synthesis'][key]))
+            else:
+                print "Not in the catalog: "+key
+    return sorted(entries, key=lambda item: item[1]['start'])
+
+
+def get_extent(config, entries, zoomin=None):
+
+    ''' zoom area of vitas.config (not clipped to the
+        legs) or union of the extents of the legs '''
+    if zoomin:
+        lat, lon = config['zoom_center'][zoomin]
+        dx = config['zoom_del']['x']/2.
+        dy = config['zoom_del']['y']/2.
+        return [lon-dx, lon+dx, lat-dy, lat+dy]
+
+    extents = [entry['extent'] for key, entry in entries]
+    return [min(e[0] for e in extents), max(e[1] for e in extents),
+            min(e[2] for e in extents), max(e[3] for e in extents)]
+
+
+def get_jobs(legs, field, panel, wind=False, mask=False):
+
+    ''' one frame per leg; returns list of
+        (frame number, vitas arguments) '''
+    jobs = []
+    for n, ced in enumerate(legs):
+        args = '--ced {} --field {} --panel {}'.format(ced, field, panel)
+        if wind:
+            args += ' --wind'
+        if mask:
+            args += ' --mask'
+        jobs.append((n, args))
+    return jobs
+
+
+def render_frame(job, folder='frames', dpi=None):
+
+    ''' plan view of a job saved as frame_<n>.png '''
+    import matplotlib.pyplot as plt
+    import Radardata
+
+    n, args = job
+    plt.close('all')
+    Radardata.pop_template_figures()
+    name = os.path.join(folder, 'frame_{:04d}.png'.format(n))
+    try:
+        opts = vitas_args.start(args)
+        opts.multi = False
+        export_figures.session.run(opts)
+        figs = [plt.figure(k) for k in plt.get_fignums()]
+        figs += Radardata.pop_template_figures()
+        plan = [fig for fig in figs if fig.get_label() == 'plan']
+        if not plan:
+            return job, None, 'no plan view'
+        plan[0].savefig(name, dpi=dpi)
+    except SystemExit:
+        return job, None, 'vitas exited (check the arguments)'
+    except Exception:
+        return job, None, traceback.format_exc().strip().splitlines()[-1]
+    finally:
+        plt.close('all')
+    return job, name, None
+
+
+def render_star(params):
+    ''' Pool.imap passes one argument '''
+    return render_frame(*params)
+
+
+def render(jobs, config, folder='frames', dpi=None, processes=None):
+
+    ''' renders frames in a pool of processes (sessions
+        of export_figures.init_worker); returns the list of
+        (job, file name, error)
+    '''
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    for name in glob.glob(os.path.join(folder, 'frame_*.png')):
+        os.remove(name)
+
+    params = [(job, folder, dpi) for job in jobs]
+    if processes == 1:
+        export_figures.init_worker(config)
+        return [render_star(p) for p in params]
+
+    ''' temporary files of each process apart '''
+    tmproot = tempfile.mkdtemp(prefix='vitas_animate_')
+    pool = multiprocessing.Pool(processes,
+                                initializer=export_figures.init_worker,
+                                initargs=(config, tmproot))
+    try:
+        return list(pool.imap(render_star, params))
+    finally:
+        pool.close()
+        pool.join()
+        shutil.rmtree(tmproot, ignore_errors=True)
+
+
+def renumber(names, folder):
+
+    ''' frames numbered without gaps (encoders read
+        frame_%04d.png) '''
+    out = []
+    for n, name in enumerate(names):
+        new = os.path.join(folder, 'frame_{:04d}.png'.format(n))
+        if name != new:
+            os.rename(name, new)
+        out.append(new)
+    return out
+
+
+def assemble(folder, output, fps=1):
+
+    ''' MP4 or GIF of the frames in folder; returns the
+        encoder command or None if there is no encoder
+    '''
+    frames = os.path.join(folder, 'frame_%04d.png')
+    ffmpeg = find_executable('ffmpeg')
+    convert = find_executable('convert')
+
+    if ffmpeg:
+        cmd = [ffmpeg, '-y', '-loglevel', 'error',
+               '-framerate', str(fps), '-i', frames]
+        if output.endswith('.mp4'):
+            ''' libx264 needs even width and height '''
+            cmd += ['-vf', 'scale=trunc(iw/2)*2:trunc(ih/2)*2',
+                    '-c:v', 'libx264', '-pix_fmt', 'yuv420p']
+        cmd.append(output)
+    elif convert and output.endswith('.gif'):
+        delay = int(round(100./fps))
+        cmd = [convert, '-delay', str(delay), '-loop', '0']
+        cmd += sorted(glob.glob(os.path.join(folder, 'frame_*.png')))
+        cmd.append(output)
+    else:
+        return None
+
+    subprocess.check_call(cmd)
+    return cmd
+
+
+def start():
+
+    parser = argparse.ArgumentParser(description='VITAS leg animation')
+    parser.add_argument('--ced', '-c', metavar='file', nargs='+', default=None,
+                        help="legs with format CaseName/LegName "
+                             "(sorted by time)")
+    parser.add_argument('--case', metavar='str', nargs='+', default=None,
+                        help="all legs of given case(s)")
+    parser.add_argument('--field', '-f', metavar='STR', default='DBZ',
+                        type=vitas_args.field)
+    parser.add_argument('--panel', '-p', metavar='num', type=int, default=1,
+                        help="vertical level (as vitas.py --panel)")
+    parser.add_argument('--wind', '-w', action='store_true')
+    parser.add_argument('--mask', '-m', action='store_true')
+    parser.add_argument('--zoomin', '-z', metavar='str', default=None,
+                        help="extent of a zoom_center of vitas.config")
+    parser.add_argument('--extent', metavar='deg', type=float, nargs=4,
+                        default=None,
+                        help="extent (lon0 lon1 lat0 lat1); union of the "
+                             "legs if neither --extent nor --zoomin")
+    parser.add_argument('--fps', type=float, default=1,
+                        help="frames per second")
+    parser.add_argument('--dpi', type=int, default=None)
+    parser.add_argument('--output', '-o', default='animation.mp4',
+                        help="MP4 or GIF file, or folder for the PNG frames")
+    parser.add_argument('--processes', '-j', type=int, default=None,
+                        help="number of processes (default: number of cores)")
+    return parser.parse_args()
+
+
+def main(args):
+
+    if args.ced is None and args.case is None:
+        print "Please give legs (--ced) or cases (--case)"
+        return 1
+
+    config = configp.start()
+    entries = get_legs(config, legs=args.ced, cases=args.case)
+    if not entries:
+        print "No legs found"
+        return 1
+
+    if args.extent:
+        extent = args.extent
+    else:
+        extent = get_extent(config, entries, zoomin=args.zoomin)
+    config['plan_extent'] = extent
+    config['figure_templates'] = True
+    if args.dpi:
+        config['base_layer_dpi'] = args.dpi
+
+    video = os.path.splitext(args.output)[1] in ['.mp4', '.gif']
+    if video:
+        folder = os.path.splitext(args.output)[0]+'_frames'
+    else:
+        folder = args.output
+
+    legs = [key for key, entry in entries]
+    jobs = get_jobs(legs, args.field, args.panel,
+                    wind=args.wind, mask=args.mask)
+
+    t0 = time.time()
+    results = render(jobs, config, folder=folder, dpi=args.dpi,
+                     processes=args.processes)
+
+    names = []
+    for job, name, error in results:
+        if error:
+            print "Failed: {} ({})".format(legs[job[0]], error)
+        else:
+            names.append(name)
+    names = renumber(names, folder)
+    print "{} frames from {} legs in {:.1f} s".format(len(names), len(legs),
+                                                      time.time()-t0)
+    if not names:
+        return 1
+
+    if video:
+        if assemble(folder, args.output, fps=args.fps) is None:
+            print "No encoder found (ffmpeg or convert); frames kept in "+folder
+            return 1
+        print "Saved "+args.output
+
+    return 0
+
+
+if __name__ == "__main__":
+
+    sys.exit(main(start()))
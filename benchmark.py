@@ -0,0 +1,367 @@
+#!/usr/bin/env python
+
+'''
+ Benchmarks of VITAS workflows
+
+ Each case runs in its own python process on the
+ synthetic files of synthetic_fixtures.py, so wall time
+ includes only the timed step and peak memory is not
+ shared between cases. Results are appended to a JSON
+ history and compared with the previous run of the
+ same case and size.
+
+ Use:
+     $ python benchmark.py                     # medium size, all cases
+     $ python benchmark.py --size small large --repeat 5
+     $ python benchmark.py --case ingest_synthesis cross_section --check
+
+ With --check the exit status is 1 when a case is
+ slower (or uses more memory) than the previous run by
+ more than --tolerance, fails after running before, or
+ when the startup case fails or is over --budget. Cases
+ that need the DEM (startup, terrain) are skipped when
+ gdal is not available to write it.
+'''
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import datetime
+import resource
+import subprocess
+
+import synthetic_fixtures as sf
+
+history_file = 'benchmark_history.json'
+fixtures_folder = 'bench_fixtures'
+
+''' cold start of a print option of vitas.py [s] '''
+startup_budget = 2.0
+
+
+def setup_synthesis(config):
+
+    import AircraftAnalysis as AA
+
+    synthfile = config['folder_synthesis']+'/c03/leg01.cdf'
+    SYNTH = AA.Synthesis(synthfile)
+    SYNTH.set_fields(config)
+    SYNTH.set_axes(config)
+    SYNTH.set_time()
+    return SYNTH
+
+
+def setup_flight(config):
+
+    import AircraftAnalysis as AA
+
+    stdpath = config['folder_flight_level']
+    return AA.Flight(stdpath+'/'+sorted(os.listdir(stdpath))[0])
+
+
+''' each case has a setup (not timed) and a run (timed) '''
+
+def case_startup(config):
+
+    ''' new interpreter running a quick query '''
+    folder = os.path.dirname(config['folder_synthesis'])
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vitas.py')
+
+    def run(_):
+        with open(os.devnull, 'w') as devnull:
+            subprocess.check_call([sys.executable, script,
+                                   '--ced', 'c03/leg01.cdf', '--print_shapes'],
+                                  cwd=folder, stdout=devnull)
+    return None, run
+
+
+def case_ingest_synthesis(config):
+
+    def run(_):
+        setup_synthesis(config)
+    return None, run
+
+
+def case_ingest_panel(config):
+
+    ''' one level of a zoomed area (lazy synthesis) '''
+    import Filehandler as fh
+
+    def run(_):
+        SYNTH = fh.get_synthesis('c03/leg01.cdf', config, lazy=True)
+        SYNTH.require(levels=[3], bbox=(-123.5,-123.0,38.2,38.6))
+    return None, run
+
+
+def case_ingest_flight(config):
+
+    def run(_):
+        FLIGHT = setup_flight(config)
+        FLIGHT.get_meteo(sf.flight_date,
+                         sf.flight_date+datetime.timedelta(minutes=sf.leg_minutes))
+    return None, run
+
+
+def case_slicing(config):
+
+    import Section
+
+    def setup():
+        SYNTH = setup_synthesis(config)
+        FLIGHT = setup_flight(config)
+        return SYNTH, FLIGHT
+
+    def run(ctx):
+        SYNTH, FLIGHT = ctx
+        for name in ['DBZ','U','V']:
+            array = getattr(SYNTH, name)
+            [array[:,:,k] for k in range(array.shape[2])]
+        window = FLIGHT.get_window(SYNTH.start, SYNTH.end)
+        curtain = Section.Curtain(SYNTH, window.lats, window.lons, spacing=0.5)
+        for name in ['DBZ','U','V']:
+            curtain.sample(getattr(SYNTH, name))
+    return setup, run
+
+
+def case_cross_section(config):
+
+    import Section
+
+    def setup():
+        return setup_synthesis(config)
+
+    def run(SYNTH):
+        nx, ny, nz = SYNTH.DBZ.shape
+        engine = Section.Engine(SYNTH.DBZ.shape)
+        points = engine.get_points((0, ny/4), (nx-1, 3*ny/4))
+        for name in ['DBZ','U','V']:
+            engine.interpolate(getattr(SYNTH, name), points)
+    return setup, run
+
+
+def case_collocation(config):
+
+    def setup():
+        return setup_synthesis(config), setup_flight(config)
+
+    def run(ctx):
+        SYNTH, FLIGHT = ctx
+        window = FLIGHT.get_window(SYNTH.start, SYNTH.end)
+        i, j, valid = FLIGHT.get_track_index().get_grid_cells(SYNTH)
+        inside = valid[window.slice]
+        i, j = i[window.slice][inside], j[window.slice][inside]
+        for name in ['U','V']:
+            getattr(SYNTH, name)[i, j, :]
+    return setup, run
+
+
+def case_profiles(config):
+
+    import Plotter
+
+    def setup():
+        return setup_synthesis(config)
+
+    def run(SYNTH):
+        for lat in [38.2, 38.4, 38.6]:
+            Plotter.make_synth_profile_withnearest(SYNTH,
+                                                   target_latlon=[(lat,-123.1)],
+                                                   max_dist=4.5,
+                                                   n_neigh=12)
+    return setup, run
+
+
+def case_terrain(config):
+
+    import Terrain
+
+    def run(_):
+        data, layer, gt = Terrain.get_data(config['filepath_dtm'])
+        line = Terrain.interpolateLine((38.1,-123.9), (38.8,-122.6), 200)
+        Terrain.getAltitudeProfile(line, layer, gt)
+    return None, run
+
+
+cases = ['startup', 'ingest_synthesis', 'ingest_panel', 'ingest_flight', 'slicing', 'cross_section',
+         'collocation', 'profiles', 'terrain']
+
+''' cases that need the DEM of the fixtures (written with
+    gdal; vitas.py exits without it) '''
+dem_cases = ['startup', 'terrain']
+
+
+def run_case(name, config):
+
+    ''' runs a case in this process and returns
+        wall time [s] and peak memory [MB]
+    '''
+    setup, run = globals()['case_'+name](config)
+    ctx = setup() if setup else None
+    t0 = time.time()
+    run(ctx)
+    wall = time.time() - t0
+    ''' ru_maxrss is in kB on linux and bytes on mac '''
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        rss = rss/1024.
+    return {'wall':wall, 'peak_mb':rss/1024.}
+
+
+def spawn_case(name, size, folder):
+
+    cmd = [sys.executable, os.path.abspath(__file__),
+           '--worker', name, '--size', size, '--folder', folder]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = proc.communicate()
+    if proc.returncode != 0:
+        return {'error':err.strip().splitlines()[-1]}
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def get_commit():
+
+    try:
+        here = os.path.dirname(os.path.abspath(__file__))
+        out = subprocess.check_output(['git','rev-parse','--short','HEAD'],
+                                      cwd=here, stderr=subprocess.STDOUT)
+        return out.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path):
+
+    if os.path.isfile(path):
+        with open(path) as f:
+            return json.load(f)
+    return []
+
+
+def compare(history, entry, tolerance):
+
+    ''' returns a list of regressions with respect to the
+        last entry with the same size; a case that fails
+        after running before is a regression, a skipped
+        case is not compared
+    '''
+    previous = [h for h in history if h['size'] == entry['size']]
+    if not previous:
+        return []
+    last = previous[-1]['results']
+    regressions = []
+    for name, res in sorted(entry['results'].iteritems()):
+        old = last.get(name)
+        if old is None or 'error' in old or 'skipped' in old:
+            continue
+        if 'skipped' in res:
+            continue
+        if 'error' in res:
+            regressions.append((name, 'error', old['wall'], res['error']))
+            continue
+        for key in ['wall', 'peak_mb']:
+            if old[key] > 0 and res[key] > old[key]*(1+tolerance):
+                regressions.append((name, key, old[key], res[key]))
+    return regressions
+
+
+def print_results(entry):
+
+    print "\n{:<20}{:>12}{:>12}".format('Case ('+entry['size']+')', 'Wall [s]', 'Peak [MB]')
+    print "-"*44
+    for name in cases:
+        res = entry['results'].get(name)
+        if res is None:
+            continue
+        if 'error' in res:
+            print "{:<20}  {}".format(name, res['error'])
+        elif 'skipped' in res:
+            print "{:<20}  skipped: {}".format(name, res['skipped'])
+        else:
+            print "{:<20}{:>12.3f}{:>12.1f}".format(name, res['wall'], res['peak_mb'])
+
+
+def start():
+
+    parser = argparse.ArgumentParser(description='VITAS benchmarks')
+    parser.add_argument('--size', nargs='+', default=['medium'],
+                        choices=sorted(sf.sizes))
+    parser.add_argument('--case', nargs='+', default=cases, choices=cases)
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="runs per case; best wall time and largest peak are kept")
+    parser.add_argument('--folder', default=fixtures_folder,
+                        help="folder with synthetic fixtures (created if needed)")
+    parser.add_argument('--history', default=history_file)
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="relative increase reported as regression")
+    parser.add_argument('--budget', type=float, default=startup_budget,
+                        help="maximum wall time [s] of the startup case")
+    parser.add_argument('--check', action='store_true',
+                        help="exit with status 1 if there are regressions")
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main(args):
+
+    if args.worker:
+        size = args.size[0]
+        config = sf.get_config(os.path.join(args.folder, size))
+        print json.dumps(run_case(args.worker, config))
+        return 0
+
+    history = load_history(args.history)
+    failed = False
+    for size in args.size:
+        config = sf.make_all(os.path.join(args.folder, size), size)
+        dem = os.path.isfile(config['filepath_dtm'])
+        entry = {'date':datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),
+                 'commit':get_commit(),
+                 'host':socket.gethostname(),
+                 'python':sys.version.split()[0],
+                 'size':size,
+                 'results':{}}
+        for name in args.case:
+            if name in dem_cases and not dem:
+                entry['results'][name] = {'skipped':'gdal missing'}
+                continue
+            runs = [spawn_case(name, size, args.folder) for n in range(args.repeat)]
+            good = [r for r in runs if 'error' not in r]
+            if good:
+                entry['results'][name] = {'wall':min(r['wall'] for r in good),
+                                          'peak_mb':max(r['peak_mb'] for r in good)}
+            else:
+                entry['results'][name] = runs[0]
+
+        print_results(entry)
+        for name, key, old, new in compare(history, entry, args.tolerance):
+            if key == 'error':
+                print "Regression in {}: fails ({})".format(name, new)
+            else:
+                print "Regression in {} ({}): {:.3f} -> {:.3f}".format(name, key, old, new)
+            failed = True
+        ''' vitas.py exits non-zero on errors (check_call) '''
+        startup = entry['results'].get('startup')
+        if startup is None or 'skipped' in startup:
+            pass
+        elif 'error' in startup:
+            print "Startup failed: "+startup['error']
+            failed = True
+        elif startup['wall'] > args.budget:
+            print "Startup over budget: {:.3f} > {:.3f} s".format(startup['wall'], args.budget)
+            failed = True
+        history.append(entry)
+
+    with open(args.history, 'w') as f:
+        json.dump(history, f, indent=1, sort_keys=True)
+
+    if failed and args.check:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+
+    sys.exit(main(start()))
@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+
+'''
+ Batch export of VITAS figures
+
+ Renders synthesis plots without a display (Agg backend)
+ and saves them as PNG and/or PDF with names given by
+ case, leg, field, panel and slice:
+
+     c03_leg01_DBZ_p1_plan.png
+     c03_leg01_SPD_p1_slz38.30_zonal_u.pdf
+     c03_leg01_DBZ_all_sl38.10_-123.90_50_160_section_along.png
+
+ Jobs (one per leg, field and panel) are spread over a
+ pool of processes. Jobs of the same leg go to the same
+ process, which keeps the leg in its session.
+
+ Use:
+     $ python export_figures.py --case c03 -f DBZ SPD -p 1 2 --wind
+     $ python export_figures.py -c c03/leg01.cdf c03/leg02.cdf -f DBZ \
+             --slicez 38.3 --format png pdf --output figures -j 8
+'''
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import traceback
+import multiprocessing
+
+import ArgParser as vitas_args
+import VitasConfigParser as configp
+
+''' session of each worker process '''
+session = None
+
+
+def get_legs(config, cases=None):
+
+    ''' syntheses of the catalog (all or of given cases) '''
+    import Catalog
+
+    catalog = Catalog.build(config)
+    return [key for key, entry in Catalog.query(catalog, case=cases)]
+
+
+def get_slice_tag(args):
+
+    ''' slice options as part of the file name '''
+    tags = []
+    if args.slicez:
+        tags.append('slz'+'_'.join('{:.2f}'.format(v) for v in args.slicez))
+    if args.slicem:
+        tags.append('slm'+'_'.join('{:.2f}'.format(v) for v in args.slicem))
+    if args.slice:
+        values = args.slice.translate(None, '()').split(',')
+        tags.append('sl'+'_'.join(values))
+    if args.curtain:
+        tags.append('cu{:.2f}'.format(args.curtain))
+    return '_'.join(tags)
+
+
+def get_options(args):
+
+    ''' vitas.py options shared by all jobs '''
+    opts = []
+    if args.wind:
+        opts.append('--wind')
+    if args.mask:
+        opts.append('--mask')
+    if args.zoomin:
+        opts.append('--zoomin '+args.zoomin)
+    if args.slicez:
+        opts.append('--slicez '+' '.join(str(v) for v in args.slicez))
+    if args.slicem:
+        opts.append('--slicem '+' '.join(str(v) for v in args.slicem))
+    if args.slice:
+        opts.append('--slice '+args.slice)
+    if args.curtain:
+        opts.append('--curtain '+str(args.curtain))
+    return ' '.join(opts)
+
+
+def get_jobs(legs, fields, panels, options='', slice_tag=''):
+
+    ''' one job per leg, field and panel (None: six panels);
+        returns list of (vitas arguments, file name prefix)
+    '''
+    jobs = []
+    for ced in legs:
+        case, leg = ced.replace('.cdf', '').split('/')
+        for field in fields:
+            for panel in panels:
+                args = '--ced {} --field {}'.format(ced, field)
+                if panel is None:
+                    ptag = 'all'
+                else:
+                    args += ' --panel {}'.format(panel)
+                    ptag = 'p{}'.format(panel)
+                if options:
+                    args += ' '+options
+                name = [case, leg, field, ptag]
+                if slice_tag:
+                    name.append(slice_tag)
+                jobs.append((args, '_'.join(name)))
+    return jobs
+
+
+def init_worker(config, tmproot=None):
+
+    ''' session of the process; with tmproot, temporary
+        files (e.g. terrain) go to a folder of the process
+        in tmproot, so workers do not share them '''
+    global session
+
+    if tmproot:
+        tempfile.tempdir = tempfile.mkdtemp(prefix='worker_', dir=tmproot)
+
+    import matplotlib
+    matplotlib.use('Agg')
+    import Session
+
+    session = Session.VitasSession(config)
+
+
+def render(job, output='figures', formats=('png',), dpi=None):
+
+    ''' runs a job in the session of the process and saves
+        its figures; figures are named by their label
+        (plan, zonal, meridional_u, section_along, ...)
+        or by their order if they have none
+    '''
+    import matplotlib.pyplot as plt
+
+    import Radardata
+
+    args, prefix = job
+    names = []
+    plt.close('all')
+    Radardata.pop_template_figures()
+    try:
+        opts = vitas_args.start(args)
+        opts.multi = False
+        session.run(opts)
+        figs = [plt.figure(n) for n in plt.get_fignums()]
+        ''' template figures are not closed (see --template) '''
+        figs += Radardata.pop_template_figures()
+        for n, fig in enumerate(figs):
+            label = fig.get_label() or 'fig{}'.format(n+1)
+            for fmt in formats:
+                name = os.path.join(output, '{}_{}.{}'.format(prefix, label, fmt))
+                fig.savefig(name, dpi=dpi)
+                names.append(name)
+    except SystemExit:
+        return job, names, 'vitas exited (check the arguments)'
+    except Exception:
+        return job, names, traceback.format_exc().strip().splitlines()[-1]
+    finally:
+        plt.close('all')
+    return job, names, None
+
+
+def render_star(params):
+    ''' Pool.imap passes one argument '''
+    return render(*params)
+
+
+def export(jobs, config, output='figures', formats=('png',), dpi=None,
+           processes=None, chunksize=1):
+
+    ''' renders jobs in a pool of processes; returns the list
+        of (job, file names, error)
+    '''
+    if not os.path.isdir(output):
+        os.makedirs(output)
+
+    params = [(job, output, formats, dpi) for job in jobs]
+    if processes == 1:
+        init_worker(config)
+        return [render_star(p) for p in params]
+
+    tmproot = tempfile.mkdtemp(prefix='vitas_export_')
+    pool = multiprocessing.Pool(processes, initializer=init_worker,
+                                initargs=(config, tmproot))
+    try:
+        return list(pool.imap(render_star, params, chunksize=chunksize))
+    finally:
+        pool.close()
+        pool.join()
+        shutil.rmtree(tmproot, ignore_errors=True)
+
+
+def start():
+
+    parser = argparse.ArgumentParser(description='VITAS batch figure export')
+    parser.add_argument('--ced', '-c', metavar='file', nargs='+', default=None,
+                        help="syntheses with format CaseName/LegName; "
+                             "all of the catalog (or of --case) if omitted")
+    parser.add_argument('--case', metavar='str', nargs='+', default=None,
+                        help="export all legs of given case(s)")
+    parser.add_argument('--field', '-f', metavar='STR', nargs='+', default=['DBZ'],
+                        type=vitas_args.field)
+    parser.add_argument('--panel', '-p', metavar='num', type=int, nargs='+',
+                        default=[None],
+                        help="panels (1-6); six panel figure if omitted")
+    parser.add_argument('--wind', '-w', action='store_true')
+    parser.add_argument('--mask', '-m', action='store_true')
+    parser.add_argument('--zoomin', '-z', metavar='str', default=None)
+    parser.add_argument('--slicez', '-slz', type=float, nargs='+', default=None)
+    parser.add_argument('--slicem', '-slm', type=float, nargs='+', default=None)
+    parser.add_argument('--slice', '-sl', metavar='(lat,lon,az,dist)', default=None)
+    parser.add_argument('--curtain', '-cu', type=float, default=None)
+    parser.add_argument('--format', nargs='+', default=['png'],
+                        choices=['png','pdf'])
+    parser.add_argument('--dpi', type=int, default=None)
+    parser.add_argument('--output', '-o', default='figures',
+                        help="output folder")
+    parser.add_argument('--processes', '-j', type=int, default=None,
+                        help="number of processes (default: number of cores)")
+    parser.add_argument('--template', action='store_true',
+                        help="reuse figure layouts between jobs of a process "
+                             "(figure_templates of vitas.config)")
+    return parser.parse_args()
+
+
+def main(args):
+
+    config = configp.start()
+    if args.template:
+        config['figure_templates'] = True
+    ''' image layers at the resolution of the files;
+        vector artists in vector formats '''
+    if args.dpi:
+        config['base_layer_dpi'] = args.dpi
+    if 'pdf' in args.format:
+        config['base_layers'] = False
+
+    legs = args.ced
+    if legs is None:
+        legs = get_legs(config, cases=args.case)
+    jobs = get_jobs(legs, args.field, args.panel,
+                    options=get_options(args),
+                    slice_tag=get_slice_tag(args))
+
+    ''' jobs of a leg in one chunk '''
+    chunksize = len(args.field)*len(args.panel)
+
+    t0 = time.time()
+    results = export(jobs, config,
+                     output=args.output,
+                     formats=args.format,
+                     dpi=args.dpi,
+                     processes=args.processes,
+                     chunksize=chunksize)
+
+    nfiles = 0
+    failed = 0
+    for job, names, error in results:
+        nfiles += len(names)
+        if error:
+            failed += 1
+            print "Failed: {} ({})".format(job[1], error)
+    print "{} files from {} jobs in {:.1f} s".format(nfiles, len(jobs), time.time()-t0)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+
+    sys.exit(main(start()))
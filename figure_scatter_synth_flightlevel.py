@@ -22,25 +22,25 @@ rcParams['mathtext.default'] = 'regular'
 sns.set_style("whitegrid")
 
 targets = list()
-targets.append(['c03/leg01.cdf','3','010123I.nc'])
-targets.append(['c03/leg02.cdf','7','010123I.nc'])
-targets.append(['c03/leg03.cdf','6','010123I.nc'])
-targets.append(['c03/leg04.cdf','6','010123I.nc'])
-targets.append(['c03/leg05.cdf','3','010123I.nc'])
-targets.append(['c03/leg08.cdf','6','010123I.nc'])
-targets.append(['c03/leg09.cdf','8','010123I.nc'])
-targets.append(['c03/leg12.cdf','3','010123I.nc'])
-targets.append(['c03/leg13.cdf','6','010123I.nc'])
-targets.append(['c03/leg14.cdf','6','010123I.nc'])
-#targets.append(['c03/leg15.cdf','3','010123I.nc']) # no data along path
-targets.append(['c03/leg16.cdf','3','010123I.nc'])
-targets.append(['c03/leg20.cdf','15','010123I.nc'])
+targets.append(['c03/leg01.cdf','3'])
+targets.append(['c03/leg02.cdf','7'])
+targets.append(['c03/leg03.cdf','6'])
+targets.append(['c03/leg04.cdf','6'])
+targets.append(['c03/leg05.cdf','3'])
+targets.append(['c03/leg08.cdf','6'])
+targets.append(['c03/leg09.cdf','8'])
+targets.append(['c03/leg12.cdf','3'])
+targets.append(['c03/leg13.cdf','6'])
+targets.append(['c03/leg14.cdf','6'])
+#targets.append(['c03/leg15.cdf','3']) # no data along path
+targets.append(['c03/leg16.cdf','3'])
+targets.append(['c03/leg20.cdf','15'])
 #
-targets.append(['c07/leg01.cdf','0','010217I.nc'])
-targets.append(['c07/leg03.cdf','6','010217I.nc'])
-targets.append(['c07/leg04.cdf','0','010217I.nc'])
-targets.append(['c07/leg05.cdf','4','010217I.nc'])
-targets.append(['c07/leg06.cdf','0','010217I.nc'])
+targets.append(['c07/leg01.cdf','0'])
+targets.append(['c07/leg03.cdf','6'])
+targets.append(['c07/leg04.cdf','0'])
+targets.append(['c07/leg05.cdf','4'])
+targets.append(['c07/leg06.cdf','0'])
 
 
 fl_u = np.array([])
@@ -48,9 +48,10 @@ fl_v = np.array([])
 sy_u = np.array([])
 sy_v = np.array([])
 
-template = '-c {0} -s {2} --valid {1} --no_plot'
+' std tapes are matched to each synthesis by time '
+template = '-c {0} --valid {1} --no_plot'
 for t in targets:
-    out = vitas.main(template.format(t[0],t[1],t[2]))   
+    out = vitas.main(template.format(t[0],t[1]))   
     fl_u = np.append(fl_u, out['fl']['u'])
     fl_v = np.append(fl_v, out['fl']['v'])
     sy_u = np.append(sy_u, out['sy']['u'])
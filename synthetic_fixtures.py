@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+
+'''
+ Synthetic input files for benchmarks
+
+ Writes CEDRIC syntheses, RAF standard tapes and a
+ GeoTIFF DEM with the same layout as the campaign
+ files, so VITAS can run without real data. Files are
+ created in
+
+     folder/synthesis/cNN/legNN.cdf
+     folder/flight_level/YYMMDDI.nc
+     folder/dtm.tif
+
+ Sizes are given by name (see sizes) and each size
+ goes to its own folder, together with a vitas.config
+ pointing to its files. The DEM needs gdal.
+
+ Use:
+     $ python synthetic_fixtures.py bench_fixtures small medium
+
+     or
+
+     import synthetic_fixtures as sf
+     config = sf.make_all('bench_fixtures/small', 'small')
+'''
+
+import os
+import sys
+import datetime
+import calendar
+
+import numpy as np
+
+from netCDF4 import Dataset
+
+''' grid (nx, ny, nz) and number of legs of each size '''
+sizes = {'small':  {'grid':(65,61,22),  'legs':2},
+         'medium': {'grid':(131,121,44), 'legs':4},
+         'large':  {'grid':(261,241,88), 'legs':4}}
+
+''' same reference point used by AircraftAnalysis.Synthesis '''
+ref_point = [38.3191, -123.0729] # Bodega Bay
+
+''' field names as in synthesis_field_name of vitas.config '''
+field_names = {'DBZ':'MAXDZ', 'U':'F2U', 'V':'F2V', 'WVA':'WVARF2',
+               'WUP':'WUPF2', 'VOR':'VORT2', 'CON':'CONM2'}
+
+fill_value = -32768.
+
+''' flight date and time of the first leg '''
+flight_date = datetime.datetime(2001,1,23,21,0,0)
+leg_minutes = 4
+
+
+def make_synthesis(path, start, end, grid=(131,121,44), seed=0):
+
+    ''' CEDRIC synthesis with fields (time,z,y,x), grid
+        in km centered at ref_point and 0.25 km levels
+    '''
+    nx, ny, nz = grid
+    folder = os.path.dirname(path)
+    if folder and not os.path.isdir(folder):
+        os.makedirs(folder)
+
+    x = np.linspace(-65, 65, nx)
+    y = np.linspace(-60, 60, ny)
+    z = np.arange(nz)*(11./nz)
+
+    nc = Dataset(path, 'w')
+    nc.createDimension('time', 1)
+    nc.createDimension('z', nz)
+    nc.createDimension('y', ny)
+    nc.createDimension('x', nx)
+    nc.createDimension('s8', 8)
+    for name, values in [('x',x), ('y',y), ('z',z)]:
+        var = nc.createVariable(name, 'f4', (name,))
+        var[:] = values
+
+    ''' smooth fields plus noise '''
+    rs = np.random.RandomState(seed)
+    Z, Y, X = np.meshgrid(z, y, x, indexing='ij')
+    band = np.exp(-((X*0.6+Y*0.8-10*seed)/25.)**2)
+    fields = {}
+    fields['DBZ'] = 10 + 25*band*np.exp(-Z/4.)
+    fields['U'] = 5 + 1.5*Z + 2*np.sin(X/20.)
+    fields['V'] = 10 + 2.0*Z + 2*np.cos(Y/20.)
+    fields['WVA'] = 1.5*band*np.sin(np.pi*Z/Z.max())
+    fields['WUP'] = fields['WVA']*0.8
+    fields['VOR'] = np.gradient(fields['V'], axis=2) - np.gradient(fields['U'], axis=1)
+    fields['CON'] = -(np.gradient(fields['U'], axis=2) + np.gradient(fields['V'], axis=1))
+
+    ''' missing data below the lowest beam and far from the track '''
+    missing = (Z < 0.3) | (np.hypot(X, Y) > 70)
+
+    for name, ncname in sorted(field_names.iteritems()):
+        var = nc.createVariable(ncname, 'f4', ('time','z','y','x'),
+                                fill_value=fill_value)
+        var.scale_factor = 1.0
+        array = fields[name] + rs.randn(nz, ny, nx)*0.5
+        array[missing] = fill_value
+        var.set_auto_maskandscale(False)
+        var[:] = array[None,:,:,:].astype('f4')
+
+    for name, value in [('start_time', start.strftime('%H:%M:%S')),
+                        ('end_time', end.strftime('%H:%M:%S')),
+                        ('start_date', start.strftime('%m/%d/%y')),
+                        ('end_date', end.strftime('%m/%d/%y'))]:
+        var = nc.createVariable(name, 'S1', ('s8',))
+        var[:] = np.array(list(value), dtype='S1')
+    nc.close()
+
+
+def make_stdtape(path, start, nsec, seed=1):
+
+    ''' RAF standard tape at 1 Hz; the aircraft flies a
+        racetrack of straight legs across the synthesis
+        domain at 1.5 km
+    '''
+    base_time = calendar.timegm(start.timetuple())
+    t = np.arange(nsec)
+    rs = np.random.RandomState(seed)
+
+    ''' 120 m/s along legs of leg_minutes, turning back '''
+    period = leg_minutes*60
+    phase = (t % (2*period))/float(period)
+    along = np.where(phase < 1, phase, 2-phase) - 0.5      # -0.5 to 0.5
+    dist = along*120*period/1000.                            # [km]
+    heading = np.where(phase < 1, 40., 220.)
+    lat = ref_point[0] + dist*np.cos(np.radians(40))/111.
+    lon = ref_point[1] + dist*np.sin(np.radians(40))/(111.*np.cos(np.radians(ref_point[0])))
+    lat = lat + np.floor(t/(2.*period))*0.02
+
+    values = {'LAT': lat,
+              'LON': lon,
+              'GEOPOT_ALT': 1500 + rs.randn(nsec)*5,
+              'PRES_ALT': 1500 + rs.randn(nsec)*5,
+              'AIR_PRESS': 850 + rs.randn(nsec)*0.5,
+              'AIR_TEMP': 5 + rs.randn(nsec)*0.3,
+              'DEW_POINT': 3 + rs.randn(nsec)*0.3,
+              'JWLWC': np.abs(rs.randn(nsec))*0.1,
+              'WIND_SPD': 15 + rs.randn(nsec),
+              'WIND_DIR': 200 + rs.randn(nsec)*5,
+              'VERT_WIND': rs.randn(nsec)*0.5,
+              'GRD_SPEED': 120 + rs.randn(nsec),
+              'TRACK': heading + rs.randn(nsec),
+              'HEADING': heading + rs.randn(nsec),
+              'PITCH': rs.randn(nsec),
+              'ROLL': rs.randn(nsec)}
+
+    folder = os.path.dirname(path)
+    if folder and not os.path.isdir(folder):
+        os.makedirs(folder)
+    nc = Dataset(path, 'w')
+    nc.createDimension('Time', nsec)
+    var = nc.createVariable('base_time', 'i4')
+    var.assignValue(base_time)
+    var = nc.createVariable('Time', 'f8', ('Time',))
+    var[:] = t
+    for name, array in sorted(values.iteritems()):
+        var = nc.createVariable(name, 'f4', ('Time',))
+        var[:] = array
+    nc.close()
+
+
+def make_dem(path, extent=(-124.0,-122.0,37.6,39.0), shape=(600,800)):
+
+    ''' GeoTIFF DEM in geographic coordinates with sea to
+        the southwest and ridges rising inland
+        extent: (lx, rx, ly, uy); shape: (rows, cols)
+    '''
+    import gdal
+    import osr
+
+    lx, rx, ly, uy = extent
+    rows, cols = shape
+    lon = np.linspace(lx, rx, cols)
+    lat = np.linspace(uy, ly, rows)
+    LON, LAT = np.meshgrid(lon, lat)
+
+    inland = (LON - ref_point[1])*np.cos(np.radians(40)) + \
+             (LAT - ref_point[0])*np.sin(np.radians(40))
+    ridges = 300*(1 + np.sin(LON*40)*np.cos(LAT*30))
+    altitude = np.where(inland > 0, inland*2000 + ridges*np.tanh(inland*20), 0.)
+
+    driver = gdal.GetDriverByName('GTiff')
+    ds = driver.Create(path, cols, rows, 1, gdal.GDT_Float32)
+    ds.SetGeoTransform((lx, (rx-lx)/cols, 0, uy, 0, -(uy-ly)/rows))
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(4326)
+    ds.SetProjection(srs.ExportToWkt())
+    ds.GetRasterBand(1).WriteArray(altitude.astype('f4'))
+    ds.FlushCache()
+    ds = None
+
+
+def make_all(folder, size='medium', dem=True):
+
+    ''' writes all files of a size and returns a config
+        dictionary with the keys used by VITAS
+    '''
+    grid = sizes[size]['grid']
+    nlegs = sizes[size]['legs']
+
+    synthpath = os.path.join(folder, 'synthesis')
+    stdpath = os.path.join(folder, 'flight_level')
+    dtmfile = os.path.join(folder, 'dtm.tif')
+
+    for n in range(nlegs):
+        start = flight_date + datetime.timedelta(minutes=leg_minutes*n)
+        end = start + datetime.timedelta(minutes=leg_minutes)
+        legfile = os.path.join(synthpath, 'c03', 'leg{:02d}.cdf'.format(n+1))
+        if not os.path.isfile(legfile):
+            make_synthesis(legfile, start, end, grid=grid, seed=n)
+
+    stdfile = os.path.join(stdpath, flight_date.strftime('%y%m%d')+'I.nc')
+    if not os.path.isfile(stdfile):
+        tape_start = flight_date - datetime.timedelta(minutes=30)
+        make_stdtape(stdfile, tape_start, 3600*2)
+
+    if dem and not os.path.isfile(dtmfile):
+        try:
+            make_dem(dtmfile)
+        except ImportError:
+            print "gdal is not available; DEM not written"
+
+    config = get_config(folder)
+    write_config(folder, config)
+
+    return config
+
+
+def get_config(folder):
+
+    config = {}
+    config['folder_synthesis'] = os.path.abspath(os.path.join(folder, 'synthesis'))
+    config['folder_flight_level'] = os.path.abspath(os.path.join(folder, 'flight_level'))
+    config['filepath_dtm'] = os.path.abspath(os.path.join(folder, 'dtm.tif'))
+    config['catalog_file'] = os.path.abspath(os.path.join(folder, 'vitas_catalog.json'))
+    config['synthesis_field_name'] = dict(field_names)
+    config['synthesis_grid_name'] = {'X':'x', 'Y':'y', 'Z':'z'}
+
+    return config
+
+
+def write_config(folder, config):
+
+    ''' vitas.config with one key per line as read by
+        VitasConfigParser '''
+    with open(os.path.join(folder, 'vitas.config'), 'w') as f:
+        for key, value in sorted(config.iteritems()):
+            f.write(key+'='+repr(value)+'\n')
+
+
+if __name__ == "__main__":
+
+    if len(sys.argv) < 2:
+        print "Use: python synthetic_fixtures.py folder [size ...]"
+        print "sizes: "+", ".join(sorted(sizes))
+        sys.exit()
+
+    folder = sys.argv[1]
+    names = sys.argv[2:] or ['medium']
+    for name in names:
+        print "Writing "+name+" fixtures"
+        make_all(os.path.join(folder, name), name)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+'''
+ Profiles of the nearest grid cells (--nearest,
+ Smoothing.nearest_mean) compared with the original
+ implementation on a synthetic synthesis
+ (synthetic_fixtures.py)
+
+ Use:
+     $ python -m unittest test_profiles
+'''
+
+import os
+import shutil
+import datetime
+import tempfile
+import unittest
+
+import numpy as np
+
+from scipy.spatial import cKDTree
+from scipy.interpolate import interp1d
+
+import Smoothing
+import synthetic_fixtures as sf
+
+
+def baseline_profile(U, V, LAT, LON, x, y, target_latlon, max_dist, n_neigh):
+
+    ''' original make_synth_profile_withnearest (fields
+        with NaN at missing values) '''
+    Y,X = np.meshgrid(y,x)
+    coords_domain = zip(X.flatten(),Y.flatten())
+    tree = cKDTree(coords_domain)
+
+    f=interp1d(LAT,range(len(LAT)))
+    lat_idx=int(np.ceil(f(target_latlon[0][0])))
+    f=interp1d(LON,range(len(LON)))
+    lon_idx=int(np.ceil(f(target_latlon[0][1])))
+    target_cart = (x[lon_idx],y[lat_idx])
+
+    dist, idx = tree.query(target_cart,k=n_neigh,eps=0,p=2,
+                           distance_upper_bound=max_dist)
+
+    Yg,Xg = np.meshgrid(range(len(LAT)),range(len(LON)))
+    grid_domain = zip(Xg.flatten(),Yg.flatten())
+    neigh_idx = [grid_domain[i] for i in idx]
+
+    uprof = np.array([U[n[0],n[1],:] for n in neigh_idx])
+    vprof = np.array([V[n[0],n[1],:] for n in neigh_idx])
+    uprof_mean = np.nanmean(uprof,axis=0)
+    vprof_mean = np.nanmean(vprof,axis=0)
+
+    dirU = np.radians(230)
+    sprofU_mean = -(uprof_mean*np.sin(dirU)+vprof_mean*np.cos(dirU))
+
+    return uprof_mean, vprof_mean, sprofU_mean
+
+
+class TestNearestProfile(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        import AircraftAnalysis as AA
+
+        cls.folder = tempfile.mkdtemp(prefix='vitas_test_')
+        path = os.path.join(cls.folder, 'leg01.cdf')
+        start = datetime.datetime(2001, 1, 23, 21, 0)
+        sf.make_synthesis(path, start, start+datetime.timedelta(minutes=4),
+                          grid=sf.sizes['small']['grid'])
+        config = sf.get_config(cls.folder)
+        cls.synth = AA.Synthesis(path)
+        cls.synth.set_fields(config)
+        cls.synth.set_axes(config)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.folder, ignore_errors=True)
+
+    def get_target(self, coords):
+
+        ''' cell of the lat/lon target as in
+            Plotter.make_synth_profile_withnearest '''
+        S = self.synth
+        lat_idx = int(np.ceil(interp1d(S.LAT, range(len(S.LAT)))(coords[0][0])))
+        lon_idx = int(np.ceil(interp1d(S.LON, range(len(S.LON)))(coords[0][1])))
+        return (S.X[lon_idx], S.Y[lat_idx])
+
+    def get_profiles(self, coords, max_dist, n_neigh):
+
+        S = self.synth
+        target = self.get_target(coords)
+        new = [Smoothing.nearest_mean(F, S.X, S.Y, target, max_dist, n_neigh)
+               for F in (S.U, S.V)]
+        old = baseline_profile(S.U, S.V, S.LAT, S.LON, S.X, S.Y,
+                               coords, max_dist, n_neigh)
+        return new, old[:2]
+
+    def test_same_as_baseline(self):
+
+        ''' choices suggested in Session.run '''
+        for coords in [[(38.5,-123.2)], [(38.3191,-123.0729)]]:
+            for max_dist, n_neigh in [(4.5,12), (7.0,30)]:
+                new, old = self.get_profiles(coords, max_dist, n_neigh)
+                for a, b in zip(new, old):
+                    np.testing.assert_allclose(a, b, rtol=1e-6)
+
+    def test_missing_values(self):
+
+        ''' near the edge of the fields (NaN columns) '''
+        S = self.synth
+        i, j = np.argwhere(np.isnan(S.U[:,:,0]))[0]
+        coords = [(S.LAT[min(j+2,S.LAT.size-1)], S.LON[min(i+2,S.LON.size-1)])]
+        new, old = self.get_profiles(coords, 4.5, 12)
+        for a, b in zip(new, old):
+            np.testing.assert_allclose(a, b, rtol=1e-6)
+
+    def test_radius_holds_fewer_cells(self):
+
+        ''' cells beyond max_dist are not used '''
+        S = self.synth
+        dx = abs(S.X[1]-S.X[0])
+        target = self.get_target([(38.5,-123.2)])
+        u = Smoothing.nearest_mean(S.U, S.X, S.Y, target, 1.01*dx, 30)
+        u5, v5, cross5 = baseline_profile(S.U, S.V, S.LAT, S.LON, S.X, S.Y,
+                                          [(38.5,-123.2)], 1.01*dx, 5)
+        np.testing.assert_allclose(u, u5, rtol=1e-6)
+
+
+if __name__ == "__main__":
+
+    unittest.main()